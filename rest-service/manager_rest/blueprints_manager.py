@@ -19,7 +19,9 @@ import os
 import itertools
 import shutil
 from copy import deepcopy
+from collections import OrderedDict
 from StringIO import StringIO
+from datetime import datetime, timedelta
 
 from flask import current_app
 import celery.exceptions
@@ -30,8 +32,16 @@ from manager_rest import app_context
 from manager_rest import config
 from manager_rest import utils
 from manager_rest import manager_exceptions
-from manager_rest.storage import get_storage_manager, models
+from manager_rest.storage import get_storage_manager, models, UnitOfWork
 from manager_rest import workflow_client as wf_client
+from manager_rest import execution_scheduler
+
+# A deployment can only be deleted when all its node instances are in these
+# states (unless live nodes are explicitly ignored)
+DEAD_NODE_INSTANCE_STATES = ('uninitialized', 'deleted')
+# System-wide workflows that don't touch the deployments, so executions can
+# start while they run
+NON_BLOCKING_SYSTEM_WORKFLOWS = ('archive_executions',)
 
 
 class DslParseException(Exception):
@@ -51,7 +61,8 @@ class BlueprintsManager(object):
         self.workflow_client = wf_client.get_workflow_client()
 
     def list_executions(self, include=None, is_include_system_workflows=False,
-                        filters=None, pagination=None, sort=None):
+                        filters=None, pagination=None, sort=None,
+                        include_archived=False):
         filters = filters or {}
         is_system_workflow = filters.get('is_system_workflow')
         if is_system_workflow:
@@ -62,21 +73,70 @@ class BlueprintsManager(object):
         elif not is_include_system_workflows:
             filters['is_system_workflow'] = [False]
         return self.sm.list_executions(include=include, filters=filters,
-                                       pagination=pagination, sort=sort)
+                                       pagination=pagination, sort=sort,
+                                       include_archived=include_archived)
+
+    def archive_executions(self, retention_days=None, batch_size=None,
+                           run_as_workflow=False):
+        """Move the ended executions older than `retention_days` to the
+        executions archive
+
+        :param retention_days: [default: `executions_retention_days`]
+        :param batch_size: [default: `executions_archive_batch_size`]
+        :param run_as_workflow: Archive in an `archive_executions` system
+        workflow, instead of during the call
+        :return: A dict with the number of archived executions, or with the
+        ID of the system workflow's execution
+        """
+        if retention_days is None:
+            retention_days = config.instance.executions_retention_days
+        if batch_size is None:
+            batch_size = config.instance.executions_archive_batch_size
+        if retention_days < 0 or batch_size <= 0:
+            raise manager_exceptions.BadParametersError(
+                'retention_days must not be negative, and batch_size must be '
+                'positive (got {0} and {1})'.format(retention_days,
+                                                    batch_size))
+
+        if run_as_workflow:
+            _, execution = self._execute_system_workflow(
+                wf_id='archive_executions',
+                task_mapping='cloudify_system_workflows.executions.archive',
+                execution_parameters={'retention_days': retention_days,
+                                      'batch_size': batch_size},
+                verify_no_executions=False)
+            return {'archived': None,
+                    'created_before': None,
+                    'execution_id': execution.id}
+
+        # Executions' creation times are stored in local time
+        created_before = datetime.now() - timedelta(days=retention_days)
+        archived = self.sm.archive_executions(created_before, batch_size)
+        return {'archived': archived,
+                'created_before': '{0}Z'.format(
+                    created_before.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]),
+                'execution_id': None}
 
     def update_execution_status(self, execution_id, status, error):
-        execution = self.sm.get_execution(execution_id)
+        execution = self.sm.get_execution(execution_id, include=['status'])
         if not self._validate_execution_update(execution.status, status):
             raise manager_exceptions.InvalidExecutionUpdateStatus(
                 "Invalid relationship - can't change status from {0} to {1}"
                 .format(execution.status, status))
 
-        return self.sm.update_execution_status(execution_id, status, error)
+        if status in models.Execution.END_STATES:
+            self._end_executions([(execution_id, status, error)])
+        else:
+            self.sm.update_execution_status(execution_id, status, error)
 
     def _validate_execution_update(self, current_status, future_status):
         if current_status in models.Execution.END_STATES:
             return False
 
+        # Only the scheduler queues executions and releases them
+        if models.Execution.QUEUED in (current_status, future_status):
+            return False
+
         invalid_cancel_statuses = models.Execution.ACTIVE_STATES + [
             models.Execution.TERMINATED]
         if all((current_status == models.Execution.CANCELLING,
@@ -195,16 +255,14 @@ class BlueprintsManager(object):
         # Uninstall (if applicable)
         if utils.plugin_installable_on_current_platform(plugin):
             if not force:
-                used_blueprints = list(set(
+                used_blueprints = set(
                     d.blueprint_id for d in
-                    self.sm.list_deployments(include=['blueprint_id']).items))
-                plugins = [b.plan[constants.WORKFLOW_PLUGINS_TO_INSTALL] +
-                           b.plan[constants.DEPLOYMENT_PLUGINS_TO_INSTALL]
-                           for b in
-                           self.sm.list_blueprints(include=['plan'],
-                                                   filters={
-                                                       'id': used_blueprints
-                                                   }).items]
+                    self.sm.list_deployments(include=['blueprint_id']).items
+                    if d.blueprint_id)
+                plans = self.sm.get_blueprint_plans(used_blueprints)
+                plugins = [plan[constants.WORKFLOW_PLUGINS_TO_INSTALL] +
+                           plan[constants.DEPLOYMENT_PLUGINS_TO_INSTALL]
+                           for plan in plans.itervalues()]
                 plugins = set((p.get('package_name'), p.get('package_version'))
                               for sublist in plugins for p in sublist)
                 if (plugin.package_name, plugin.package_version) in plugins:
@@ -263,7 +321,7 @@ class BlueprintsManager(object):
 
     def delete_blueprint(self, blueprint_id):
         blueprint_deployments = self.sm.list_blueprint_deployments(
-            blueprint_id).items
+            blueprint_id, include=['id']).items
 
         if len(blueprint_deployments) > 0:
             raise manager_exceptions.DependentExistsError(
@@ -280,12 +338,13 @@ class BlueprintsManager(object):
                           bypass_maintenance=None,
                           ignore_live_nodes=False):
         # Verify deployment exists.
-        self.sm.get_deployment(deployment_id)
+        self.sm.get_deployment(deployment_id, include=['id'])
 
         # validate there are no running executions for this deployment
         deplyment_id_filter = self.create_filters_dict(
             deployment_id=deployment_id)
         executions = self.sm.list_executions(
+            include=['id', 'status'],
             filters=deplyment_id_filter).items
         if any(execution.status not in models.Execution.END_STATES for
            execution in executions):
@@ -298,22 +357,23 @@ class BlueprintsManager(object):
                               executions if execution.status not
                               in models.Execution.END_STATES])))
 
-        if not ignore_live_nodes:
+        # validate either all nodes for this deployment are still
+        # uninitialized or have been deleted (without loading them, unless
+        # some are live)
+        if not ignore_live_nodes and self.sm.node_instances_exist(
+                deployment_id, exclude_states=DEAD_NODE_INSTANCE_STATES):
             deplyment_id_filter = self.create_filters_dict(
                 deployment_id=deployment_id)
             node_instances = self.sm.list_node_instances(
+                include=['id', 'state'],
                 filters=deplyment_id_filter).items
-            # validate either all nodes for this deployment are still
-            # uninitialized or have been deleted
-            if any(node.state not in ('uninitialized', 'deleted') for node in
-                   node_instances):
-                raise manager_exceptions.DependentExistsError(
-                    "Can't delete deployment {0} - There are live nodes for "
-                    "this deployment. Live nodes ids: {1}"
-                    .format(deployment_id,
-                            ','.join([node.id for node in node_instances
-                                     if node.state not in
-                                     ('uninitialized', 'deleted')])))
+            raise manager_exceptions.DependentExistsError(
+                "Can't delete deployment {0} - There are live nodes for "
+                "this deployment. Live nodes ids: {1}"
+                .format(deployment_id,
+                        ','.join([node.id for node in node_instances
+                                 if node.state not in
+                                 DEAD_NODE_INSTANCE_STATES])))
 
         self._delete_deployment_environment(deployment_id, bypass_maintenance)
         self._delete_deployment_logs(deployment_id, bypass_maintenance)
@@ -323,14 +383,16 @@ class BlueprintsManager(object):
                          parameters=None,
                          allow_custom_parameters=False,
                          force=False, bypass_maintenance=None):
-        deployment = self.sm.get_deployment(deployment_id)
-        blueprint = self.sm.get_blueprint(deployment.blueprint_id)
+        deployment = self.sm.get_deployment(deployment_id,
+                                            include=['id', 'blueprint_id'])
+        blueprint_plan = self.sm.get_blueprint_plan(deployment.blueprint_id)
+        workflows = self.sm.get_deployment_workflows(deployment_id)
 
-        if workflow_id not in deployment.workflows:
+        if workflow_id not in workflows:
             raise manager_exceptions.NonexistentWorkflowError(
                 'Workflow {0} does not exist in deployment {1}'.format(
                     workflow_id, deployment_id))
-        workflow = deployment.workflows[workflow_id]
+        workflow = workflows[workflow_id]
 
         self._verify_deployment_environment_created_successfully(deployment_id)
 
@@ -341,37 +403,233 @@ class BlueprintsManager(object):
             BlueprintsManager._merge_and_validate_execution_parameters(
                 workflow, workflow_id, parameters, allow_custom_parameters)
 
-        execution_id = str(uuid.uuid4())
+        new_execution = self._new_execution(deployment, workflow_id,
+                                            execution_parameters)
+        execution_id = new_execution.id
+        if not execution_scheduler.submit([new_execution]):
+            # Started once running executions end
+            return new_execution
 
-        new_execution = models.Execution(
-            id=execution_id,
+        # executing the user workflow
+        errors = self._start_executions(
+            [(new_execution, workflow, execution_parameters)],
+            bypass_maintenance=bypass_maintenance)
+        if execution_id in errors:
+            raise errors[execution_id]
+
+        return new_execution
+
+    def execute_workflows(self, workflow_id,
+                          deployment_ids=None,
+                          deployment_filters=None,
+                          parameters=None,
+                          allow_custom_parameters=False,
+                          force=False,
+                          bypass_maintenance=None):
+        """Execute a workflow on many deployments at once.
+
+        The deployments are validated by a few queries for all of them
+        (instead of a few for each one), their executions are created in a
+        single transaction, and the tasks are published through a single
+        broker connection. A deployment that can't run the workflow doesn't
+        prevent running it on the others.
+
+        :param deployment_ids: The deployments to run the workflow on (a
+        deployment that's listed more than once runs it once)
+        :param deployment_filters: Filters of the deployments to run the
+        workflow on (instead of `deployment_ids`), e.g. by blueprint_id
+        :return: A list of the results, for each deployment: a dict with the
+        `deployment_id`, and the new `execution` or the `error` (exception)
+        that prevented creating or starting it. Executions beyond the
+        concurrency limits are queued (see `execution_scheduler`)
+        """
+        self._check_for_active_system_wide_execution()
+        if deployment_ids is not None:
+            deployment_ids = list(OrderedDict.fromkeys(deployment_ids))
+            deployment_filters = {'id': deployment_ids}
+        deployments = {
+            deployment.id: deployment for deployment in
+            self.sm.list_deployments(include=['id', 'blueprint_id'],
+                                     filters=deployment_filters).items}
+        if deployment_ids is None:
+            deployment_ids = sorted(deployments)
+
+        results = [{'deployment_id': deployment_id,
+                    'execution': None,
+                    'error': None} for deployment_id in deployment_ids]
+        workflows = self.sm.get_deployments_workflows(deployments)
+        env_creations = self._get_environment_creations(deployments.keys())
+        running = {}
+        if not force:
+            for execution in self.list_executions(
+                    include=['id', 'deployment_id'],
+                    is_include_system_workflows=True,
+                    filters={'deployment_id': deployments.keys(),
+                             'status': models.Execution.ACTIVE_STATES}).items:
+                running.setdefault(execution.deployment_id, []).append(
+                    execution.id)
+
+        to_execute = []
+        for result in results:
+            deployment_id = result['deployment_id']
+            try:
+                if deployment_id not in deployments:
+                    raise manager_exceptions.NotFoundError(
+                        'Requested Deployment with ID `{0}` was not found'
+                        .format(deployment_id))
+                if workflow_id not in workflows[deployment_id]:
+                    raise manager_exceptions.NonexistentWorkflowError(
+                        'Workflow {0} does not exist in deployment {1}'
+                        .format(workflow_id, deployment_id))
+                workflow = workflows[deployment_id][workflow_id]
+                self._verify_environment_creation(
+                    deployment_id, env_creations.get(deployment_id))
+                if deployment_id in running:
+                    raise manager_exceptions.ExistingRunningExecutionError(
+                        'The following executions are currently running for '
+                        'this deployment: {0}. To execute this workflow '
+                        'anyway, pass "force=true"'.format(
+                            running[deployment_id]))
+                execution_parameters = \
+                    self._merge_and_validate_execution_parameters(
+                        workflow, workflow_id, deepcopy(parameters),
+                        allow_custom_parameters)
+            except Exception as e:
+                result['error'] = e
+                continue
+            result['execution'] = self._new_execution(
+                deployments[deployment_id], workflow_id, execution_parameters)
+            to_execute.append((result, workflow, execution_parameters))
+
+        to_start = set(execution.id for execution in
+                       execution_scheduler.submit(
+                           [result['execution']
+                            for result, _, _ in to_execute]))
+        errors = self._start_executions(
+            [(result['execution'], workflow, execution_parameters)
+             for result, workflow, execution_parameters in to_execute
+             if result['execution'].id in to_start],
+            bypass_maintenance=bypass_maintenance)
+        for result, _, _ in to_execute:
+            error = errors.get(result['execution'].id)
+            if error is not None:
+                result['execution'] = None
+                result['error'] = error
+        return results
+
+    def _start_executions(self, executions, bypass_maintenance=None):
+        """Publish the tasks of pending executions of user workflows. An
+        execution whose task can't be published is failed (which makes
+        room for queued executions)
+
+        :param executions: A list of (execution, workflow,
+        execution_parameters) tuples
+        :return: A dict of the publishing errors, by execution id
+        """
+        errors = self._publish_executions(executions, bypass_maintenance)
+        self._end_executions(
+            [(execution_id, models.Execution.FAILED, str(e))
+             for execution_id, e in errors.items()])
+        return errors
+
+    def _publish_executions(self, executions, bypass_maintenance=None):
+        """Publish the tasks of pending executions of user workflows,
+        through a single broker connection
+
+        :param executions: A list of (execution, workflow,
+        execution_parameters) tuples
+        :return: A dict of the publishing errors, by execution id
+        """
+        errors = {}
+        plans = {}
+        with self.workflow_client.task_producer() as producer:
+            for execution, workflow, execution_parameters in executions:
+                if execution.blueprint_id not in plans:
+                    plans[execution.blueprint_id] = \
+                        self.sm.get_blueprint_plan(execution.blueprint_id)
+                try:
+                    self.workflow_client.execute_workflow(
+                        execution.workflow_id,
+                        workflow,
+                        workflow_plugins=plans[execution.blueprint_id][
+                            constants.WORKFLOW_PLUGINS_TO_INSTALL],
+                        blueprint_id=execution.blueprint_id,
+                        deployment_id=execution.deployment_id,
+                        execution_id=execution.id,
+                        execution_parameters=execution_parameters,
+                        bypass_maintenance=bypass_maintenance,
+                        producer=producer)
+                except Exception as e:
+                    current_app.logger.error(
+                        'Failed starting execution {0} of deployment {1}: '
+                        '{2}'.format(execution.id, execution.deployment_id,
+                                     e))
+                    errors[execution.id] = e
+        return errors
+
+    def _end_executions(self, ended):
+        """Move executions of user workflows to end states, and start the
+        queued executions that they made room for. All the end state
+        transitions of the update and publishing paths go through here, so
+        that the queue can't be left stuck behind them
+
+        :param ended: A list of (execution_id, status, error) tuples
+        """
+        # Released executions that fail to start make room for others in
+        # turn, so the queue is released until they all start
+        while ended:
+            for execution_id, status, error in ended:
+                self.sm.update_execution_status(execution_id, status, error)
+            ended = self._start_queued_executions()
+
+    def _start_queued_executions(self):
+        """Start the queued executions that are now within the concurrency
+        limits (e.g. after an execution ended). Errors are only logged,
+        since the update that triggered this was already stored.
+
+        Released executions are started without `bypass_maintenance`: it
+        isn't stored with the execution, and the maintenance mode isn't
+        activated while executions are queued anyway (they count as its
+        remaining executions)
+
+        :return: A list of (execution_id, status, error) tuples, of the
+        released executions whose tasks couldn't be published, to be failed
+        """
+        try:
+            executions = execution_scheduler.release()
+            if not executions:
+                return []
+            workflows = self.sm.get_deployments_workflows(
+                set(execution.deployment_id for execution in executions))
+            # The stored parameters were already merged with the workflow's
+            # defaults and validated when the execution was queued
+            errors = self._publish_executions(
+                [(execution,
+                  workflows[execution.deployment_id][execution.workflow_id],
+                  deepcopy(execution.parameters) or {})
+                 for execution in executions])
+        except Exception as e:
+            current_app.logger.error(
+                'Failed starting queued executions: {0}'.format(e))
+            return []
+        return [(execution_id, models.Execution.FAILED, str(e))
+                for execution_id, e in errors.items()]
+
+    def _new_execution(self, deployment, workflow_id, execution_parameters):
+        """Return a new (pending) Execution of a user workflow
+        """
+        return models.Execution(
+            id=str(uuid.uuid4()),
             status=models.Execution.PENDING,
             created_at=utils.get_formatted_timestamp(),
             blueprint_id=deployment.blueprint_id,
             workflow_id=workflow_id,
-            deployment_id=deployment_id,
+            deployment_id=deployment.id,
             error='',
             parameters=self._get_only_user_execution_parameters(
                 execution_parameters),
             is_system_workflow=False)
 
-        self.sm.put_execution(new_execution)
-
-        # executing the user workflow
-        workflow_plugins = blueprint.plan[
-            constants.WORKFLOW_PLUGINS_TO_INSTALL]
-        self.workflow_client.execute_workflow(
-            workflow_id,
-            workflow,
-            workflow_plugins=workflow_plugins,
-            blueprint_id=deployment.blueprint_id,
-            deployment_id=deployment_id,
-            execution_id=execution_id,
-            execution_parameters=execution_parameters,
-            bypass_maintenance=bypass_maintenance)
-
-        return new_execution
-
     def _check_for_any_active_executions(self):
         filters = {
             'status': models.Execution.ACTIVE_STATES
@@ -390,16 +648,13 @@ class BlueprintsManager(object):
                 .format(executions))
 
     def _check_for_active_system_wide_execution(self):
-        filters = {
-            'status': models.Execution.ACTIVE_STATES
-        }
-        for e in self.list_executions(is_include_system_workflows=True,
-                                      filters=filters).items:
-            if e.deployment_id is None:
-                raise manager_exceptions.ExistingRunningExecutionError(
-                    'You cannot start an execution if there is a running '
-                    'system-wide execution (id: {0})'
-                    .format(e.id))
+        execution_id = self.sm.get_active_system_wide_execution_id(
+            exclude_workflows=NON_BLOCKING_SYSTEM_WORKFLOWS)
+        if execution_id:
+            raise manager_exceptions.ExistingRunningExecutionError(
+                'You cannot start an execution if there is a running '
+                'system-wide execution (id: {0})'
+                .format(execution_id))
 
     def _execute_system_workflow(self, wf_id, task_mapping, deployment=None,
                                  execution_parameters=None, timeout=0,
@@ -505,7 +760,8 @@ class BlueprintsManager(object):
         the execution is truly stopped, it'll be in 'cancelled' status (unless
         force was not used and the executed workflow doesn't support
         graceful termination, in which case it might simply continue
-        regardless and end up with a 'terminated' status)
+        regardless and end up with a 'terminated' status). A queued
+        execution never started, so it's cancelled at once
 
         :param execution_id: The execution id
         :param force: A boolean describing whether to force cancellation
@@ -514,6 +770,9 @@ class BlueprintsManager(object):
         :raises manager_exceptions.IllegalActionError
         """
 
+        if execution_scheduler.cancel_queued(execution_id):
+            return self.sm.get_execution(execution_id)
+
         execution = self.sm.get_execution(execution_id)
         if execution.status not in (models.Execution.PENDING,
                                     models.Execution.STARTED) and \
@@ -626,8 +885,7 @@ class BlueprintsManager(object):
             plan,
             node_ids)
 
-        for node in nodes:
-            self.sm.put_node(node)
+        self.sm.put_nodes(nodes)
 
     def _create_deployment_node_instances(self,
                                           deployment_id,
@@ -636,8 +894,7 @@ class BlueprintsManager(object):
             deployment_id,
             dsl_node_instances)
 
-        for node_instance in node_instances:
-            self.sm.put_node_instance(node_instance)
+        self.sm.put_node_instances(node_instances)
 
     def create_deployment(self, blueprint_id, deployment_id, inputs=None,
                           bypass_maintenance=None):
@@ -672,19 +929,22 @@ class BlueprintsManager(object):
                                             bypass_maintenance)
         return new_deployment
 
+    @UnitOfWork()
     def start_deployment_modification(self,
                                       deployment_id,
                                       modified_nodes,
                                       context):
+        self.sm.lock_deployment(deployment_id)
         deployment = self.sm.get_deployment(deployment_id)
         deployment_id_filter = self.create_filters_dict(
             deployment_id=deployment_id)
-        existing_modifications = self.sm.list_deployment_modifications(
-            include=['id', 'status'],
-            filters=deployment_id_filter).items
         active_modifications = [
-            m.id for m in existing_modifications
-            if m.status == models.DeploymentModification.STARTED]
+            m.id for m in self.sm.list_deployment_modifications(
+                include=['id'],
+                filters={
+                    'deployment_id': deployment_id,
+                    'status': models.DeploymentModification.STARTED
+                }).items]
         if active_modifications:
             raise \
                 manager_exceptions.ExistingStartedDeploymentModificationError(
@@ -695,9 +955,10 @@ class BlueprintsManager(object):
 
         nodes = [node.to_dict() for node in self.sm.list_nodes(
             filters=deployment_id_filter).items]
+        current_instances = self.sm.list_node_instances(
+            filters=deployment_id_filter).items
         node_instances = [instance.to_dict() for instance
-                          in self.sm.list_node_instances(
-                          filters=deployment_id_filter).items]
+                          in current_instances]
         node_instances_modification = tasks.modify_deployment(
             nodes=nodes,
             previous_nodes=nodes,
@@ -705,9 +966,22 @@ class BlueprintsManager(object):
             modified_nodes=modified_nodes,
             scaling_groups=deployment.scaling_groups)
 
+        # Only the existing node instances that the modification touches
+        # (the ones it removes, and the ones related to the added or removed
+        # ones) are recorded, so a rollback only has to undo these changes
+        current_instances = {instance.id: instance
+                             for instance in current_instances}
+        touched_ids = [
+            node_instance['id']
+            for node_instance
+            in node_instances_modification['added_and_related']
+            if node_instance.get('modification') != 'added'] + [
+            node_instance['id']
+            for node_instance
+            in node_instances_modification['removed_and_related']]
         node_instances_modification['before_modification'] = [
-            instance.to_dict() for instance in
-            self.sm.list_node_instances(filters=deployment_id_filter).items]
+            current_instances[instance_id].to_dict()
+            for instance_id in OrderedDict.fromkeys(touched_ids)]
 
         now = utils.get_formatted_timestamp()
         modification_id = str(uuid.uuid4())
@@ -735,17 +1009,21 @@ class BlueprintsManager(object):
                 self.sm.update_entity(node)
         self.sm.update_entity(deployment)
 
+        # The related node instances are updated together, so the number of
+        # queries doesn't grow with the size of the deployment
+        nodes_relationships = {node['id']: node['relationships']
+                               for node in nodes}
         added_and_related = node_instances_modification['added_and_related']
         added_node_instances = []
+        related_node_instances = []
         for node_instance in added_and_related:
             if node_instance.get('modification') == 'added':
                 added_node_instances.append(node_instance)
             else:
-                node = self.sm.get_node(deployment_id=deployment_id,
-                                        node_id=node_instance['node_id'],
-                                        include=['relationships'])
-                target_names = [r['target_id'] for r in node.relationships]
-                current = self.sm.get_node_instance(node_instance['id'])
+                target_names = [
+                    r['target_id']
+                    for r in nodes_relationships[node_instance['node_id']]]
+                current = current_instances[node_instance['id']]
                 current_relationship_groups = {
                     target_name: list(group)
                     for target_name, group in itertools.groupby(
@@ -764,15 +1042,24 @@ class BlueprintsManager(object):
                         target_name, [])
                     new_relationships += new_relationship_groups.get(
                         target_name, [])
-                instance = self.sm.get_node_instance(node_instance['id'])
-                instance.relationships = deepcopy(new_relationships)
-                self.sm.update_node_instance(instance)
+                current.relationships = deepcopy(new_relationships)
+                related_node_instances.append(current)
+        self.sm.update_node_instances(related_node_instances)
         self._create_deployment_node_instances(deployment_id,
                                                added_node_instances)
         return modification
 
+    def _lock_modification_deployment(self, modification_id):
+        """Lock the deployment of a modification, and only then read the
+        modification, so its status can't be changed concurrently
+        """
+        self.sm.lock_deployment(self.sm.get_deployment_modification(
+            modification_id, include=['deployment_id']).deployment_id)
+        return self.sm.get_deployment_modification(modification_id)
+
+    @UnitOfWork()
     def finish_deployment_modification(self, modification_id):
-        modification = self.sm.get_deployment_modification(modification_id)
+        modification = self._lock_modification_deployment(modification_id)
 
         if modification.status in models.DeploymentModification.END_STATES:
             raise manager_exceptions.DeploymentModificationAlreadyEndedError(
@@ -796,28 +1083,39 @@ class BlueprintsManager(object):
         self.sm.update_entity(deployment)
 
         node_instances = modification.node_instances
-        for node_instance in node_instances['removed_and_related']:
-            if node_instance.get('modification') == 'removed':
-                self.sm.delete_node_instance(node_instance['id'])
-            else:
+        removed_and_related = node_instances['removed_and_related']
+        self.sm.delete_node_instances(
+            [node_instance['id'] for node_instance in removed_and_related
+             if node_instance.get('modification') == 'removed'])
+        related = [node_instance for node_instance in removed_and_related
+                   if node_instance.get('modification') != 'removed']
+        if related:
+            current_instances = {
+                instance.id: instance for instance in
+                self.sm.list_node_instances(filters={
+                    'id': [node_instance['id'] for node_instance in related]
+                }).items}
+            for node_instance in related:
                 removed_relationship_target_ids = set(
                     [rel['target_id']
                      for rel in node_instance['relationships']])
-                current = self.sm.get_node_instance(node_instance['id'])
+                current = current_instances[node_instance['id']]
                 new_relationships = [rel for rel in current.relationships
                                      if rel['target_id']
                                      not in removed_relationship_target_ids]
-                instance = self.sm.get_node_instance(node_instance['id'])
-                instance.relationships = deepcopy(new_relationships)
-                self.sm.update_node_instance(instance)
+                current.relationships = deepcopy(new_relationships)
+            self.sm.update_node_instances(
+                [current_instances[node_instance['id']]
+                 for node_instance in related])
 
         modification.status = models.DeploymentModification.FINISHED
         modification.ended_at = utils.get_formatted_timestamp()
         self.sm.update_entity(modification)
         return modification
 
+    @UnitOfWork()
     def rollback_deployment_modification(self, modification_id):
-        modification = self.sm.get_deployment_modification(modification_id)
+        modification = self._lock_modification_deployment(modification_id)
 
         if modification.status in models.DeploymentModification.END_STATES:
             raise manager_exceptions.DeploymentModificationAlreadyEndedError(
@@ -828,15 +1126,8 @@ class BlueprintsManager(object):
         deployment = self.sm.get_deployment(modification.deployment_id)
         deployment_id_filter = self.create_filters_dict(
             deployment_id=modification.deployment_id)
-        node_instances = self.sm.list_node_instances(
-            filters=deployment_id_filter).items
         modified_instances = deepcopy(modification.node_instances)
-        modified_instances['before_rollback'] = [
-            instance.to_dict() for instance in node_instances]
-        for instance in node_instances:
-            self.sm.delete_node_instance(instance.id)
-        for instance in modified_instances['before_modification']:
-            self.sm.put_node_instance(models.NodeInstance(**instance))
+        self._rollback_node_instances(modified_instances)
         nodes_num_instances = {node.id: node for node in self.sm.list_nodes(
             filters=deployment_id_filter,
             include=['id', 'number_of_instances']).items}
@@ -860,6 +1151,46 @@ class BlueprintsManager(object):
         self.sm.update_entity(modification)
         return modification
 
+    def _rollback_node_instances(self, modified_instances):
+        """Apply the inverse of the node instance changes of a deployment
+        modification: delete the added node instances, and restore the
+        changed and removed ones to their state before the modification
+        (with new versions, or recreated if they no longer exist). The
+        affected node instances are recorded, as they were before the
+        rollback, in `before_rollback`
+
+        :param modified_instances: The node_instances of the modification
+        """
+        added_ids = [
+            node_instance['id']
+            for node_instance in modified_instances['added_and_related']
+            if node_instance.get('modification') == 'added']
+        previous_instances = {
+            node_instance['id']: node_instance
+            for node_instance in modified_instances['before_modification']}
+        affected_ids = added_ids + previous_instances.keys()
+        current_instances = self.sm.list_node_instances(
+            filters={'id': affected_ids}).items if affected_ids else []
+        modified_instances['before_rollback'] = [
+            instance.to_dict() for instance in current_instances]
+
+        self.sm.delete_node_instances(added_ids)
+        restored_instances = []
+        for instance in current_instances:
+            previous = previous_instances.get(instance.id)
+            if previous is None:
+                continue
+            for key, value in previous.iteritems():
+                if key not in ('id', 'version'):
+                    setattr(instance, key, value)
+            restored_instances.append(instance)
+        self.sm.update_node_instances(restored_instances)
+        existing_ids = set(instance.id for instance in current_instances)
+        self.sm.put_node_instances(
+            [models.NodeInstance(**previous)
+             for instance_id, previous in previous_instances.iteritems()
+             if instance_id not in existing_ids])
+
     def evaluate_deployment_outputs(self, deployment_id):
         deployment = self.sm.get_deployment(deployment_id, include=['outputs'])
 
@@ -1028,14 +1359,46 @@ class BlueprintsManager(object):
 
     def _verify_deployment_environment_created_successfully(self,
                                                             deployment_id):
-        deployment_id_filter = self.create_filters_dict(
-            deployment_id=deployment_id)
+        filters = self.create_filters_dict(
+            deployment_id=deployment_id,
+            workflow_id='create_deployment_environment')
         env_creation = next(
-            (execution for execution in
-             self.sm.list_executions(filters=deployment_id_filter).items
-             if execution.workflow_id == 'create_deployment_environment'),
+            iter(self.sm.list_executions(include=['status', 'error'],
+                                         filters=filters).items),
             None)
+        if not env_creation:
+            # The execution of an old deployment may have been archived
+            env_creation = next(
+                iter(self.sm.list_executions(include=['status', 'error'],
+                                             filters=filters,
+                                             include_archived=True).items),
+                None)
+
+        self._verify_environment_creation(deployment_id, env_creation)
+
+    def _get_environment_creations(self, deployment_ids):
+        """Return the create_deployment_environment executions of several
+        deployments (including archived ones), by deployment id
+        """
+        env_creations = {}
+        for include_archived in (False, True):
+            missing = [deployment_id for deployment_id in deployment_ids
+                       if deployment_id not in env_creations]
+            if not missing:
+                break
+            for execution in self.sm.list_executions(
+                    include=['deployment_id', 'status', 'error'],
+                    filters={'deployment_id': missing,
+                             'workflow_id': 'create_deployment_environment'},
+                    include_archived=include_archived).items:
+                env_creations.setdefault(execution.deployment_id, execution)
+        return env_creations
 
+    @staticmethod
+    def _verify_environment_creation(deployment_id, env_creation):
+        """Raise if executions can't be launched on the deployment, given
+        its create_deployment_environment execution (None if not found)
+        """
         if not env_creation:
             raise RuntimeError('Failed to find "create_deployment_environment"'
                                ' execution for deployment {0}'.format(
@@ -1108,8 +1471,9 @@ class BlueprintsManager(object):
     def _delete_deployment_environment(self,
                                        deployment_id,
                                        bypass_maintenance):
-        deployment = self.sm.get_deployment(deployment_id)
-        blueprint = self.sm.get_blueprint(deployment.blueprint_id)
+        deployment = self.sm.get_deployment(deployment_id,
+                                            include=['id', 'blueprint_id'])
+        blueprint_plan = self.sm.get_blueprint_plan(deployment.blueprint_id)
         wf_id = 'delete_deployment_environment'
         deployment_env_deletion_task_name = \
             'cloudify_system_workflows.deployment_environment.delete'
@@ -1121,9 +1485,9 @@ class BlueprintsManager(object):
             timeout=300,
             bypass_maintenance=bypass_maintenance,
             execution_parameters={
-                'deployment_plugins_to_uninstall': blueprint.plan[
+                'deployment_plugins_to_uninstall': blueprint_plan[
                     constants.DEPLOYMENT_PLUGINS_TO_INSTALL],
-                'workflow_plugins_to_uninstall': blueprint.plan[
+                'workflow_plugins_to_uninstall': blueprint_plan[
                     constants.WORKFLOW_PLUGINS_TO_INSTALL],
             })
 
@@ -1143,16 +1507,14 @@ class BlueprintsManager(object):
     def _check_for_active_executions(self, deployment_id, force):
 
         def _get_running_executions(deployment_id=None, include_system=True):
-            deployment_id_filter = self.create_filters_dict(
-                deployment_id=deployment_id)
+            filters = self.create_filters_dict(
+                deployment_id=deployment_id,
+                status=models.Execution.ACTIVE_STATES)
             executions = self.list_executions(
-                filters=deployment_id_filter,
+                include=['id'],
+                filters=filters,
                 is_include_system_workflows=include_system).items
-            running = [
-                e.id for e in executions if
-                self.sm.get_execution(e.id).status
-                not in models.Execution.END_STATES]
-            return running
+            return [e.id for e in executions]
 
         # validate no execution is currently in progress
         if not force:
@@ -13,9 +13,14 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
+import os
 import ssl
+import time
+from threading import Lock
+from contextlib import contextmanager
 
 from celery import Celery
+from kombu import Exchange, Queue
 
 from manager_rest import config
 
@@ -27,6 +32,51 @@ TASK_STATE_SUCCESS = 'SUCCESS'
 TASK_STATE_RETRY = 'RETRY'
 TASK_STATE_FAILURE = 'FAILURE'
 
+# The queue of the management worker, which runs the workflows
+MANAGEMENT_QUEUE = 'cloudify.management'
+
+
+class PublishStatistics(object):
+    """Process-wide counters of the tasks published to the broker
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.clients = 0
+            self.publishes = 0
+            self.publish_errors = 0
+            self.publish_time_total = 0.0
+            self.publish_time_max = 0.0
+
+    def increment(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_publish(self, duration, error=False):
+        with self._lock:
+            self.publishes += 1
+            if error:
+                self.publish_errors += 1
+            self.publish_time_total += duration
+            self.publish_time_max = max(self.publish_time_max, duration)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'clients': self.clients,
+                'publishes': self.publishes,
+                'publish_errors': self.publish_errors,
+                'publish_time_total': self.publish_time_total,
+                'publish_time_max': self.publish_time_max,
+                'connection_pool_limit': config.instance.amqp_pool_limit
+            }
+
+
+statistics = PublishStatistics()
+
 
 class CeleryClient(object):
 
@@ -45,30 +95,75 @@ class CeleryClient(object):
         )
 
         self.celery = Celery(broker=amqp_uri, backend=amqp_uri)
+        # Tasks are published through the app's pool of broker
+        # connections, which are kept open between tasks
         self.celery.conf.update(
             CELERY_TASK_SERIALIZER="json",
-            CELERY_TASK_RESULT_EXPIRES=600)
+            CELERY_TASK_RESULT_EXPIRES=600,
+            BROKER_POOL_LIMIT=config.instance.amqp_pool_limit)
         if config.instance.amqp_ssl_enabled:
             self.celery.conf.update(BROKER_USE_SSL=ssl_settings)
+        max_priority = config.instance.management_queue_max_priority
+        if max_priority:
+            # Publishing declares the queue, with the same arguments as the
+            # management worker does (otherwise the broker refuses it)
+            self.celery.conf.update(CELERY_QUEUES=[
+                Queue(MANAGEMENT_QUEUE,
+                      Exchange(MANAGEMENT_QUEUE),
+                      routing_key=MANAGEMENT_QUEUE,
+                      queue_arguments={'x-max-priority': max_priority})])
 
     def close(self):
         if self.celery:
             self.celery.close()
 
-    def execute_task(self, task_queue, task_id=None, kwargs=None):
+    @contextmanager
+    def producer(self):
+        """A producer holding one of the pooled broker connections, for
+        publishing several tasks in a row (see `execute_task`)
+        """
+        with self.celery.producer_or_acquire() as producer:
+            yield producer
+
+    def execute_task(self, task_queue, task_id=None, kwargs=None,
+                     producer=None, priority=None):
         """
             Execute a task
 
             :param task_queue: the task queue
             :param task_id: optional id for the task
             :param kwargs: optional kwargs to be passed to the task
+            :param producer: optional producer to publish the task with
+            :param priority: optional broker priority of the task (only
+            used by queues declared with a max priority)
             :return: the celery task async result
         """
 
-        return self.celery.send_task('cloudify.dispatch.dispatch',
-                                     queue=task_queue,
-                                     task_id=task_id,
-                                     kwargs=kwargs)
+        cfy_config = config.instance
+        # A dropped connection is reopened (with backoff) and the task is
+        # published again, up to `amqp_publish_max_retries` times
+        retry_policy = {
+            'max_retries': cfy_config.amqp_publish_max_retries,
+            'interval_start': 0,
+            'interval_step': cfy_config.amqp_publish_retry_interval,
+            'interval_max': cfy_config.amqp_publish_retry_interval_max
+        }
+        options = {} if priority is None else {'priority': priority}
+        start = time.time()
+        try:
+            result = self.celery.send_task('cloudify.dispatch.dispatch',
+                                           queue=task_queue,
+                                           task_id=task_id,
+                                           kwargs=kwargs,
+                                           producer=producer,
+                                           retry=True,
+                                           retry_policy=retry_policy,
+                                           **options)
+        except Exception:
+            statistics.record_publish(time.time() - start, error=True)
+            raise
+        statistics.record_publish(time.time() - start)
+        return result
 
     def get_task_status(self, task_id):
         """
@@ -113,9 +208,37 @@ class CeleryClient(object):
         return ssl_options
 
 
+_client = None
+# The process that created `_client`
+_client_pid = None
+_client_lock = Lock()
+
+
 def get_client():
+    """Return the process-wide celery client, whose broker connections
+    are reused by all the tasks published by the process. A forked process
+    creates its own client, since the connections can't be shared with
+    the parent (they're left open for the parent to use)
+    """
+    global _client, _client_pid
     if config.instance.test_mode:
         from test.mocks import MockCeleryClient
         return MockCeleryClient()
-    else:
-        return CeleryClient()
+
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = CeleryClient()
+            _client_pid = os.getpid()
+            statistics.increment('clients')
+        return _client
+
+
+def close_client():
+    """Close the process-wide celery client (and its broker connections)
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
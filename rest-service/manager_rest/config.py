@@ -27,11 +27,63 @@ class Config(object):
         self.postgresql_username = None
         self.postgresql_password = None
         self.postgresql_bin_path = None
+        self.postgresql_pool_size = 5
+        self.postgresql_max_overflow = 10
+        self.postgresql_pool_timeout = 30
+        self.postgresql_pool_recycle = 3600
+        self.postgresql_pool_pre_ping = True
+        # SQLAlchemy URIs of read replicas of the DB. Read-only storage calls
+        # are sent to a random replica, unless the request already wrote
+        self.postgresql_replica_uris = []
+        # Max size (bytes) of the cached blueprint plans and deployment
+        # workflows, in each REST service process. 0 disables the cache
+        self.definitions_cache_size = 64 * 1024 * 1024
+        # Ended executions older than this many days are moved to the
+        # executions archive, when archiving is requested
+        self.executions_retention_days = 30
+        # Number of executions moved to the archive in each transaction
+        self.executions_archive_batch_size = 1000
+        # The maximum numbers of executions of user workflows that run at
+        # once - in total, of each blueprint, and of each workflow id.
+        # Further executions are queued until running ones end. 0 means
+        # no limit
+        self.max_concurrent_executions = 0
+        self.max_concurrent_executions_per_blueprint = 0
+        self.max_concurrent_executions_per_workflow = 0
+        # Add the number and total time of the SQL queries of each request
+        # to its response headers
+        self.sql_debug_headers = False
+        # Log the SQL queries of requests that issue at least this many
+        # queries, or spend at least this many seconds in them
+        self.sql_log_query_count_threshold = 100
+        self.sql_log_query_time_threshold = 1.0
+        # Queries of the same shape repeated at least this many times in a
+        # request are reported as a probable N+1 query pattern
+        self.sql_n_plus_one_threshold = 10
         self.amqp_address = 'localhost'
         self.amqp_username = 'guest'
         self.amqp_password = 'guest'
         self.amqp_ssl_enabled = False
         self.amqp_ca_path = ''
+        # The maximum number of broker connections kept open by each
+        # process for publishing tasks
+        self.amqp_pool_limit = 10
+        # Publishing a task over a dropped connection reconnects and retries
+        # up to this many times, waiting `amqp_publish_retry_interval` more
+        # seconds before each retry (and at most the maximum)
+        self.amqp_publish_max_retries = 3
+        self.amqp_publish_retry_interval = 0.5
+        self.amqp_publish_retry_interval_max = 3
+        # System workflows (deployment environments, plugins and snapshots)
+        # are kept from waiting behind user workflows either by their own
+        # queue, which management workers must consume as well (None
+        # publishes them to the management queue), or by broker priorities:
+        # the x-max-priority of the management queue, which must be the same
+        # as in its declaration by the management worker. System workflows
+        # are published with the max priority, and user workflows with 0.
+        # 0 disables priorities
+        self.system_workflows_queue = None
+        self.management_queue_max_priority = 0
         self.ldap_server = None
         self.ldap_username = None
         self.ldap_password = None
@@ -415,7 +415,10 @@ class DeploymentUpdateNodeHandler(UpdateHandler):
         """
         current_nodes = self.sm.list_nodes(
                 filters={'deployment_id': dep_update.deployment_id}).items
-        nodes_dict = {node.id: node.to_dict() for node in current_nodes}
+        # The handlers change these dicts in place, copy them so that the
+        # stored nodes aren't changed along with them
+        nodes_dict = {node.id: deepcopy(node.to_dict())
+                      for node in current_nodes}
         modified_entities = deployment_update_utils.ModifiedEntitiesDict()
 
         # Iterate over the steps of the deployment update and handle each
@@ -587,12 +590,16 @@ class DeploymentUpdateNodeInstanceHandler(UpdateHandler):
         """
         modified_raw_instances = []
         modify_related_raw_instances = []
+        modified_instances = []
+        current_instances = self._get_node_instances(
+            [node_instance['id'] for node_instance in instances
+             if node_instance.get('modification') == 'extended'])
 
         for node_instance in instances:
             modification = node_instance.get('modification', 'related')
             if modification == 'extended':
                 # adding new relationships to the current relationships
-                instance = self.sm.get_node_instance(node_instance['id'])
+                instance = current_instances[node_instance['id']]
                 relationships = deepcopy(instance.relationships)
 
                 node_instance['relationships'] = \
@@ -602,10 +609,11 @@ class DeploymentUpdateNodeInstanceHandler(UpdateHandler):
                 relationships.extend(node_instance['relationships'])
                 instance.relationships = relationships
                 instance.version = _handle_version(node_instance['version'])
-                self.sm.update_node_instance(instance)
+                modified_instances.append(instance)
                 modified_raw_instances.append(node_instance)
             else:
                 modify_related_raw_instances.append(node_instance)
+        self.sm.update_node_instances(modified_instances)
 
         return \
             {
@@ -621,12 +629,15 @@ class DeploymentUpdateNodeInstanceHandler(UpdateHandler):
         """
         modified_raw_instances = []
         modify_related_raw_instances = []
+        current_instances = self._get_node_instances(
+            [node_instance['id'] for node_instance in instances
+             if node_instance.get('modification') == 'reduced'])
 
         for node_instance in instances:
             modification = node_instance.get('modification', 'related')
             if modification == 'reduced':
                 modified_node = \
-                    self.sm.get_node_instance(node_instance['id']).to_dict()
+                    current_instances[node_instance['id']].to_dict()
                 # changing the new state of relationships on the instance
                 # to not include the removed relationship
                 target_ids = [rel['target_id']
@@ -671,16 +682,31 @@ class DeploymentUpdateNodeInstanceHandler(UpdateHandler):
         self._reduce_node_instances(reduced_node_instances,
                                     extended_node_instances)
 
-        for removed_node_instance in removed_node_instances:
-            self.sm.delete_node_instance(removed_node_instance.id)
+        self.sm.delete_node_instances(
+            [removed_node_instance.id
+             for removed_node_instance in removed_node_instances])
+
+    def _get_node_instances(self, node_instance_ids):
+        """Load the node instances with the given IDs in a single query
+
+        :return: A dict of the node instances by their IDs
+        """
+        if not node_instance_ids:
+            return {}
+        return {instance.id: instance for instance in
+                self.sm.list_node_instances(
+                    filters={'id': node_instance_ids}).items}
 
     def _reduce_node_instances(self,
                                reduced_node_instances,
                                extended_node_instances):
+        current_instances = self._get_node_instances(
+            [reduced_node_instance['id']
+             for reduced_node_instance in reduced_node_instances])
+        updated_node_instances = []
         for reduced_node_instance in reduced_node_instances:
-            updated_node_instance = self.sm.get_node_instance(
-                reduced_node_instance['id']
-            )
+            updated_node_instance = current_instances[
+                reduced_node_instance['id']]
             storage_relationships = updated_node_instance.relationships
             self._clean_relationship_index_field(storage_relationships)
             # Get all the remaining relationships
@@ -704,7 +730,8 @@ class DeploymentUpdateNodeInstanceHandler(UpdateHandler):
 
             updated_node_instance.relationships = deepcopy(
                 remaining_relationships)
-            self.sm.update_node_instance(updated_node_instance)
+            updated_node_instances.append(updated_node_instance)
+        self.sm.update_node_instances(updated_node_instances)
 
     @staticmethod
     def _clean_relationship_index_field(relationships):
@@ -21,7 +21,7 @@ from flask import current_app
 from dsl_parser import constants, tasks
 from dsl_parser import exceptions as parser_exceptions
 from manager_rest import app_context, config, manager_exceptions
-from manager_rest.storage import get_storage_manager, models
+from manager_rest.storage import get_storage_manager, models, UnitOfWork
 import manager_rest.workflow_client as wf_client
 from manager_rest import utils
 from manager_rest.blueprints_manager import BlueprintsManager
@@ -210,44 +210,48 @@ class DeploymentUpdateManager(object):
         :param workflow_id:
         :return:
         """
-        dep_update = self.get_deployment_update(deployment_update_id)
-
-        # mark deployment update as committing
-        dep_update.state = STATES.UPDATING
-        self.sm.update_entity(dep_update)
-
-        # Handle any deployment related changes. i.e. workflows and deployments
-        modified_deployment_entities, raw_updated_deployment = \
-            self._deployment_handler.handle(dep_update)
-
-        # Retrieve previous_nodes
-        previous_nodes = \
-            [node.to_dict() for node in self.sm.list_nodes(
-                filters={'deployment_id': dep_update.deployment_id}).items]
-
-        # Update the nodes on the storage
-        modified_entity_ids, depup_nodes = \
-            self._node_handler.handle(dep_update)
-
-        # Extract changes from raw nodes
-        node_instance_changes = self._extract_changes(dep_update,
-                                                      depup_nodes,
-                                                      previous_nodes)
-
-        # Create (and update for adding step type) node instances
-        # according to the changes in raw_nodes
-        depup_node_instances = \
-            self._node_instance_handler.handle(dep_update,
-                                               node_instance_changes)
-
-        # Saving the needed changes back to sm for future use
-        # (removing entities).
-        dep_update.deployment_update_deployment = raw_updated_deployment
-        dep_update.deployment_update_nodes = depup_nodes
-        dep_update.deployment_update_node_instances = depup_node_instances
-        dep_update.modified_entity_ids = \
-            modified_entity_ids.to_dict(include_rel_order=True)
-        self.sm.update_entity(dep_update)
+        # The update's changes are applied while holding the deployment's
+        # lock, in a single transaction, so they're serialized with the
+        # other work on the deployment (e.g. deployment modifications)
+        with UnitOfWork():
+            # mark deployment update as committing
+            dep_update = self._lock_deployment_update(deployment_update_id)
+            dep_update.state = STATES.UPDATING
+            self.sm.update_entity(dep_update)
+
+            # Handle any deployment related changes. i.e. workflows and
+            # deployments
+            modified_deployment_entities, raw_updated_deployment = \
+                self._deployment_handler.handle(dep_update)
+
+            # Retrieve previous_nodes
+            previous_nodes = \
+                [node.to_dict() for node in self.sm.list_nodes(
+                    filters={'deployment_id': dep_update.deployment_id}).items]
+
+            # Update the nodes on the storage
+            modified_entity_ids, depup_nodes = \
+                self._node_handler.handle(dep_update)
+
+            # Extract changes from raw nodes
+            node_instance_changes = self._extract_changes(dep_update,
+                                                          depup_nodes,
+                                                          previous_nodes)
+
+            # Create (and update for adding step type) node instances
+            # according to the changes in raw_nodes
+            depup_node_instances = \
+                self._node_instance_handler.handle(dep_update,
+                                                   node_instance_changes)
+
+            # Saving the needed changes back to sm for future use
+            # (removing entities).
+            dep_update.deployment_update_deployment = raw_updated_deployment
+            dep_update.deployment_update_nodes = depup_nodes
+            dep_update.deployment_update_node_instances = depup_node_instances
+            dep_update.modified_entity_ids = \
+                modified_entity_ids.to_dict(include_rel_order=True)
+            self.sm.update_entity(dep_update)
 
         # Execute the default 'update' workflow or a custom workflow using
         # added and related instances. Any workflow executed should call
@@ -270,6 +274,13 @@ class DeploymentUpdateManager(object):
 
         return self.get_deployment_update(dep_update.id)
 
+    def _lock_deployment_update(self, deployment_update_id):
+        """Lock the deployment of an update, and only then read the update
+        """
+        self.sm.lock_deployment(self.sm.get_deployment_update(
+            deployment_update_id, include=['deployment_id']).deployment_id)
+        return self.get_deployment_update(deployment_update_id)
+
     def validate_no_active_updates_per_deployment(self,
                                                   deployment_id,
                                                   force=False):
@@ -435,6 +446,7 @@ class DeploymentUpdateManager(object):
                 workflow_id=workflow_id or DEFAULT_DEPLOYMENT_UPDATE_WORKFLOW,
                 parameters=parameters)
 
+    @UnitOfWork()
     def finalize_commit(self, deployment_update_id):
         """ finalizes the update process by removing any removed
         node/node instances and updating any reduced node
@@ -443,7 +455,7 @@ class DeploymentUpdateManager(object):
         :return:
         """
 
-        dep_update = self.get_deployment_update(deployment_update_id)
+        dep_update = self._lock_deployment_update(deployment_update_id)
 
         # mark deployment update as finalizing
         dep_update.state = STATES.FINALIZING
@@ -477,14 +489,15 @@ class DeploymentUpdateManager(object):
         :return:
         """
         deployment_id = deployment_update.deployment_id
-        deployment = self.sm.get_deployment(deployment_id)
-        blueprint_id = deployment.blueprint_id
+        blueprint_id = self.sm.get_deployment(
+            deployment_id, include=['blueprint_id']).blueprint_id
+        workflows = self.sm.get_deployment_workflows(deployment_id)
 
-        if workflow_id not in deployment.workflows:
+        if workflow_id not in workflows:
             raise manager_exceptions.NonexistentWorkflowError(
                 'Workflow {0} does not exist in deployment {1}'
                 .format(workflow_id, deployment_id))
-        workflow = deployment.workflows[workflow_id]
+        workflow = workflows[workflow_id]
 
         execution_parameters = \
             BlueprintsManager._merge_and_validate_execution_parameters(
@@ -140,8 +140,7 @@ class DeploymentPlan(dict):
 
         # get deployment_plugins_to_install and workflow_plugins_to_install
         # from the deployment's blueprint plan
-        blueprint = sm.get_blueprint(deployment.blueprint_id)
-        blueprint_plan = blueprint.plan
+        blueprint_plan = sm.get_blueprint_plan(deployment.blueprint_id)
 
         deployment_plugins_to_install = \
             blueprint_plan['deployment_plugins_to_install']
@@ -172,7 +171,8 @@ class DeploymentPlan(dict):
         deployment_id = deployment_update.deployment_id
 
         sm = blueprints_manager.sm
-        blueprint_id = sm.get_deployment(deployment_id).blueprint_id
+        blueprint_id = sm.get_deployment(
+            deployment_id, include=['blueprint_id']).blueprint_id
 
         deployment = blueprints_manager.prepare_deployment_for_storage(
             blueprint_id,
@@ -31,9 +31,13 @@ def setup_resources(api):
         'SnapshotsIdRestore': 'snapshots/<string:snapshot_id>/restore',
         'Executions': 'executions',
         'ExecutionsId': 'executions/<string:execution_id>',
+        'ExecutionsArchive': 'executions/archive',
+        'ExecutionsBulk': 'executions/bulk',
         'Deployments': 'deployments',
         'DeploymentsId': 'deployments/<string:deployment_id>',
         'DeploymentsIdOutputs': 'deployments/<string:deployment_id>/outputs',
+        'DeploymentsIdSummary': 'deployments/<string:deployment_id>/summary',
+        'DeploymentsSummary': 'summary/deployments',
         'DeploymentModifications': 'deployment-modifications',
         'DeploymentModificationsId': 'deployment-modifications/'
                                      '<string:modification_id>',
@@ -48,6 +52,11 @@ def setup_resources(api):
         'Events': 'events',
         'Search': 'search',
         'Status': 'status',
+        'StatusBroker': 'status/broker',
+        'StatusDatabasePool': 'status/database-pool',
+        'StatusDefinitionsCache': 'status/definitions-cache',
+        'StatusExecutionQueue': 'status/execution-queue',
+        'StatusQueries': 'status/queries',
         'ProviderContext': 'provider/context',
         'Version': 'version',
         'EvaluateFunctions': 'evaluate/functions',
@@ -57,6 +66,7 @@ def setup_resources(api):
         'PluginsArchive': 'plugins/<string:plugin_id>/archive',
         'MaintenanceMode': 'maintenance',
         'MaintenanceModeAction': 'maintenance/<string:maintenance_action>',
+        'Migrations': 'migrations',
 
         'DeploymentUpdate':
             'deployment-updates/<string:id>/update/<string:phase>',
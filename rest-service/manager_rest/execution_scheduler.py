@@ -0,0 +1,248 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""Admission control of the executions of user workflows.
+
+A new execution starts only while the numbers of running executions - in
+total, of its blueprint, and of its workflow id - are below the limits in
+the config. Otherwise it's stored in the `queued` status, and started once
+running executions end (see `BlueprintsManager.update_execution_status`),
+oldest first. Admission decisions are serialized by the lock of the
+execution queue, so concurrent requests (in all the REST service
+processes) can't exceed the limits. System workflows aren't limited.
+Executions are released without `bypass_maintenance`, which isn't stored.
+"""
+
+from datetime import datetime
+from threading import Lock
+
+from dateutil import parser as date_parser
+
+from manager_rest import config
+from manager_rest.storage import get_storage_manager, models, UnitOfWork
+
+# The statuses of executions that count as running
+RUNNING_STATES = [models.Execution.PENDING,
+                  models.Execution.STARTED,
+                  models.Execution.CANCELLING,
+                  models.Execution.FORCE_CANCELLING]
+
+
+class QueueStatistics(object):
+    """Process-wide counters of the executions queued and released by the
+    scheduler
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.queued = 0
+            self.released = 0
+            self.wait_time_total = 0.0
+            self.wait_time_max = 0.0
+
+    def record_queued(self, count):
+        with self._lock:
+            self.queued += count
+
+    def record_released(self, wait_time):
+        with self._lock:
+            self.released += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'queued': self.queued,
+                'released': self.released,
+                'wait_time_total': self.wait_time_total,
+                'wait_time_max': self.wait_time_max
+            }
+
+
+statistics = QueueStatistics()
+
+
+class _RunningExecutions(object):
+    """The numbers of running executions, in total, by blueprint and by
+    workflow, checked against the configured limits
+    """
+    def __init__(self, counts):
+        self.total = 0
+        self.by_blueprint = {}
+        self.by_workflow = {}
+        for blueprint_id, workflow_id, count in counts:
+            self._add(blueprint_id, workflow_id, count)
+
+    def _add(self, blueprint_id, workflow_id, count=1):
+        self.total += count
+        self.by_blueprint[blueprint_id] = \
+            self.by_blueprint.get(blueprint_id, 0) + count
+        self.by_workflow[workflow_id] = \
+            self.by_workflow.get(workflow_id, 0) + count
+
+    def admit(self, execution):
+        """Count `execution` as running, if it's within the limits
+
+        :return: Whether the execution was admitted
+        """
+        conf = config.instance
+        for limit, running in [
+                (conf.max_concurrent_executions, self.total),
+                (conf.max_concurrent_executions_per_blueprint,
+                 self.by_blueprint.get(execution.blueprint_id, 0)),
+                (conf.max_concurrent_executions_per_workflow,
+                 self.by_workflow.get(execution.workflow_id, 0))]:
+            if limit and running >= limit:
+                return False
+        self._add(execution.blueprint_id, execution.workflow_id)
+        return True
+
+
+def limits_enabled():
+    conf = config.instance
+    return bool(conf.max_concurrent_executions or
+                conf.max_concurrent_executions_per_blueprint or
+                conf.max_concurrent_executions_per_workflow)
+
+
+def _running_executions(sm):
+    return _RunningExecutions(sm.count_executions_by_workflow(RUNNING_STATES))
+
+
+def submit(executions):
+    """Store new executions of user workflows: each one is pending if it's
+    within the limits, or queued otherwise
+
+    :param executions: A list of new models.Execution
+    :return: The executions to start now
+    """
+    sm = get_storage_manager()
+    if not executions or not limits_enabled():
+        sm.put_executions(executions)
+        return executions
+
+    with UnitOfWork():
+        sm.lock_execution_queue()
+        running = _running_executions(sm)
+        for execution in executions:
+            execution.status = models.Execution.PENDING \
+                if running.admit(execution) else models.Execution.QUEUED
+        sm.put_executions(executions)
+    to_start = [execution for execution in executions
+                if execution.status == models.Execution.PENDING]
+    statistics.record_queued(len(executions) - len(to_start))
+    return to_start
+
+
+def release():
+    """Move the queued executions that are now within the limits to
+    pending, oldest first. An execution that still exceeds a limit (e.g.
+    of its blueprint) doesn't hold back the ones after it
+
+    :return: The released executions, to start
+    """
+    sm = get_storage_manager()
+    queued_filters = {'status': models.Execution.QUEUED}
+    # Most status updates find no queued executions, so the queue is only
+    # locked when there are some
+    if not sm.list_executions(include=['id'],
+                              filters=queued_filters,
+                              pagination={'size': 1,
+                                          'skip_count': True}).items:
+        return []
+
+    with UnitOfWork():
+        sm.lock_execution_queue()
+        running = _running_executions(sm)
+        queued = sm.list_executions(
+            include=['id', 'blueprint_id', 'workflow_id', 'created_at'],
+            filters=queued_filters,
+            sort={'created_at': 'asc'}).items
+        released = [execution for execution in queued
+                    if running.admit(execution)]
+        for execution in released:
+            sm.update_execution_status(execution.id,
+                                       models.Execution.PENDING, '')
+    if not released:
+        return []
+
+    now = datetime.now()
+    for execution in released:
+        statistics.record_released(_wait_time(execution, now))
+    return sm.list_executions(
+        filters={'id': [execution.id for execution in released]},
+        sort={'created_at': 'asc'}).items
+
+
+def cancel_queued(execution_id):
+    """Cancel an execution if it's still queued (which doesn't need to
+    stop anything)
+
+    :return: Whether the execution was cancelled
+    """
+    sm = get_storage_manager()
+    if sm.get_execution(execution_id, include=['status']).status != \
+            models.Execution.QUEUED:
+        return False
+    with UnitOfWork():
+        sm.lock_execution_queue()
+        # It may have been released meanwhile
+        execution = sm.get_execution(execution_id, include=['status'])
+        if execution.status != models.Execution.QUEUED:
+            return False
+        sm.update_execution_status(execution_id,
+                                   models.Execution.CANCELLED, '')
+    return True
+
+
+def get_status():
+    """The current queue and the statistics of this process
+
+    :return: A dict of the numbers of queued and running executions, the
+    time the oldest queued execution has waited (seconds), the limits, and
+    the statistics
+    """
+    sm = get_storage_manager()
+    queued = sm.count_executions_by_workflow([models.Execution.QUEUED])
+    running = _running_executions(sm)
+    oldest = sm.list_executions(include=['created_at'],
+                                filters={'status': models.Execution.QUEUED},
+                                sort={'created_at': 'asc'},
+                                pagination={'size': 1,
+                                            'skip_count': True}).items
+    conf = config.instance
+    status = statistics.to_dict()
+    status.update({
+        'depth': sum(count for _, _, count in queued),
+        'running': running.total,
+        'oldest_wait_time': _wait_time(oldest[0], datetime.now())
+        if oldest else 0.0,
+        'max_concurrent_executions': conf.max_concurrent_executions,
+        'max_concurrent_executions_per_blueprint':
+            conf.max_concurrent_executions_per_blueprint,
+        'max_concurrent_executions_per_workflow':
+            conf.max_concurrent_executions_per_workflow
+    })
+    return status
+
+
+def _wait_time(execution, now):
+    # Executions' creation times are stored in local time
+    created_at = date_parser.parse(execution.created_at.rstrip('Z'))
+    return max((now - created_at).total_seconds(), 0.0)
@@ -138,19 +138,13 @@ def _check_allowed_endpoint(request_endpoint):
 
 
 def get_running_executions():
+    fields = ['id', 'status', 'deployment_id', 'workflow_id']
     executions = get_blueprints_manager().list_executions(
-            is_include_system_workflows=True).items
-    running_executions = []
-    for execution in executions:
-        if execution.status not in models.Execution.END_STATES:
-            running_executions.append({
-                'id': execution.id,
-                'status': execution.status,
-                'deployment_id': execution.deployment_id,
-                'workflow_id': execution.workflow_id
-            })
-
-    return running_executions
+        include=fields,
+        is_include_system_workflows=True,
+        filters={'status': models.Execution.ACTIVE_STATES}).items
+    return [{field: getattr(execution, field) for field in fields}
+            for execution in executions]
 
 
 def _is_internal_request():
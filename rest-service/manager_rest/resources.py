@@ -15,6 +15,7 @@
 #
 
 import collections
+import json
 import os
 import zipfile
 import urllib
@@ -26,6 +27,7 @@ from os import path
 from flask import (
     request,
     make_response,
+    stream_with_context,
     current_app as app
 )
 from flask.ext.restful import marshal, reqparse
@@ -58,6 +60,9 @@ CONVENTION_APPLICATION_BLUEPRINT_FILE = 'blueprint.yaml'
 
 SUPPORTED_ARCHIVE_TYPES = ['zip', 'tar', 'tar.gz', 'tar.bz2']
 
+# Number of items written in each chunk of a streamed list response
+STREAMED_ITEMS_PER_CHUNK = 100
+
 
 def insecure_rest_method(func):
     """block an insecure REST method if manager disabled insecure endpoints
@@ -84,6 +89,11 @@ def _is_include_parameter_in_request():
     return '_include' in request.args and request.args['_include']
 
 
+def is_stream_parameter_in_request():
+    return verify_and_convert_bool('_stream',
+                                   request.args.get('_stream', 'false'))
+
+
 def _get_fields_to_include(model_fields):
     if _is_include_parameter_in_request():
         include = set(request.args['_include'].split(','))
@@ -141,6 +151,9 @@ class marshal_with(object):
             response = f(*args, **kwargs)
 
             if isinstance(response, responses_v2.ListResponse):
+                if is_stream_parameter_in_request():
+                    return self.stream_list_response(response,
+                                                     fields_to_include)
                 wrapped_items = self.wrap_with_response_object(response.items)
                 response.items = marshal(wrapped_items, fields_to_include)
                 return marshal(response,
@@ -158,6 +171,32 @@ class marshal_with(object):
 
         return wrapper
 
+    def stream_list_response(self, response, fields_to_include):
+        """Write a list response as a chunked JSON object, marshalling the
+        items one by one, while they're read from the DB
+
+        The metadata is written after the items, as the total number of
+        items is only known once they were all read
+        """
+        def generate():
+            yield '{"items": ['
+            separator = ''
+            chunk = []
+            for item in response.items:
+                item = marshal(self.wrap_with_response_object(item),
+                               fields_to_include)
+                chunk.append(json.dumps(item))
+                if len(chunk) == STREAMED_ITEMS_PER_CHUNK:
+                    yield separator + ','.join(chunk)
+                    separator = ','
+                    chunk = []
+            if chunk:
+                yield separator + ','.join(chunk)
+            yield '], "metadata": {0}}}'.format(json.dumps(response.metadata))
+
+        return app.response_class(stream_with_context(generate()),
+                                  mimetype='application/json')
+
     def wrap_with_response_object(self, data):
         if isinstance(data, dict):
             return self.response_class(**data)
@@ -1073,15 +1112,13 @@ class NodeInstancesId(SecuredResource):
         # had version=0 by default
         version = request.json['version'] or 1
 
-        instance = get_storage_manager().get_node_instance(node_instance_id)
         # Only update if new values were included in the request
-        instance.runtime_properties = request.json.get(
-            'runtime_properties',
-            instance.runtime_properties
-        )
-        instance.state = request.json.get('state', instance.state)
-        instance.version = version
-        return get_storage_manager().update_node_instance(instance)
+        changes = {field: request.json[field]
+                   for field in ('runtime_properties', 'state')
+                   if field in request.json}
+        sm = get_storage_manager()
+        sm.update_node_instance_fields(node_instance_id, version, **changes)
+        return sm.get_node_instance(node_instance_id)
 
 
 class DeploymentsIdOutputs(SecuredResource):
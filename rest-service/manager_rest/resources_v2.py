@@ -37,10 +37,12 @@ from manager_rest.security import SecuredResource
 from manager_rest.blueprints_manager import get_blueprints_manager
 from manager_rest.storage import ListResult
 from manager_rest.storage import get_storage_manager
+from manager_rest.storage import JSON_PATH_SEPARATOR
 from manager_rest.storage import ManagerElasticsearch
 from manager_rest.resources import (marshal_with,
                                     exceptions_handled,
                                     verify_and_convert_bool,
+                                    is_stream_parameter_in_request,
                                     verify_parameter_in_request_body,
                                     verify_json_content_type,
                                     convert_to_int,
@@ -113,16 +115,35 @@ def marshal_events(func):
 
 def paginate(func):
     """
-    Decorator for adding pagination
+    Decorator for adding pagination.
+    Passing `_cursor` (empty for the first page, and then the `next_cursor`
+    of the previous page) switches to keyset pagination, `_skip_count`
+    skips counting the total number of items, and `_stream` streams the
+    items from the DB to the response, without loading all of them at once
     """
     def verify_and_create_pagination_params(*args, **kw):
         offset = request.args.get('_offset')
         size = request.args.get('_size')
+        cursor = request.args.get('_cursor')
         pagination_params = {}
         if offset:
             pagination_params['offset'] = int(offset)
         if size:
             pagination_params['size'] = int(size)
+        if cursor is not None:
+            if offset or not size:
+                raise manager_exceptions.BadParametersError(
+                    '`_cursor` requires `_size`, and can\'t be used together '
+                    'with `_offset`')
+            pagination_params['cursor'] = cursor
+        if verify_and_convert_bool('_skip_count',
+                                   request.args.get('_skip_count', 'false')):
+            pagination_params['skip_count'] = True
+        if is_stream_parameter_in_request():
+            if cursor is not None:
+                raise manager_exceptions.BadParametersError(
+                    '`_stream` can\'t be used together with `_cursor`')
+            pagination_params['stream'] = True
         result = func(pagination=pagination_params, *args, **kw)
 
         return responses_v2.ListResponse(
@@ -132,13 +153,19 @@ def paginate(func):
     return verify_and_create_pagination_params
 
 
-def create_filters(fields=None):
+def create_filters(fields=None, json_fields=None):
     """
     Decorator for extracting filter parameters from the request arguments and
     optionally verifying their validity according to the provided fields.
     :param fields: a set of valid filter fields.
+    :param json_fields: a set of JSON fields that can be filtered by a path
+    inside them (e.g. `runtime_properties.ip=10.0.0.5`).
     :return: a Decorator for creating and validating the accepted fields.
     """
+    def is_json_path(key):
+        field, separator, path = key.partition(JSON_PATH_SEPARATOR)
+        return bool(separator and path) and field in (json_fields or ())
+
     def create_filters_dec(f):
         def some_func(*args, **kw):
             request_args = request.args.to_dict(flat=False)
@@ -146,7 +173,8 @@ def create_filters(fields=None):
             filters = {k: v for k, v in
                        request_args.iteritems() if not k.startswith('_')}
             if fields:
-                unknowns = [k for k in filters.iterkeys() if k not in fields]
+                unknowns = [k for k in filters.iterkeys()
+                            if k not in fields and not is_json_path(k)]
                 if unknowns:
                     raise manager_exceptions.BadParametersError(
                         'Filter keys \'{key_names}\' do not exist. Allowed '
@@ -613,7 +641,8 @@ class NodeInstances(resources.NodeInstances):
         responseClass='List[{0}]'.format(responses_v2.NodeInstance.__name__),
         nickname="listNodeInstances",
         notes='Returns a node instances list for the optionally provided '
-              'filter parameters: {0}'
+              'filter parameters: {0}. Runtime properties can be filtered '
+              'by their path, e.g. `runtime_properties.ip=10.0.0.5`'
         .format(models.NodeInstance.fields),
         parameters=create_filter_params_list_description(
             models.NodeInstance.fields,
@@ -622,7 +651,8 @@ class NodeInstances(resources.NodeInstances):
     )
     @exceptions_handled
     @marshal_with(responses_v2.NodeInstance)
-    @create_filters(models.NodeInstance.fields)
+    @create_filters(models.NodeInstance.fields,
+                    json_fields=['runtime_properties'])
     @paginate
     @sortable
     def get(self, _include=None, filters=None, pagination=None,
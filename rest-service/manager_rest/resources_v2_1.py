@@ -29,15 +29,19 @@ from manager_rest.resources import (marshal_with,
                                     exceptions_handled,
                                     verify_json_content_type,
                                     verify_and_convert_bool,
+                                    verify_parameter_in_request_body,
                                     CONVENTION_APPLICATION_BLUEPRINT_FILE)
 from manager_rest import resources
 from manager_rest import resources_v2
+from manager_rest import responses_v2
 from manager_rest import responses_v2_1
 from manager_rest import config
 from manager_rest import archiving
+from manager_rest import celery_client
+from manager_rest import execution_scheduler
 from manager_rest import manager_exceptions
 from manager_rest import utils
-from manager_rest.storage import models
+from manager_rest.storage import models, get_storage_manager, UnitOfWork
 from manager_rest.security import SecuredResource
 from manager_rest.blueprints_manager import get_blueprints_manager
 from manager_rest.constants import (MAINTENANCE_MODE_ACTIVATED,
@@ -45,7 +49,8 @@ from manager_rest.constants import (MAINTENANCE_MODE_ACTIVATED,
                                     MAINTENANCE_MODE_DEACTIVATED)
 from manager_rest.maintenance import (get_maintenance_file_path,
                                       prepare_maintenance_dict,
-                                      get_running_executions)
+                                      get_running_executions,
+                                      is_bypass_maintenance_mode)
 from manager_rest.manager_exceptions import BadParametersError
 from deployment_update.manager import get_deployment_updates_manager
 from manager_rest.resources_v2 import create_filters, paginate, sortable
@@ -274,6 +279,88 @@ class MaintenanceModeAction(SecuredResource):
                 'values are: {1}'.format(maintenance_action, valid_actions))
 
 
+class Migrations(SecuredResource):
+    @swagger.operation(
+        responseClass=responses_v2_1.Migrations,
+        nickname="migrate",
+        notes='Runs the (idempotent) migrations of the DB, e.g. after the '
+              'data of an older manager\'s snapshot was restored. Returns '
+              'the names of the migrations'
+    )
+    @exceptions_handled
+    @marshal_with(responses_v2_1.Migrations)
+    def post(self, **_):
+        return {'migrations': get_storage_manager().migrate()}
+
+
+class StatusDatabasePool(SecuredResource):
+    @swagger.operation(
+        responseClass=responses_v2_1.DatabasePoolStatus,
+        nickname="databasePoolStatus",
+        notes='Returns the usage statistics of the database connection pool'
+    )
+    @exceptions_handled
+    @marshal_with(responses_v2_1.DatabasePoolStatus)
+    def get(self, **_):
+        return get_storage_manager().get_pool_statistics()
+
+
+class StatusBroker(SecuredResource):
+    @swagger.operation(
+        responseClass=responses_v2_1.BrokerStatus,
+        nickname="brokerStatus",
+        notes='Returns the statistics of the tasks published to the message '
+              'broker (by the REST service process that handles the request)'
+    )
+    @exceptions_handled
+    @marshal_with(responses_v2_1.BrokerStatus)
+    def get(self, **_):
+        return celery_client.statistics.to_dict()
+
+
+class StatusExecutionQueue(SecuredResource):
+    @swagger.operation(
+        responseClass=responses_v2_1.ExecutionQueueStatus,
+        nickname="executionQueueStatus",
+        notes='Returns the number of queued executions, how long the '
+              'oldest one has waited, and the concurrency limits. The '
+              'numbers of queued and released executions, and their wait '
+              'times, are of the REST service process that handles the '
+              'request'
+    )
+    @exceptions_handled
+    @marshal_with(responses_v2_1.ExecutionQueueStatus)
+    def get(self, **_):
+        return execution_scheduler.get_status()
+
+
+class StatusQueries(SecuredResource):
+    @swagger.operation(
+        responseClass=responses_v2_1.QueryStatistics,
+        nickname="queryStatistics",
+        notes='Returns the number and time of the SQL queries issued by '
+              'each endpoint (in the REST service process that handles the '
+              'request)'
+    )
+    @exceptions_handled
+    @marshal_with(responses_v2_1.QueryStatistics)
+    def get(self, **_):
+        return get_storage_manager().get_query_statistics()
+
+
+class StatusDefinitionsCache(SecuredResource):
+    @swagger.operation(
+        responseClass=responses_v2_1.DefinitionsCacheStatus,
+        nickname="definitionsCacheStatus",
+        notes='Returns the usage statistics of the cache of blueprint plans '
+              'and deployment workflows'
+    )
+    @exceptions_handled
+    @marshal_with(responses_v2_1.DefinitionsCacheStatus)
+    def get(self, **_):
+        return get_storage_manager().get_definitions_cache_statistics()
+
+
 class DeploymentUpdate(SecuredResource):
     @exceptions_handled
     @marshal_with(responses_v2_1.DeploymentUpdate)
@@ -329,12 +416,16 @@ class DeploymentUpdate(SecuredResource):
                                   skip_uninstall,
                                   workflow_id))
 
-        manager.validate_no_active_updates_per_deployment(
-            deployment_id=deployment_id, force=force)
+        # Hold the deployment's lock from the check until the new update is
+        # staged, so concurrent commits can't both pass the check
+        with UnitOfWork():
+            get_storage_manager().lock_deployment(deployment_id)
+            manager.validate_no_active_updates_per_deployment(
+                deployment_id=deployment_id, force=force)
 
-        deployment_update, _ = \
-            UploadedBlueprintsDeploymentUpdateManager(). \
-            receive_uploaded_data(deployment_id)
+            deployment_update, _ = \
+                UploadedBlueprintsDeploymentUpdateManager(). \
+                receive_uploaded_data(deployment_id)
 
         manager.extract_steps_from_deployment_update(
             deployment_update.id)
@@ -408,6 +499,188 @@ class DeploymentsId(resources.DeploymentsId):
                                    responses_v2_1.Deployment)
 
 
+class DeploymentsIdSummary(SecuredResource):
+    @swagger.operation(
+        responseClass=responses_v2_1.DeploymentSummary,
+        nickname="deploymentSummary",
+        notes='Returns the node instance counts (by state and by node), the '
+              'execution counts (by status) and the last execution of a '
+              'deployment'
+    )
+    @exceptions_handled
+    @marshal_with(responses_v2_1.DeploymentSummary)
+    def get(self, deployment_id, **_):
+        return get_storage_manager().summarize_deployments([deployment_id])[0]
+
+
+class DeploymentsSummary(SecuredResource):
+    @swagger.operation(
+        responseClass='List[{0}]'.format(
+            responses_v2_1.DeploymentSummary.__name__),
+        nickname="listDeploymentSummaries",
+        notes='Returns the summaries of the deployments passed as '
+              '`deployment_id` parameters (or of all deployments)'
+    )
+    @exceptions_handled
+    @marshal_with(responses_v2_1.DeploymentSummary)
+    @create_filters(['deployment_id'])
+    def get(self, filters=None, **_):
+        summaries = get_storage_manager().summarize_deployments(
+            filters.get('deployment_id'))
+        return responses_v2.ListResponse(
+            items=summaries,
+            metadata={'pagination': {'total': len(summaries),
+                                     'size': 0,
+                                     'offset': 0}})
+
+
+class Executions(resources_v2.Executions):
+    @swagger.operation(
+        responseClass='List[{0}]'.format(responses_v2.Execution.__name__),
+        nickname="list",
+        notes='Returns a list of executions for the optionally provided filter'
+              ' parameters: {0}'.format(models.Execution.fields),
+        parameters=create_filter_params_list_description(
+            models.Execution.fields, 'executions') + [
+            {'name': '_include_system_workflows',
+             'description': 'Include executions of system workflows',
+             'required': False,
+             'allowMultiple': True,
+             'dataType': 'bool',
+             'defaultValue': False,
+             'paramType': 'query'},
+            {'name': '_include_archived',
+             'description': 'Include executions that were moved to the '
+                            'executions archive',
+             'required': False,
+             'allowMultiple': False,
+             'dataType': 'bool',
+             'defaultValue': False,
+             'paramType': 'query'}
+        ]
+    )
+    @exceptions_handled
+    @marshal_with(responses_v2.Execution)
+    @create_filters(models.Execution.fields)
+    @paginate
+    @sortable
+    def get(self, _include=None, filters=None, pagination=None,
+            sort=None, **kwargs):
+        """
+        List executions
+        """
+        deployment_id = request.args.get('deployment_id')
+        if deployment_id:
+            get_storage_manager().get_deployment(deployment_id, include=['id'])
+        is_include_system_workflows = verify_and_convert_bool(
+            '_include_system_workflows',
+            request.args.get('_include_system_workflows', 'false'))
+        include_archived = verify_and_convert_bool(
+            '_include_archived',
+            request.args.get('_include_archived', 'false'))
+
+        return get_blueprints_manager().list_executions(
+            filters=filters, pagination=pagination, sort=sort,
+            is_include_system_workflows=is_include_system_workflows,
+            include=_include,
+            include_archived=include_archived)
+
+
+class ExecutionsArchive(SecuredResource):
+    @swagger.operation(
+        responseClass=responses_v2_1.ExecutionsArchive,
+        nickname="archiveExecutions",
+        notes='Moves the ended executions that are older than '
+              '`retention_days` to the executions archive, `batch_size` '
+              'executions at a time. With `run_as_workflow`, the executions '
+              'are archived by a system workflow'
+    )
+    @exceptions_handled
+    @marshal_with(responses_v2_1.ExecutionsArchive)
+    def post(self, **_):
+        verify_json_content_type()
+        request_json = request.json
+        verify_parameter_in_request_body('retention_days', request_json,
+                                         param_type=int, optional=True)
+        verify_parameter_in_request_body('batch_size', request_json,
+                                         param_type=int, optional=True)
+        run_as_workflow = verify_and_convert_bool(
+            'run_as_workflow',
+            request_json.get('run_as_workflow', 'false'))
+        return get_blueprints_manager().archive_executions(
+            retention_days=request_json.get('retention_days'),
+            batch_size=request_json.get('batch_size'),
+            run_as_workflow=run_as_workflow)
+
+
+class ExecutionsBulk(SecuredResource):
+    @swagger.operation(
+        responseClass=responses_v2_1.BulkExecution,
+        nickname="bulkExecute",
+        notes='Executes a workflow, with the same parameters, on many '
+              'deployments: either the `deployment_ids`, or the deployments '
+              'matching `deployment_filters`. Returns the result of each '
+              'deployment: the ID of its new execution, or the error that '
+              'prevented executing the workflow on it'
+    )
+    @exceptions_handled
+    @marshal_with(responses_v2_1.BulkExecution)
+    def post(self, **_):
+        verify_json_content_type()
+        request_json = request.json
+        verify_parameter_in_request_body('workflow_id', request_json)
+        verify_parameter_in_request_body('deployment_ids', request_json,
+                                         param_type=list, optional=True)
+        verify_parameter_in_request_body('deployment_filters', request_json,
+                                         param_type=dict, optional=True)
+        verify_parameter_in_request_body('parameters', request_json,
+                                         param_type=dict, optional=True)
+        deployment_ids = request_json.get('deployment_ids')
+        deployment_filters = request_json.get('deployment_filters')
+        if (deployment_ids is None) == (deployment_filters is None):
+            raise manager_exceptions.BadParametersError(
+                'Exactly one of deployment_ids and deployment_filters must '
+                'be passed')
+        for key in deployment_filters or {}:
+            if not hasattr(models.Deployment, key.split('.')[0]):
+                raise manager_exceptions.BadParametersError(
+                    'Deployments can not be filtered by {0}'.format(key))
+        allow_custom_parameters = verify_and_convert_bool(
+            'allow_custom_parameters',
+            request_json.get('allow_custom_parameters', 'false'))
+        force = verify_and_convert_bool(
+            'force',
+            request_json.get('force', 'false'))
+
+        results = get_blueprints_manager().execute_workflows(
+            request_json['workflow_id'],
+            deployment_ids=deployment_ids,
+            deployment_filters=deployment_filters,
+            parameters=request_json.get('parameters'),
+            allow_custom_parameters=allow_custom_parameters,
+            force=force,
+            bypass_maintenance=is_bypass_maintenance_mode())
+        response_results = []
+        for result in results:
+            execution, error = result['execution'], result['error']
+            response_results.append({
+                'deployment_id': result['deployment_id'],
+                'execution_id': execution.id if execution else None,
+                'error_code': getattr(
+                    error, 'error_code',
+                    manager_exceptions.INTERNAL_SERVER_ERROR_CODE)
+                if error else None,
+                'error_message': str(error) if error else None
+            })
+        started = len([result for result in results if result['execution']])
+        return {
+            'workflow_id': request_json['workflow_id'],
+            'started': started,
+            'failed': len(results) - started,
+            'results': response_results
+        }, 201
+
+
 class Nodes(resources_v2.Nodes):
 
     get = override_marshal_with(resources_v2.Nodes.get,
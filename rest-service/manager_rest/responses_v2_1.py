@@ -111,3 +111,185 @@ class NodeInstance(NodeInstanceV1):
     def __init__(self, **kwargs):
         super(NodeInstance, self).__init__(**kwargs)
         self.scaling_groups = kwargs.get('scaling_groups')
+
+
+@swagger.model
+class Migrations(object):
+    resource_fields = {
+        'migrations': fields.List(fields.String)
+    }
+
+    def __init__(self, **kwargs):
+        self.migrations = kwargs.get('migrations')
+
+
+@swagger.model
+class DatabasePoolStatus(object):
+    resource_fields = {
+        'size': fields.Integer,
+        'checked_in': fields.Integer,
+        'checked_out': fields.Integer,
+        'overflow': fields.Integer,
+        'connects': fields.Integer,
+        'checkouts': fields.Integer,
+        'checkins': fields.Integer,
+        'invalidations': fields.Integer,
+        'checkout_wait_total': fields.Float,
+        'checkout_wait_max': fields.Float
+    }
+
+    def __init__(self, **kwargs):
+        self.size = kwargs.get('size')
+        self.checked_in = kwargs.get('checked_in')
+        self.checked_out = kwargs.get('checked_out')
+        self.overflow = kwargs.get('overflow')
+        self.connects = kwargs.get('connects')
+        self.checkouts = kwargs.get('checkouts')
+        self.checkins = kwargs.get('checkins')
+        self.invalidations = kwargs.get('invalidations')
+        self.checkout_wait_total = kwargs.get('checkout_wait_total')
+        self.checkout_wait_max = kwargs.get('checkout_wait_max')
+
+
+@swagger.model
+class BulkExecutionResult(object):
+    resource_fields = {
+        'deployment_id': fields.String,
+        'execution_id': fields.String,
+        'error_code': fields.String,
+        'error_message': fields.String
+    }
+
+    def __init__(self, **kwargs):
+        self.deployment_id = kwargs.get('deployment_id')
+        self.execution_id = kwargs.get('execution_id')
+        self.error_code = kwargs.get('error_code')
+        self.error_message = kwargs.get('error_message')
+
+
+@swagger.model
+class BulkExecution(object):
+    resource_fields = {
+        'workflow_id': fields.String,
+        'started': fields.Integer,
+        'failed': fields.Integer,
+        'results': fields.List(
+            fields.Nested(BulkExecutionResult.resource_fields))
+    }
+
+    def __init__(self, **kwargs):
+        self.workflow_id = kwargs.get('workflow_id')
+        self.started = kwargs.get('started')
+        self.failed = kwargs.get('failed')
+        self.results = kwargs.get('results')
+
+
+@swagger.model
+class BrokerStatus(object):
+    resource_fields = {
+        'clients': fields.Integer,
+        'connection_pool_limit': fields.Integer,
+        'publishes': fields.Integer,
+        'publish_errors': fields.Integer,
+        'publish_time_total': fields.Float,
+        'publish_time_max': fields.Float
+    }
+
+    def __init__(self, **kwargs):
+        self.clients = kwargs.get('clients')
+        self.connection_pool_limit = kwargs.get('connection_pool_limit')
+        self.publishes = kwargs.get('publishes')
+        self.publish_errors = kwargs.get('publish_errors')
+        self.publish_time_total = kwargs.get('publish_time_total')
+        self.publish_time_max = kwargs.get('publish_time_max')
+
+
+@swagger.model
+class ExecutionQueueStatus(object):
+    resource_fields = {
+        'depth': fields.Integer,
+        'running': fields.Integer,
+        'oldest_wait_time': fields.Float,
+        'queued': fields.Integer,
+        'released': fields.Integer,
+        'wait_time_total': fields.Float,
+        'wait_time_max': fields.Float,
+        'max_concurrent_executions': fields.Integer,
+        'max_concurrent_executions_per_blueprint': fields.Integer,
+        'max_concurrent_executions_per_workflow': fields.Integer
+    }
+
+    def __init__(self, **kwargs):
+        self.depth = kwargs.get('depth')
+        self.running = kwargs.get('running')
+        self.oldest_wait_time = kwargs.get('oldest_wait_time')
+        self.queued = kwargs.get('queued')
+        self.released = kwargs.get('released')
+        self.wait_time_total = kwargs.get('wait_time_total')
+        self.wait_time_max = kwargs.get('wait_time_max')
+        self.max_concurrent_executions = \
+            kwargs.get('max_concurrent_executions')
+        self.max_concurrent_executions_per_blueprint = \
+            kwargs.get('max_concurrent_executions_per_blueprint')
+        self.max_concurrent_executions_per_workflow = \
+            kwargs.get('max_concurrent_executions_per_workflow')
+
+
+@swagger.model
+class DefinitionsCacheStatus(object):
+    resource_fields = {
+        'hits': fields.Integer,
+        'misses': fields.Integer,
+        'evictions': fields.Integer,
+        'entries': fields.Integer,
+        'size': fields.Integer,
+        'max_size': fields.Integer
+    }
+
+    def __init__(self, **kwargs):
+        self.hits = kwargs.get('hits')
+        self.misses = kwargs.get('misses')
+        self.evictions = kwargs.get('evictions')
+        self.entries = kwargs.get('entries')
+        self.size = kwargs.get('size')
+        self.max_size = kwargs.get('max_size')
+
+
+@swagger.model
+class QueryStatistics(object):
+    resource_fields = {
+        'endpoints': fields.Raw
+    }
+
+    def __init__(self, **kwargs):
+        self.endpoints = kwargs.get('endpoints')
+
+
+@swagger.model
+class DeploymentSummary(object):
+    resource_fields = {
+        'deployment_id': fields.String,
+        'node_instances': fields.Raw,
+        'executions': fields.Raw,
+        'last_execution': fields.Raw
+    }
+
+    def __init__(self, **kwargs):
+        self.deployment_id = kwargs.get('deployment_id')
+        self.node_instances = kwargs.get('node_instances')
+        self.executions = kwargs.get('executions')
+        self.last_execution = kwargs.get('last_execution')
+
+
+@swagger.model
+class ExecutionsArchive(object):
+    resource_fields = {
+        'archived': fields.Integer,
+        'created_before': fields.String,
+        'execution_id': fields.String
+    }
+
+    def __init__(self, **kwargs):
+        self.archived = kwargs.get('archived')
+        self.created_before = kwargs.get('created_before')
+        self.execution_id = kwargs.get('execution_id')
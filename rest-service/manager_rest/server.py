@@ -24,7 +24,7 @@ from flask import Flask, jsonify
 from flask_security import Security
 
 from manager_rest import config
-from manager_rest.storage import db
+from manager_rest.storage import db, instrumentation, routing
 from manager_rest.endpoint_mapper import setup_resources
 from manager_rest.maintenance import maintenance_mode_handler
 from manager_rest.security import user_datastore, user_loader, configure_ldap
@@ -48,6 +48,8 @@ class CloudifyFlaskApp(Flask):
         self.before_request(log_request)
         self.before_request(maintenance_mode_handler)
         self.after_request(log_response)
+        self.after_request(instrumentation.add_response_headers)
+        self.teardown_request(instrumentation.finish_request)
 
         self._set_exception_handlers()
         self._set_sql_alchemy()
@@ -84,10 +86,33 @@ class CloudifyFlaskApp(Flask):
                 cfy_config.postgresql_host,
                 cfy_config.postgresql_db_name
             )
+        self.config['SQLALCHEMY_BINDS'] = dict(
+            ('{0}{1}'.format(routing.REPLICA_BIND_PREFIX, index), uri)
+            for index, uri in enumerate(cfy_config.postgresql_replica_uris))
         self.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        if SQL_DIALECT == 'postgresql':
+            # Pool sizing only applies to the server based DB (SQLite, used
+            # in tests, manages its own connections)
+            self.config['SQLALCHEMY_POOL_SIZE'] = \
+                cfy_config.postgresql_pool_size
+            self.config['SQLALCHEMY_MAX_OVERFLOW'] = \
+                cfy_config.postgresql_max_overflow
+            self.config['SQLALCHEMY_POOL_TIMEOUT'] = \
+                cfy_config.postgresql_pool_timeout
+            self.config['SQLALCHEMY_POOL_RECYCLE'] = \
+                cfy_config.postgresql_pool_recycle
+            self.config['SQLALCHEMY_POOL_PRE_PING'] = \
+                cfy_config.postgresql_pool_pre_ping
         with self.app_context():
             db.init_app(self)  # Set the app to use the SQLAlchemy DB
 
+        # The app context is pushed globally, so Flask-SQLAlchemy's app
+        # context teardown never runs - release the session's connection back
+        # to the pool at the end of every request instead
+        @self.teardown_request
+        def remove_session(_):
+            db.session.remove()
+
     def _set_exception_handlers(self):
         """Set custom exception handlers for the Flask app
         """
@@ -17,4 +17,6 @@ from .models import db                                      # NOQA
 from .file_server import FileServer                         # NOQA
 from .storage_manager import ListResult                     # NOQA
 from .storage_manager import get_storage_manager            # NOQA
+from .storage_manager import JSON_PATH_SEPARATOR            # NOQA
+from .unit_of_work import UnitOfWork                        # NOQA
 from .manager_elasticsearch import ManagerElasticsearch     # NOQA
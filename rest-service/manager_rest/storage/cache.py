@@ -0,0 +1,134 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import json
+from threading import Lock
+from collections import OrderedDict
+
+
+class DefinitionsCache(object):
+    """A thread-safe LRU cache of large definitions (e.g. blueprint plans),
+    bounded by the total size of the cached values, in bytes (as JSON)
+
+    Every value is cached with a version (e.g. the time its row was last
+    updated). Looking up a key with a different version is a miss, which
+    replaces the cached value - so values updated by other processes aren't
+    served stale. The cached values are shared, and mustn't be modified
+    """
+    def __init__(self, max_size):
+        """
+        :param max_size: Max total size of the cached values, in bytes.
+        0 disables the cache
+        """
+        self.max_size = max_size
+        self._lock = Lock()
+        self._entries = OrderedDict()   # key -> (version, value, size)
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version, load):
+        """Return the value of `key`, calling `load` to get it on a miss
+
+        :param key: A hashable key
+        :param version: The current version of the value
+        :param load: A function that returns the current value
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                # Re-inserting moves the entry to the most recently used end
+                self._entries[key] = entry
+                return entry[1]
+            if entry is not None:
+                self._size -= entry[2]
+            self.misses += 1
+
+        value = load()
+        self._put(key, version, value)
+        return value
+
+    def get_many(self, versions, load):
+        """Return the values of several keys, like `get`, loading all the
+        missing values with a single call
+
+        :param versions: A dict of the current version of each key
+        :param load: A function that takes a list of the missing keys, and
+        returns a dict of their current values
+        :return: A dict of the values of the keys
+        """
+        values = {}
+        with self._lock:
+            for key, version in versions.iteritems():
+                entry = self._entries.pop(key, None)
+                if entry is not None and entry[0] == version:
+                    self.hits += 1
+                    self._entries[key] = entry
+                    values[key] = entry[1]
+                    continue
+                if entry is not None:
+                    self._size -= entry[2]
+                self.misses += 1
+
+        missing = [key for key in versions if key not in values]
+        if missing:
+            loaded = load(missing)
+            for key in missing:
+                self._put(key, versions[key], loaded[key])
+            values.update(loaded)
+        return values
+
+    def _put(self, key, version, value):
+        if self.max_size <= 0:
+            return
+        size = len(json.dumps(value))
+        if size > self.max_size:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[2]
+            self._entries[key] = (version, value, size)
+            self._size += size
+            while self._size > self.max_size:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def to_dict(self):
+        """Return the usage counters and the current state of the cache
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size': self._size,
+                'max_size': self.max_size
+            }
@@ -0,0 +1,209 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""Per-request statistics of the SQL queries issued by the REST service.
+
+Every statement executed while handling a request is counted and timed.
+Statements of the same shape (the same SQL, up to the number of values in
+IN lists) repeated many times in one request are flagged as probable N+1
+query patterns. The statistics are aggregated per endpoint, added to the
+response headers when `sql_debug_headers` is set, and logged when the
+request exceeds the configured thresholds
+"""
+
+import re
+import time
+from threading import Lock
+from collections import Counter
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+
+from manager_rest import config
+
+QUERY_COUNT_HEADER = 'X-Cloudify-Query-Count'
+QUERY_TIME_HEADER = 'X-Cloudify-Query-Time'
+N_PLUS_ONE_HEADER = 'X-Cloudify-Probable-N-Plus-One'
+
+# The number of the slowest statements kept for each request
+SLOWEST_QUERIES = 5
+
+# Set on the request when its first statement is executed
+_QUERIES_ATTR = '_sql_queries'
+_START_TIME_ATTR = '_sql_start_time'
+# Lists of bound parameters, e.g. `(?, ?, ?)` or `(%(id_1)s, %(id_2)s)`
+_PARAMETERS_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s)\s*,)*'
+                              r'\s*(?:\?|%\(\w+\)s)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    """Return the shape of an SQL statement: its text, with whitespace
+    collapsed, and with lists of bound parameters (of any length) replaced
+    by `(...)`
+    """
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    return _PARAMETERS_LIST.sub('(...)', statement)
+
+
+class RequestQueries(object):
+    """The statements executed while handling a single request
+    """
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest = []   # (duration, statement), slowest first
+        self.shapes = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total_time += duration
+        self.shapes[statement_shape(statement)] += 1
+        if len(self.slowest) < SLOWEST_QUERIES or \
+                duration > self.slowest[-1][0]:
+            self.slowest.append((duration, statement))
+            self.slowest.sort(key=lambda query: query[0], reverse=True)
+            del self.slowest[SLOWEST_QUERIES:]
+
+    def repeated_shapes(self, threshold):
+        """Return (shape, count) of the statement shapes that were executed
+        at least `threshold` times - probable N+1 query patterns
+        """
+        return [(shape, count) for shape, count in self.shapes.most_common()
+                if count >= threshold]
+
+
+class EndpointStatistics(object):
+    """Process-wide query statistics, aggregated per endpoint
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def record(self, endpoint, queries, n_plus_one):
+        """
+        :param endpoint: e.g. `GET /api/v2.1/executions`
+        :param queries: The RequestQueries of a request to `endpoint`
+        :param n_plus_one: The request's probable N+1 query patterns
+        """
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0,
+                'queries': 0,
+                'queries_max': 0,
+                'query_time': 0.0,
+                'query_time_max': 0.0,
+                'n_plus_one_requests': 0
+            })
+            stats['requests'] += 1
+            stats['queries'] += queries.count
+            stats['queries_max'] = max(stats['queries_max'], queries.count)
+            stats['query_time'] += queries.total_time
+            stats['query_time_max'] = max(stats['query_time_max'],
+                                          queries.total_time)
+            if n_plus_one:
+                stats['n_plus_one_requests'] += 1
+
+    def to_dict(self):
+        with self._lock:
+            return {endpoint: dict(stats)
+                    for endpoint, stats in self._endpoints.iteritems()}
+
+
+statistics = EndpointStatistics()
+
+
+def setup_query_events(engine):
+    """Attach the statement timing listeners to an engine
+    """
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if context is not None:
+        setattr(context, _START_TIME_ATTR, time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    start_time = getattr(context, _START_TIME_ATTR, None)
+    if start_time is None or not has_request_context():
+        return
+    current_queries(create=True).record(statement, time.time() - start_time)
+
+
+def current_queries(create=False):
+    """Return the RequestQueries of the current request (None if it didn't
+    execute any statements yet, unless `create` is set)
+    """
+    queries = getattr(request, _QUERIES_ATTR, None)
+    if queries is None and create:
+        queries = RequestQueries()
+        setattr(request, _QUERIES_ATTR, queries)
+    return queries
+
+
+def add_response_headers(response):
+    """Add the current request's query statistics to the response headers
+    (if `sql_debug_headers` is set). Statements of streamed responses run
+    after the headers were sent, and aren't included
+    """
+    if config.instance.sql_debug_headers:
+        queries = current_queries(create=True)
+        n_plus_one = queries.repeated_shapes(
+            config.instance.sql_n_plus_one_threshold)
+        response.headers[QUERY_COUNT_HEADER] = str(queries.count)
+        response.headers[QUERY_TIME_HEADER] = \
+            '{0:.6f}'.format(queries.total_time)
+        response.headers[N_PLUS_ONE_HEADER] = str(len(n_plus_one))
+    return response
+
+
+def finish_request(_):
+    """Aggregate the query statistics of the request to its endpoint, and
+    log them if the request exceeded the configured thresholds
+    """
+    queries = current_queries()
+    if queries is None or request.url_rule is None:
+        return
+    cfy_config = config.instance
+    n_plus_one = queries.repeated_shapes(cfy_config.sql_n_plus_one_threshold)
+    endpoint = '{0} {1}'.format(request.method, request.url_rule.rule)
+    statistics.record(endpoint, queries, n_plus_one)
+
+    if n_plus_one or \
+            queries.count >= cfy_config.sql_log_query_count_threshold or \
+            queries.total_time >= cfy_config.sql_log_query_time_threshold:
+        current_app.logger.warning(
+            '\nSQL queries of request ({0}) {1} {2}:\n'
+            '\tcount: {3}\n'
+            '\ttotal time: {4:.3f} seconds\n'
+            '\tslowest: {5}\n'
+            '\tprobable N+1: {6}'.format(
+                id(request),
+                request.method,
+                request.path,
+                queries.count,
+                queries.total_time,
+                ['{0:.3f}s {1}'.format(duration, statement)
+                 for duration, statement in queries.slowest],
+                ['{0}x {1}'.format(count, shape)
+                 for shape, count in n_plus_one]))
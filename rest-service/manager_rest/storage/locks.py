@@ -0,0 +1,121 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""Per-deployment locks, which serialize the work on a single deployment
+(e.g. starting and ending deployment modifications, or committing
+deployment updates) while work on different deployments runs in parallel,
+and the lock of the execution queue, which serializes the admission of
+executions (see `execution_scheduler`).
+
+A lock is taken inside a unit of work, and is held until the outermost
+unit of work ends. On PostgreSQL it's a transaction-level advisory lock,
+which is released by the commit (or rollback) itself. Other databases
+(i.e. SQLite, in tests and development) fall back to a file lock
+"""
+
+import os
+import fcntl
+import zlib
+import tempfile
+
+from flask import g
+from sqlalchemy import text
+
+from manager_rest.storage import unit_of_work
+from manager_rest.storage.models import db
+
+# The first key of the advisory locks of deployments (and of the execution
+# queue), which keeps them apart from other advisory locks
+DEPLOYMENT_LOCK_NAMESPACE = 1
+EXECUTION_QUEUE_LOCK_NAMESPACE = 2
+# The directory of the lock files of the fallback
+LOCKS_DIR = os.path.join(tempfile.gettempdir(), 'cloudify-deployment-locks')
+
+# The (namespace, key) of the locks held by the current unit of work
+_HELD_LOCKS_ATTR = '_held_deployment_locks'
+
+
+def deployment_lock_key(deployment_id):
+    """Return the (32 bit, signed) key of the lock of a deployment.
+    Deployments whose keys collide share a lock, which only serializes
+    their work needlessly
+    """
+    key = zlib.crc32(deployment_id.encode('utf-8')) & 0xffffffff
+    return key - (1 << 32) if key >= (1 << 31) else key
+
+
+def lock_deployment(deployment_id):
+    """Wait for the lock of a deployment, and hold it until the current
+    (outermost) unit of work ends. Taking a lock the unit of work already
+    holds does nothing
+    """
+    _lock(DEPLOYMENT_LOCK_NAMESPACE, deployment_lock_key(deployment_id))
+
+
+def lock_execution_queue():
+    """Wait for the lock of the execution queue, and hold it until the
+    current (outermost) unit of work ends
+    """
+    _lock(EXECUTION_QUEUE_LOCK_NAMESPACE, 0)
+
+
+def _lock(namespace, key):
+    if not unit_of_work.is_active():
+        raise RuntimeError('Locks can only be taken inside a unit of work')
+    held_locks = getattr(g, _HELD_LOCKS_ATTR, None)
+    if held_locks is None:
+        held_locks = {}
+        setattr(g, _HELD_LOCKS_ATTR, held_locks)
+        unit_of_work.on_end(_release_locks)
+    if (namespace, key) in held_locks:
+        return
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(
+            text('SELECT pg_advisory_xact_lock(:namespace, :key)'),
+            {'namespace': namespace, 'key': key})
+        held_locks[namespace, key] = None
+    else:
+        held_locks[namespace, key] = _lock_file(namespace, key)
+
+
+def _lock_file(namespace, key):
+    if not os.path.isdir(LOCKS_DIR):
+        try:
+            os.makedirs(LOCKS_DIR)
+        except OSError:
+            # Created concurrently
+            if not os.path.isdir(LOCKS_DIR):
+                raise
+    lock_file = open(os.path.join(LOCKS_DIR, '{0}-{1:x}.lock'.format(
+        namespace, key & 0xffffffff)), 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+    except Exception:
+        lock_file.close()
+        raise
+    return lock_file
+
+
+def _release_locks():
+    """Release the file locks held by the unit of work that ended (the
+    advisory locks were already released by the end of its transaction)
+    """
+    held_locks = getattr(g, _HELD_LOCKS_ATTR, None) or {}
+    setattr(g, _HELD_LOCKS_ATTR, None)
+    for lock_file in held_locks.values():
+        if lock_file is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
@@ -0,0 +1,305 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""Schema and data migrations of an existing manager DB.
+
+Every migration is idempotent, so all of them can be run on a DB of any
+previous version (e.g. after an upgrade). After restoring an older
+manager's snapshot, the restore workflow runs them through the REST
+service's `migrations` endpoint. To run them manually:
+
+    python -m manager_rest.storage.migrations \
+        postgresql://<username>:<password>@<host>/<db_name>
+"""
+
+import sys
+import zlib
+import json
+import pickle
+import logging
+
+from sqlalchemy import bindparam, create_engine, inspect, text
+from sqlalchemy.types import LargeBinary
+
+from manager_rest.storage import models
+
+logger = logging.getLogger(__name__)
+
+
+def _json_columns(column_type=models.JSONType):
+    """Yield (table, column name) for each JSON column of the models
+    """
+    for table in models.db.metadata.sorted_tables:
+        for column in table.columns:
+            if isinstance(column.type, column_type):
+                yield table, column.name
+
+
+def _to_json(value):
+    """Return a JSON string of a (possibly pickled) legacy value
+    """
+    if value is None:
+        return None
+    if not isinstance(value, basestring):
+        value = str(value)  # Binary values are returned as buffers
+    try:
+        json.loads(value)
+        return value  # Already migrated
+    except ValueError:
+        return json.dumps(pickle.loads(value))
+
+
+def _convert_rows(connection, table, source_column, target_column,
+                  value_type=None):
+    pk = table.primary_key.columns.values()[0].name
+    rows = connection.execute(
+        text('SELECT {0}, {1} FROM {2}'.format(pk, source_column,
+                                               table.name)))
+    value_sql = 'CAST(:value AS {0})'.format(value_type) if value_type \
+        else ':value'
+    update = text('UPDATE {0} SET {1} = {2} WHERE {3} = :pk'.format(
+        table.name, target_column, value_sql, pk))
+    for row_id, value in rows.fetchall():
+        connection.execute(update, pk=row_id, value=_to_json(value))
+
+
+def migrate_pickle_columns_to_json(connection):
+    """Convert the columns that used to be stored pickled to JSON.
+
+    In PostgreSQL, the legacy BYTEA columns are replaced with JSONB columns.
+    In other DBs (i.e. SQLite, which doesn't enforce column types) the
+    values are converted in place
+    """
+    is_postgresql = connection.dialect.name == 'postgresql'
+    inspector = inspect(connection)
+    existing_tables = inspector.get_table_names()
+    for table, column_name in _json_columns():
+        if table.name not in existing_tables:
+            continue
+        if not is_postgresql:
+            with connection.begin():
+                _convert_rows(connection, table, column_name, column_name)
+            continue
+
+        db_column = [c for c in inspector.get_columns(table.name)
+                     if c['name'] == column_name][0]
+        if not isinstance(db_column['type'], LargeBinary):
+            continue
+        logger.info('Migrating %s.%s to JSONB', table.name, column_name)
+        tmp_column = '{0}_json'.format(column_name)
+        with connection.begin():
+            connection.execute(text('ALTER TABLE {0} ADD COLUMN {1} JSONB'
+                                    .format(table.name, tmp_column)))
+            _convert_rows(connection, table, column_name, tmp_column,
+                          value_type='JSONB')
+            connection.execute(text('ALTER TABLE {0} DROP COLUMN {1}'
+                                    .format(table.name, column_name)))
+            connection.execute(text('ALTER TABLE {0} RENAME COLUMN {1} TO {2}'
+                                    .format(table.name, tmp_column,
+                                            column_name)))
+            if not db_column['nullable']:
+                connection.execute(text(
+                    'ALTER TABLE {0} ALTER COLUMN {1} SET NOT NULL'
+                    .format(table.name, column_name)))
+
+
+def _from_legacy_value(value):
+    """Return the value of a (possibly pickled, or JSON) legacy value of a
+    compressed JSON column
+    """
+    try:
+        return models.decode_compressed_json(value)
+    except (ValueError, zlib.error):
+        return pickle.loads(str(value))
+
+
+def compress_json_columns(connection):
+    """Rewrite the values of the compressed JSON columns (e.g. blueprint
+    plans) that aren't stored compressed yet, or that are stored pickled.
+
+    In PostgreSQL, the legacy JSONB columns are first converted to BYTEA
+    columns (holding the JSON text). The rows are rewritten one at a time,
+    since each value may be several MB
+    """
+    is_postgresql = connection.dialect.name == 'postgresql'
+    inspector = inspect(connection)
+    existing_tables = inspector.get_table_names()
+    for table, column_name in _json_columns(models.CompressedJSONType):
+        if table.name not in existing_tables:
+            continue
+        pk = table.primary_key.columns.values()[0].name
+        with connection.begin():
+            if is_postgresql:
+                db_column = [c for c in inspector.get_columns(table.name)
+                             if c['name'] == column_name][0]
+                if not isinstance(db_column['type'], LargeBinary):
+                    logger.info('Converting %s.%s to BYTEA',
+                                table.name, column_name)
+                    connection.execute(text(
+                        "ALTER TABLE {0} ALTER COLUMN {1} TYPE BYTEA "
+                        "USING convert_to({1}::text, 'UTF8')"
+                        .format(table.name, column_name)))
+            logger.info('Compressing %s.%s', table.name, column_name)
+            rows = connection.execute(text(
+                'SELECT {0} FROM {1} WHERE {2} IS NOT NULL'.format(
+                    pk, table.name, column_name)))
+            row_ids = [row_id for row_id, in rows.fetchall()]
+            # Text statements return the stored values as they are
+            select_value = text('SELECT {0} FROM {1} WHERE {2} = :pk'.format(
+                column_name, table.name, pk))
+            update = text('UPDATE {0} SET {1} = :value WHERE {2} = :pk'
+                          .format(table.name, column_name, pk))\
+                .bindparams(bindparam('value', type_=LargeBinary))
+            for row_id in row_ids:
+                stored = connection.execute(select_value, pk=row_id).scalar()
+                value = models.encode_compressed_json(
+                    _from_legacy_value(stored))
+                # Legacy text values are rewritten as binary values
+                if not isinstance(stored, unicode) and str(stored) == value:
+                    continue
+                connection.execute(update, pk=row_id, value=value)
+
+
+def create_missing_tables(connection):
+    """Create the tables of the models that don't exist in the DB yet (e.g.
+    the executions archive)
+    """
+    inspector = inspect(connection)
+    existing_tables = inspector.get_table_names()
+    for table in models.db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            logger.info('Creating table %s', table.name)
+            # Its enum types may already exist (e.g. `execution_status`,
+            # shared by the executions and their archive)
+            table.create(connection, checkfirst=True)
+
+
+def create_missing_indexes(connection):
+    """Create the indexes of the models that don't exist in the DB yet
+    """
+    inspector = inspect(connection)
+    existing_tables = inspector.get_table_names()
+    for table in models.db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = set(index['name']
+                               for index in inspector.get_indexes(table.name))
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            logger.info('Creating index %s', index.name)
+            index.create(connection)
+
+
+def split_node_instance_payloads(connection):
+    """Move the runtime properties and relationships of the node instances
+    from the node_instances table to the node_instance_payloads table.
+
+    In PostgreSQL, the legacy columns are dropped afterwards. In other DBs
+    (i.e. SQLite, which can't drop columns) they're left in place, and only
+    node instances without a payload are copied
+    """
+    is_postgresql = connection.dialect.name == 'postgresql'
+    inspector = inspect(connection)
+    if 'node_instances' not in inspector.get_table_names():
+        return
+    fields = models.NodeInstancePayload.FIELDS
+    legacy_columns = [column['name'] for column
+                      in inspector.get_columns('node_instances')
+                      if column['name'] in fields]
+
+    with connection.begin():
+        models.NodeInstancePayload.__table__.create(connection,
+                                                    checkfirst=True)
+        if len(legacy_columns) != len(fields):
+            return
+        logger.info('Moving node instance payloads to their own table')
+        rows = connection.execute(text(
+            'SELECT n.id, n.{0}, n.{1} FROM node_instances n '
+            'LEFT OUTER JOIN node_instance_payloads p '
+            'ON p.node_instance_id = n.id '
+            'WHERE p.node_instance_id IS NULL'.format(*fields)))
+        value_sql = 'CAST(:{0} AS JSONB)' if is_postgresql else ':{0}'
+        insert = text(
+            'INSERT INTO node_instance_payloads (node_instance_id, {0}, {1}) '
+            'VALUES (:id, {2}, {3})'.format(
+                fields[0], fields[1],
+                value_sql.format(fields[0]), value_sql.format(fields[1])))
+        for row_id, runtime_properties, relationships in rows.fetchall():
+            connection.execute(insert,
+                               id=row_id,
+                               runtime_properties=_to_json(runtime_properties),
+                               relationships=_to_json(relationships))
+        if is_postgresql:
+            for column_name in fields:
+                connection.execute(text(
+                    'ALTER TABLE node_instances DROP COLUMN {0}'
+                    .format(column_name)))
+
+
+def add_execution_statuses(connection):
+    """Add the new execution statuses (e.g. `queued`) to the PostgreSQL
+    enum type of the executions' status. In other DBs (i.e. SQLite) the
+    statuses are only checked when the tables are created
+    """
+    if connection.dialect.name != 'postgresql':
+        return
+    existing_statuses = set(row[0] for row in connection.execute(text(
+        'SELECT e.enumlabel FROM pg_enum e '
+        'JOIN pg_type t ON t.oid = e.enumtypid '
+        "WHERE t.typname = 'execution_status'")))
+    if not existing_statuses:
+        # The executions table wasn't created yet
+        return
+    # ALTER TYPE ... ADD VALUE can't run inside a transaction block
+    autocommit = connection.execution_options(isolation_level='AUTOCOMMIT')
+    for status in models.Execution.STATES:
+        if status not in existing_statuses:
+            logger.info('Adding execution status %s', status)
+            autocommit.execute(text(
+                "ALTER TYPE execution_status ADD VALUE '{0}'".format(status)))
+
+
+MIGRATIONS = [
+    migrate_pickle_columns_to_json,
+    compress_json_columns,
+    split_node_instance_payloads,
+    create_missing_tables,
+    create_missing_indexes,
+    # Last, since it switches the connection to autocommit
+    add_execution_statuses
+]
+
+
+def migrate(engine):
+    """Run all the migrations on the DB of `engine`
+
+    :return: The names of the migrations
+    """
+    with engine.connect() as connection:
+        for migration in MIGRATIONS:
+            migration(connection)
+    return [migration.__name__ for migration in MIGRATIONS]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 2:
+        sys.exit('Usage: {0} <db-url>'.format(sys.argv[0]))
+    migrate(create_engine(sys.argv[1]))
+
+
+if __name__ == '__main__':
+    main()
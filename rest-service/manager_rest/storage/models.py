@@ -13,15 +13,26 @@
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
 
+import json
+import zlib
+import sqlite3
+
 import jsonpickle
-from flask_sqlalchemy import SQLAlchemy
 from dateutil import parser as date_parser
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.associationproxy import association_proxy
 
 from manager_rest.utils import classproperty
+from manager_rest.storage.pool import PooledSQLAlchemy
 from manager_rest.deployment_update.constants import ACTION_TYPES, ENTITY_TYPES
 
 
-db = SQLAlchemy()
+db = PooledSQLAlchemy()
 
 
 class UTCDateTime(db.TypeDecorator):
@@ -47,6 +58,188 @@ class UTCDateTime(db.TypeDecorator):
             return value
 
 
+class JSONType(db.TypeDecorator):
+    """JSON data - stored as JSONB in PostgreSQL, and as JSON encoded text in
+    other DBs (i.e. SQLite, used in tests)
+    """
+    impl = db.Text
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(JSONB(none_as_null=True))
+        return dialect.type_descriptor(db.Text())
+
+    def process_bind_param(self, value, dialect):
+        # JSONB does its own serialization
+        if value is None or dialect.name == 'postgresql':
+            return value
+        return json.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name == 'postgresql':
+            return value
+        return json.loads(value)
+
+
+# Values of compressed JSON columns whose JSON encoding is at least this
+# long (in bytes) are stored compressed
+COMPRESSION_THRESHOLD = 1024
+COMPRESSION_LEVEL = 6
+# The first byte of zlib streams (with the default window size) - never
+# the first byte of JSON text
+_ZLIB_HEADER = b'\x78'
+
+
+def encode_compressed_json(value,
+                           threshold=COMPRESSION_THRESHOLD,
+                           level=COMPRESSION_LEVEL):
+    """Encode `value` as compact JSON, compressed with zlib if the JSON is
+    at least `threshold` bytes long
+    """
+    data = json.dumps(value, separators=(',', ':'))
+    if isinstance(data, unicode):
+        data = data.encode('utf-8')
+    if len(data) >= threshold:
+        return zlib.compress(data, level)
+    return data
+
+
+def decode_compressed_json(data):
+    """Decode a value encoded by `encode_compressed_json` (or plain JSON)
+    """
+    if isinstance(data, unicode):
+        data = data.encode('utf-8')
+    data = bytes(data)  # Binary values may be returned as buffers
+    if data.startswith(_ZLIB_HEADER):
+        data = zlib.decompress(data)
+    return json.loads(data)
+
+
+class CompressedJSONType(db.TypeDecorator):
+    """JSON data, for large values that are only read and written whole
+    (e.g. plans) - stored as compact JSON in a binary column, compressed
+    when it's longer than `threshold` bytes. Unlike JSONType, the values
+    can't be queried by the DB
+    """
+    impl = db.LargeBinary
+
+    def __init__(self, threshold=COMPRESSION_THRESHOLD,
+                 level=COMPRESSION_LEVEL, *args, **kwargs):
+        super(CompressedJSONType, self).__init__(*args, **kwargs)
+        self.threshold = threshold
+        self.level = level
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode_compressed_json(value, self.threshold, self.level)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decode_compressed_json(value)
+
+
+class json_contains(FunctionElement):
+    """A JSON containment condition: `json_contains(column, value)` is
+    true if the JSON `column` contains the (JSON serializable) `value` -
+    e.g. `{"ip": "10.0.0.5"}` is contained in `{"ip": "10.0.0.5", "a": 1}`.
+
+    In PostgreSQL, this is the JSONB `@>` operator (which can use a GIN
+    index). In SQLite (used in tests), it's evaluated by `_json_contains`
+    """
+    name = 'json_contains'
+    type = db.Boolean()
+
+    def __init__(self, column, value):
+        super(json_contains, self).__init__(
+            column, db.literal(json.dumps(value), type_=db.Text))
+
+
+@compiles(json_contains)
+def _compile_json_contains(element, compiler, **kw):
+    return 'json_contains({0})'.format(
+        compiler.process(element.clauses, **kw))
+
+
+@compiles(json_contains, 'postgresql')
+def _compile_json_contains_postgresql(element, compiler, **kw):
+    column, value = list(element.clauses)
+    return '{0} @> CAST({1} AS JSONB)'.format(compiler.process(column, **kw),
+                                              compiler.process(value, **kw))
+
+
+def _json_contains(container, contained):
+    """The semantics of PostgreSQL's JSONB containment, for decoded values
+    """
+    if isinstance(contained, dict):
+        return isinstance(container, dict) and all(
+            key in container and _json_contains(container[key], value)
+            for key, value in contained.iteritems())
+    if isinstance(contained, list):
+        return isinstance(container, list) and all(
+            any(_json_contains(item, value) for item in container)
+            for value in contained)
+    return container == contained
+
+
+def _sqlite_json_contains(container, contained):
+    if container is None or contained is None:
+        return None
+    return _json_contains(json.loads(container), json.loads(contained))
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('json_contains', 2,
+                                         _sqlite_json_contains)
+
+
+@compiles(CreateTable, 'postgresql')
+def _compile_create_table(create, compiler, **kw):
+    # Tables with a `partition_by` info key are created as partitioned
+    # tables in PostgreSQL (and as regular tables in other DBs)
+    statement = compiler.visit_create_table(create, **kw)
+    partition_by = create.element.info.get('partition_by')
+    if partition_by:
+        statement = '{0} PARTITION BY {1}\n\n'.format(statement.rstrip(),
+                                                       partition_by)
+    return statement
+
+
+# Heavy columns are only loaded when explicitly requested (the storage
+# manager does it for whole-entity queries), so implicit loads - e.g. of
+# relationships and cascading deletes - don't load and decode them
+DEFERRED_GROUP = 'deferred'
+
+
+def _json_column(nullable=True, deferred=False):
+    """Create a JSON column
+
+    :param nullable: Can the column's value be null [default: True]
+    :param deferred: Should the column be loaded only when requested
+    [default: False]
+    """
+    column = db.Column(JSONType, nullable=nullable)
+    if deferred:
+        return db.deferred(column, group=DEFERRED_GROUP)
+    return column
+
+
+def _compressed_json_column(nullable=True, deferred=False):
+    """Create a compressed JSON column (see CompressedJSONType)
+
+    :param nullable: Can the column's value be null [default: True]
+    :param deferred: Should the column be loaded only when requested
+    [default: False]
+    """
+    column = db.Column(CompressedJSONType, nullable=nullable)
+    if deferred:
+        return db.deferred(column, group=DEFERRED_GROUP)
+    return column
+
+
 def _foreign_key_column(parent_table, id_col_name='id', nullable=False):
     """Return a ForeignKey object with the relevant
 
@@ -99,6 +292,15 @@ def _relationship(
     )
 
 
+def _payload_field(name):
+    """Return a NodeInstance attribute that proxies a field of its payload
+    (and creates the payload when it's first set)
+    """
+    return association_proxy(
+        'payload', name,
+        creator=lambda value: NodeInstancePayload(**{name: value}))
+
+
 class SerializableBase(db.Model):
     """Abstract base class for all SQL models that allows [de]serialization
     """
@@ -140,7 +342,7 @@ class Blueprint(SerializableBase):
     updated_at = db.Column(UTCDateTime, nullable=True, index=True)
     description = db.Column(db.Text, nullable=True)
     main_file_name = db.Column(db.Text, nullable=False)
-    plan = db.Column(db.PickleType, nullable=False)
+    plan = _compressed_json_column(nullable=False, deferred=True)
 
 
 class Snapshot(SerializableBase):
@@ -167,14 +369,14 @@ class Deployment(SerializableBase):
     created_at = db.Column(UTCDateTime, nullable=False, index=True)
     updated_at = db.Column(UTCDateTime, nullable=True, index=True)
     blueprint_id = _foreign_key_column(Blueprint, nullable=True)
-    workflows = db.Column(db.PickleType, nullable=True)
-    inputs = db.Column(db.PickleType, nullable=True)
-    policy_types = db.Column(db.PickleType, nullable=True)
-    policy_triggers = db.Column(db.PickleType, nullable=True)
-    groups = db.Column(db.PickleType, nullable=True)
-    scaling_groups = db.Column(db.PickleType, nullable=True)
+    workflows = _json_column(deferred=True)
+    inputs = _json_column()
+    policy_types = _json_column(deferred=True)
+    policy_triggers = _json_column(deferred=True)
+    groups = _json_column(deferred=True)
+    scaling_groups = _json_column()
     description = db.Column(db.Text, nullable=True)
-    outputs = db.Column(db.PickleType, nullable=True)
+    outputs = _json_column(deferred=True)
     permalink = db.Column(db.Text, nullable=True)
 
     blueprint = _relationship(
@@ -187,6 +389,14 @@ class Deployment(SerializableBase):
 
 class Execution(SerializableBase):
     __tablename__ = 'executions'
+    __table_args__ = (
+        # Active executions of a deployment
+        db.Index('ix_executions_deployment_id_status',
+                 'deployment_id', 'status'),
+        # Active (system) executions of the whole manager
+        db.Index('ix_executions_status_is_system_workflow',
+                 'status', 'is_system_workflow'),
+    )
 
     TERMINATED = 'terminated'
     FAILED = 'failed'
@@ -195,9 +405,11 @@ class Execution(SerializableBase):
     STARTED = 'started'
     CANCELLING = 'cancelling'
     FORCE_CANCELLING = 'force_cancelling'
+    # Waiting for running executions to end (see `execution_scheduler`)
+    QUEUED = 'queued'
 
     STATES = [TERMINATED, FAILED, CANCELLED, PENDING, STARTED,
-              CANCELLING, FORCE_CANCELLING]
+              CANCELLING, FORCE_CANCELLING, QUEUED]
     END_STATES = [TERMINATED, FAILED, CANCELLED]
     ACTIVE_STATES = [state for state in STATES if state not in END_STATES]
 
@@ -225,6 +437,51 @@ class Execution(SerializableBase):
     )
 
 
+class ExecutionArchive(SerializableBase):
+    """Ended executions that were moved out of the executions table by
+    the retention (see `SQLStorageManager.archive_executions`).
+
+    In PostgreSQL, the table is partitioned by the month of `created_at`
+    (so the partition key is part of the primary key). The archived rows
+    don't reference their deployments and blueprints, which may be deleted
+    """
+    __tablename__ = 'executions_archive'
+    __table_args__ = (
+        db.Index('ix_executions_archive_deployment_id',
+                 'deployment_id'),
+        {'info': {'partition_by': 'RANGE (created_at)'}}
+    )
+
+    id = db.Column(db.Text, primary_key=True)
+    status = db.Column(db.Enum(*Execution.STATES, name='execution_status'))
+    deployment_id = db.Column(db.Text, nullable=True)
+    workflow_id = db.Column(db.Text, nullable=False)
+    blueprint_id = db.Column(db.Text, nullable=True)
+    created_at = db.Column(UTCDateTime, primary_key=True)
+    error = db.Column(db.Text, nullable=True)
+    parameters = db.Column(db.PickleType, nullable=True)
+    is_system_workflow = db.Column(db.Boolean, nullable=False)
+
+
+def _all_executions():
+    """Return a selectable of both the executions and the archived ones
+    """
+    column_names = Execution.__table__.columns.keys()
+    return db.union_all(
+        db.select([Execution.__table__.c[name] for name in column_names]),
+        db.select([ExecutionArchive.__table__.c[name]
+                   for name in column_names])
+    ).alias('all_executions')
+
+
+class ExecutionWithArchive(SerializableBase):
+    """A read-only view of the executions, including the archived ones,
+    which can be listed the same way as executions
+    """
+    __table__ = _all_executions()
+    __mapper_args__ = {'primary_key': [__table__.c.id]}
+
+
 class DeploymentUpdateStep(SerializableBase):
     __tablename__ = 'deployment_update_steps'
 
@@ -236,16 +493,23 @@ class DeploymentUpdateStep(SerializableBase):
 
 class DeploymentUpdate(SerializableBase):
     __tablename__ = 'deployment_updates'
+    __table_args__ = (
+        db.Index('ix_deployment_updates_deployment_id_state',
+                 'deployment_id', 'state'),
+    )
 
     id = db.Column(db.Text, primary_key=True, index=True)
     deployment_id = _foreign_key_column(Deployment)
-    deployment_plan = db.Column(db.PickleType, nullable=True)
+    deployment_plan = _compressed_json_column(deferred=True)
     state = db.Column(db.Text, nullable=True)
+    # `steps` and `deployment_update_node_instances` hold model objects
+    # (DeploymentUpdateStep and NodeInstance), so they can't be stored as JSON
     steps = db.Column(db.PickleType, nullable=True)
-    deployment_update_nodes = db.Column(db.PickleType, nullable=True)
-    deployment_update_node_instances = db.Column(db.PickleType, nullable=True)
-    deployment_update_deployment = db.Column(db.PickleType, nullable=True)
-    modified_entity_ids = db.Column(db.PickleType, nullable=True)
+    deployment_update_nodes = _json_column(deferred=True)
+    deployment_update_node_instances = db.deferred(
+        db.Column(db.PickleType, nullable=True), group=DEFERRED_GROUP)
+    deployment_update_deployment = _json_column(deferred=True)
+    modified_entity_ids = _json_column()
     execution_id = _foreign_key_column(Execution, nullable=True)
     created_at = db.Column(UTCDateTime, nullable=False, index=True)
 
@@ -272,6 +536,10 @@ class DeploymentUpdate(SerializableBase):
 
 class DeploymentModification(SerializableBase):
     __tablename__ = 'deployment_modifications'
+    __table_args__ = (
+        db.Index('ix_deployment_modifications_deployment_id_status',
+                 'deployment_id', 'status'),
+    )
 
     STARTED = 'started'
     FINISHED = 'finished'
@@ -286,7 +554,13 @@ class DeploymentModification(SerializableBase):
     status = db.Column(db.Enum(*STATES, name='deployment_modification_status'))
     deployment_id = _foreign_key_column(Deployment)
     modified_nodes = db.Column(db.PickleType, nullable=True)
-    node_instances = db.Column(db.PickleType, nullable=True)
+    # The node instances changes (`added_and_related`/`removed_and_related`)
+    # and deltas of the touched instances only: `before_modification` holds
+    # the prior state of the existing instances related to the changes, and
+    # `before_rollback` the state of the instances a rollback deleted or
+    # restored. Older records, whose `before_modification` holds a copy of
+    # all the node instances of the deployment, are still accepted
+    node_instances = _compressed_json_column()
     context = db.Column(db.PickleType, nullable=True)
 
     deployment = _relationship(
@@ -305,7 +579,7 @@ class Node(SerializableBase):
     deployment_id = _foreign_key_column(Deployment)
     blueprint_id = _foreign_key_column(Blueprint, nullable=True)
     type = db.Column(db.Text, nullable=False, index=True)
-    type_hierarchy = db.Column(db.PickleType, nullable=True)
+    type_hierarchy = _json_column()
     number_of_instances = db.Column(db.Integer, nullable=False)
     planned_number_of_instances = db.Column(db.Integer, nullable=False)
     deploy_number_of_instances = db.Column(db.Integer, nullable=False)
@@ -314,11 +588,11 @@ class Node(SerializableBase):
     # TODO: This probably should be a foreign key, but there's no guarantee
     # in the code, currently, that the host will be created beforehand
     host_id = db.Column(db.Text, nullable=True)
-    properties = db.Column(db.PickleType, nullable=True)
-    operations = db.Column(db.PickleType, nullable=True)
-    plugins = db.Column(db.PickleType, nullable=True)
-    relationships = db.Column(db.PickleType, nullable=True)
-    plugins_to_install = db.Column(db.PickleType, nullable=True)
+    properties = _json_column(deferred=True)
+    operations = _json_column(deferred=True)
+    plugins = _json_column(deferred=True)
+    relationships = _json_column(deferred=True)
+    plugins_to_install = _json_column(deferred=True)
 
     blueprint = _relationship(
         child_class_name='Node',
@@ -348,19 +622,21 @@ class Node(SerializableBase):
 
 class NodeInstance(SerializableBase):
     __tablename__ = 'node_instances'
+    __table_args__ = (
+        db.Index('ix_node_instances_deployment_id_node_id',
+                 'deployment_id', 'node_id'),
+    )
 
     id = db.Column(db.Text, primary_key=True, index=True)
     node_storage_id = _foreign_key_column(Node, 'storage_id')
     node_id = db.Column(db.Text, nullable=False)
     deployment_id = _foreign_key_column(Deployment)
-    runtime_properties = db.Column(db.PickleType, nullable=True)
     state = db.Column(db.Text, nullable=False)
     version = db.Column(db.Integer, default=1)
-    relationships = db.Column(db.PickleType, nullable=True)
     # TODO: This probably should be a foreign key, but there's no guarantee
     # in the code, currently, that the host will be created beforehand
     host_id = db.Column(db.Text, nullable=True)
-    scaling_groups = db.Column(db.PickleType, nullable=True)
+    scaling_groups = _json_column()
 
     node = _relationship(
         child_class_name='NodeInstance',
@@ -375,18 +651,66 @@ class NodeInstance(SerializableBase):
         parent_class_name='Deployment',
         child_table_name='node_instances'
     )
+    # The large, rarely updated fields are stored in a separate table, so
+    # state transitions don't rewrite them (see NodeInstancePayload)
+    payload = db.relationship('NodeInstancePayload',
+                              uselist=False,
+                              cascade='all, delete-orphan',
+                              passive_deletes=True)
+    runtime_properties = _payload_field('runtime_properties')
+    relationships = _payload_field('relationships')
 
     def to_dict(self):
         node_instance_dict = super(NodeInstance, self).to_dict()
         # Internal field that shouldn't be sent to users
         del node_instance_dict['node_storage_id']
+        for field in NodeInstancePayload.FIELDS:
+            node_instance_dict[field] = getattr(self, field)
         return node_instance_dict
 
     @classproperty
     def fields(self):
         fields = super(NodeInstance, self).fields
         fields.remove('node_storage_id')
-        return fields
+        return fields + list(NodeInstancePayload.FIELDS)
+
+
+class NodeInstancePayload(db.Model):
+    """The runtime properties and relationships of a node instance.
+
+    Every node instance has exactly one payload row. It's loaded with the
+    node instance on whole-entity queries, and isn't touched by updates of
+    the node instance's other columns (e.g. its state)
+    """
+    __tablename__ = 'node_instance_payloads'
+    __table_args__ = (
+        # Supports the containment filters of runtime properties (GIN
+        # indexes are PostgreSQL only; other DBs get a regular index)
+        db.Index('ix_node_instance_payloads_runtime_properties',
+                 'runtime_properties',
+                 postgresql_using='gin',
+                 postgresql_ops={'runtime_properties': 'jsonb_path_ops'}),
+    )
+
+    FIELDS = ('runtime_properties', 'relationships')
+
+    node_instance_id = db.Column(
+        db.Text,
+        db.ForeignKey('node_instances.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    runtime_properties = _json_column()
+    relationships = _json_column()
+
+
+@event.listens_for(NodeInstance, 'after_delete')
+def _delete_node_instance_payload(mapper, connection, node_instance):
+    # PostgreSQL deletes the payload by the foreign key's cascade, but
+    # SQLite (used in tests) doesn't enforce foreign keys
+    if connection.dialect.name != 'postgresql':
+        table = NodeInstancePayload.__table__
+        connection.execute(table.delete().where(
+            table.c.node_instance_id == node_instance.id))
 
 
 class ProviderContext(SerializableBase):
@@ -0,0 +1,182 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import time
+from threading import Lock
+
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, exc, select
+from sqlalchemy.pool import QueuePool
+
+from manager_rest.storage import instrumentation, routing
+
+
+class PoolStatistics(object):
+    """Process-wide usage counters of the DB connection pool
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.checkout_wait_total = 0.0
+            self.checkout_wait_max = 0.0
+
+    def increment(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_checkout_wait(self, wait):
+        with self._lock:
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+
+    def to_dict(self, pool=None):
+        """Return the counters, and the pool's current state if available
+
+        :param pool: An optional SQLAlchemy pool object
+        """
+        with self._lock:
+            stats = {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidations': self.invalidations,
+                'checkout_wait_total': self.checkout_wait_total,
+                'checkout_wait_max': self.checkout_wait_max
+            }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow()
+            })
+        return stats
+
+
+statistics = PoolStatistics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool that records how long each checkout waited for a
+    connection to become available
+    """
+    def _do_get(self):
+        start = time.time()
+        try:
+            return super(InstrumentedQueuePool, self)._do_get()
+        finally:
+            statistics.record_checkout_wait(time.time() - start)
+
+
+class RoutingSession(SignallingSession):
+    """A session that sends its queries to a read replica while the storage
+    manager routes reads to one (see `routing`), and to the primary otherwise
+    """
+    def __init__(self, db, **options):
+        self.db = db
+        super(RoutingSession, self).__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        bind = routing.current_replica_bind()
+        if bind is not None:
+            return self.db.get_engine(self.app, bind=bind)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy extension that keeps a long-lived, instrumented
+    connection pool for server based databases (the primary, and any read
+    replicas)
+    """
+    def create_session(self, options):
+        return RoutingSession(self, **options)
+
+    def apply_driver_hacks(self, app, info, options):
+        super(PooledSQLAlchemy, self).apply_driver_hacks(app, info, options)
+        # SQLite (used in tests) has its own pooling logic
+        if info.drivername != 'sqlite':
+            options['poolclass'] = InstrumentedQueuePool
+
+    def get_engine(self, app, bind=None):
+        # The engine is created lazily, on first use
+        engine = super(PooledSQLAlchemy, self).get_engine(app, bind)
+        if not event.contains(engine, 'checkout', _on_checkout):
+            setup_pool_events(
+                engine,
+                pre_ping=app.config.get('SQLALCHEMY_POOL_PRE_PING', False)
+            )
+            instrumentation.setup_query_events(engine)
+        return engine
+
+
+def setup_pool_events(engine, pre_ping=False):
+    """Attach the statistics listeners (and optionally a pre-ping) to an
+    engine's connection pool
+
+    :param engine: SQLAlchemy engine
+    :param pre_ping: Test each connection on checkout, and transparently
+    reconnect if it was dropped by the server
+    """
+    event.listen(engine, 'connect', _on_connect)
+    event.listen(engine, 'checkout', _on_checkout)
+    event.listen(engine, 'checkin', _on_checkin)
+    event.listen(engine, 'invalidate', _on_invalidate)
+
+    if pre_ping:
+        event.listen(engine, 'engine_connect', _ping_connection)
+
+
+def _on_connect(*_):
+    statistics.increment('connects')
+
+
+def _on_checkout(*_):
+    statistics.increment('checkouts')
+
+
+def _on_checkin(*_):
+    statistics.increment('checkins')
+
+
+def _on_invalidate(*_):
+    statistics.increment('invalidations')
+
+
+def _ping_connection(connection, branch):
+    # "Sub" connections share the parent's DBAPI connection
+    if branch:
+        return
+
+    # Don't let the ping itself close the connection
+    should_close_with_result = connection.should_close_with_result
+    connection.should_close_with_result = False
+    try:
+        connection.scalar(select([1]))
+    except exc.DBAPIError as e:
+        # The whole pool was invalidated by the failed ping - the retry will
+        # transparently open a new connection
+        if e.connection_invalidated:
+            connection.scalar(select([1]))
+        else:
+            raise
+    finally:
+        connection.should_close_with_result = should_close_with_result
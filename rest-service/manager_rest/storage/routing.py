@@ -0,0 +1,67 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+# The read replicas are configured as SQLAlchemy binds with this prefix
+REPLICA_BIND_PREFIX = 'replica_'
+
+# Set on the request once it wrote (or is about to write) to the primary
+_STICKY_PRIMARY_ATTR = '_sticky_primary'
+# The bind of the replica that the current reads are routed to
+_REPLICA_BIND_ATTR = '_replica_bind'
+
+
+def replica_binds(app):
+    """Return the bind keys of the read replicas configured for `app`
+    """
+    binds = app.config.get('SQLALCHEMY_BINDS') or {}
+    return sorted(bind for bind in binds
+                  if bind.startswith(REPLICA_BIND_PREFIX))
+
+
+def mark_sticky_primary():
+    """Route all the following reads of the current request to the primary,
+    so the request always reads its own writes
+    """
+    if has_request_context():
+        setattr(request, _STICKY_PRIMARY_ATTR, True)
+
+
+def is_sticky_primary():
+    return has_request_context() and \
+        getattr(request, _STICKY_PRIMARY_ATTR, False)
+
+
+def current_replica_bind():
+    """Return the bind key of the replica that queries are currently routed
+    to, or None if they're sent to the primary
+    """
+    return getattr(g, _REPLICA_BIND_ATTR, None)
+
+
+@contextmanager
+def route_reads(bind):
+    """Send the queries of the block to the replica `bind` (or to the
+    primary, if it's None)
+    """
+    previous = current_replica_bind()
+    setattr(g, _REPLICA_BIND_ATTR, bind)
+    try:
+        yield
+    finally:
+        setattr(g, _REPLICA_BIND_ATTR, previous)
@@ -13,14 +13,32 @@
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
 
+import json
 import uuid
+import random
+import base64
 from functools import wraps
-from flask import current_app
-from contextlib import contextmanager
-from sqlalchemy.exc import SQLAlchemyError
+from collections import OrderedDict
 
-from manager_rest import manager_exceptions
-from manager_rest.storage.models import db
+from flask import current_app, has_request_context
+from sqlalchemy import (and_, or_, bindparam, exists, false, func, inspect,
+                        select, text, true)
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.associationproxy import AssociationProxy
+from sqlalchemy.orm.attributes import set_committed_value
+
+from manager_rest import config, manager_exceptions, utils
+from manager_rest.storage import (cache,
+                                  instrumentation,
+                                  locks,
+                                  migrations,
+                                  pool,
+                                  routing,
+                                  unit_of_work)
+from manager_rest.storage.models import (db,
+                                         json_contains,
+                                         JSONType,
+                                         DEFERRED_GROUP)
 from manager_rest.storage.models import (Blueprint,
                                          Snapshot,
                                          Deployment,
@@ -28,53 +46,123 @@ from manager_rest.storage.models import (Blueprint,
                                          DeploymentUpdateStep,
                                          DeploymentModification,
                                          Execution,
+                                         ExecutionArchive,
+                                         ExecutionWithArchive,
                                          Node,
                                          NodeInstance,
+                                         NodeInstancePayload,
                                          ProviderContext,
                                          Plugin)
 
 PROVIDER_CONTEXT_ID = 'CONTEXT'
-TABLE_LOCK_STR = 'LOCK TABLE {0} IN ACCESS EXCLUSIVE MODE;'
+# Separates a JSON field from the path of a value inside it, in filter keys
+# (e.g. `runtime_properties.cloudify_agent.queue`)
+JSON_PATH_SEPARATOR = '.'
+# Number of rows fetched from the DB at a time when streaming list results
+STREAM_BATCH_SIZE = 500
 
 
 def _close_session(f):
+    """Close the session after the call, which returns its connection to
+    the engine's pool (the pool itself is kept alive between calls).
+    Inside a unit of work, the session is closed when the unit of work ends
+    """
     @wraps(f)
     def wrapper(*args, **kwargs):
         try:
             return f(*args, **kwargs)
         finally:
-            db.session.close()
-            db.engine.dispose()
+            if not unit_of_work.is_active():
+                db.session.close()
     return wrapper
 
 
-@contextmanager
-def _lock_table(table_class):
-    """Use optimistic lock to lock out a postgres table table
+def _read_only(f):
+    """Send the queries of a read-only call to a read replica, when one is
+    configured and the current request hasn't written anything yet.
+    Reads outside requests, and inside units of work, go to the primary
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        with routing.route_reads(_choose_replica_bind()):
+            return f(*args, **kwargs)
+    return wrapper
+
 
-    :param table_class: The SQLAlchemy class
+def _writes(f):
+    """Send the queries of a call that writes - including the reads it does
+    before writing - and of the rest of the current request to the primary
     """
-    sql_connection_str = current_app.config.get('SQLALCHEMY_DATABASE_URI')
-    sql_dialect = sql_connection_str.split(':')[0]
-
-    # Locking is only relevant for PostgreSQL
-    if 'postgresql' in sql_dialect:
-        table_name = table_class.__tablename__
-        db.session.begin_nested()  # Start nested transaction
-        db.session.execute(TABLE_LOCK_STR.format(table_name))
-        try:
-            yield
-        finally:
-            db.session.commit()  # Commit the nested transaction
-    else:
-        yield
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        routing.mark_sticky_primary()
+        with routing.route_reads(None):
+            return f(*args, **kwargs)
+    return wrapper
+
+
+def _choose_replica_bind():
+    """Return the bind key of the replica to read from, or None to read
+    from the primary
+    """
+    # Nested read-only calls keep reading from the same replica
+    bind = routing.current_replica_bind()
+    if bind is not None:
+        return bind
+    if not has_request_context() or routing.is_sticky_primary() or \
+            unit_of_work.is_active():
+        return None
+    binds = routing.replica_binds(current_app)
+    return random.choice(binds) if binds else None
+
+
+def _add_sql_error(exception, sql_error):
+    """Append the original SQL error to the message of `exception`
+    """
+    full_err = '{0}\nSQL error: {1}'.format(str(exception), str(sql_error))
+    exception.args = (full_err,) + exception.args[1:]
+    return exception
+
+
+def _encode_cursor(sort, values):
+    """Create an opaque pagination cursor from the sort order and the values
+    of the sort columns in the last row of a page
+    """
+    cursor = {'sort': sort.items(), 'values': values}
+    return base64.urlsafe_b64encode(json.dumps(cursor))
+
+
+def _decode_cursor(cursor):
+    """Decode a pagination cursor created by `_encode_cursor`
+
+    :return: A dict with `sort` and `values` keys, or None for an empty
+    cursor (i.e. the first page)
+    """
+    if not cursor:
+        return None
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        if len(decoded['sort']) != len(decoded['values']):
+            raise ValueError('Mismatching sort fields and values')
+    except (TypeError, ValueError, KeyError):
+        raise manager_exceptions.BadParametersError(
+            'Invalid pagination cursor: {0}'.format(cursor))
+    return decoded
 
 
 class SQLStorageManager(object):
+    def __init__(self):
+        # Blueprint plans and deployment workflows are large, and rarely
+        # change - so they're cached, keyed by the row's ID, and versioned
+        # by its creation/update time
+        self._definitions_cache = cache.DefinitionsCache(
+            config.instance.definitions_cache_size)
+
     @staticmethod
     @_close_session
     def _safe_commit(exception=None):
         """Try to commit changes in the session. Roll back if exception raised
+        Inside a unit of work, the changes are only flushed
 
         Excepts SQLAlchemy errors and rollbacks if they're caught
         :param exception: Optional exception to raise instead of the
@@ -82,18 +170,57 @@ class SQLStorageManager(object):
         """
         try:
             db.session.flush()
+            if unit_of_work.is_active():
+                return
             db.session.expunge_all()
             db.session.commit()
         except SQLAlchemyError as e:
             db.session.rollback()
             if exception:
-                full_err = '{0}\nSQL error: {1}'.format(
-                    str(exception), str(e)
-                )
-                exception.args = (full_err,) + exception.args[1:]
-                raise exception
+                raise _add_sql_error(exception, e)
+            raise
+
+    @staticmethod
+    @_close_session
+    def _safe_bulk_insert(instances, exception=None):
+        """Insert all `instances` in a single transaction, using executemany
+        style INSERTs (committed with the unit of work, inside one).
+        Roll back if exception raised
+
+        :param instances: A list of model instances of the same class
+        :param exception: Optional exception to raise instead of the
+        one raised by SQLAlchemy
+        """
+        try:
+            db.session.bulk_save_objects(instances)
+            if not unit_of_work.is_active():
+                db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            if exception:
+                raise _add_sql_error(exception, e)
             raise
 
+    @staticmethod
+    @_close_session
+    def _safe_execute(statement, params=None):
+        """Execute a single (UPDATE/DELETE) statement in its own transaction
+        (or in the unit of work's). Roll back if exception raised
+
+        :param statement: A SQLAlchemy core statement
+        :param params: Optional list of bound parameter dicts - the statement
+        is executed once for each of them, using executemany
+        :return: The number of rows matched by the statement
+        """
+        try:
+            rowcount = db.session.execute(statement, params).rowcount
+            if not unit_of_work.is_active():
+                db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            raise
+        return rowcount
+
     def _safe_add(self, instance):
         """Add `instance` to the DB session, and attempt to commit
 
@@ -109,6 +236,20 @@ class SQLStorageManager(object):
         self._safe_commit(custom_exception)
         return instance
 
+    def _safe_add_all(self, instances):
+        """Add all `instances` to the DB in a single transaction
+
+        :param instances: A list of instances of the same model class
+        """
+        if not instances:
+            return instances
+        custom_exception = manager_exceptions.ConflictError(
+            'One or more of the {0} {1} instances being added already '
+            'exist'.format(len(instances), instances[0].__class__.__name__)
+        )
+        self._safe_bulk_insert(instances, custom_exception)
+        return instances
+
     @staticmethod
     def _get_base_query(model_class, include=None):
         """Create the initial query from the model class and included columns
@@ -117,9 +258,15 @@ class SQLStorageManager(object):
         :param include: An optional list of columns to include in the query
         :return: An SQLAlchemy AppenderQuery object
         """
+        proxied_fields = SQLStorageManager._get_proxied_fields(model_class)
         # If all columns should be returned, query directly from the model
+        # (including the columns that are deferred by default, and the
+        # related rows that hold some of the fields)
         if not include:
-            return model_class.query
+            options = [db.undefer_group(DEFERRED_GROUP)]
+            options.extend(db.joinedload(proxy.target_collection)
+                           for proxy in proxied_fields.values())
+            return model_class.query.options(*options)
 
         for column_name in include:
             if not hasattr(model_class, column_name):
@@ -129,8 +276,34 @@ class SQLStorageManager(object):
                     )
                 )
         # If only some columns are included, query through the session object
-        columns_to_query = [getattr(model_class, column) for column in include]
-        return db.session.query(*columns_to_query)
+        columns_to_query = []
+        joins = []
+        for column_name in include:
+            if column_name in proxied_fields:
+                # The field is a column of a related table
+                proxy = proxied_fields[column_name]
+                if proxy.target_collection not in joins:
+                    joins.append(proxy.target_collection)
+                column = getattr(proxy.target_class, proxy.value_attr)
+            else:
+                column = getattr(model_class, column_name)
+            columns_to_query.append(column)
+        query = db.session.query(*columns_to_query)
+        if joins:
+            query = query.select_from(model_class)
+            for relationship in joins:
+                query = query.outerjoin(getattr(model_class, relationship))
+        return query
+
+    @staticmethod
+    def _get_proxied_fields(model_class):
+        """Return the fields of `model_class` that are stored in related
+        tables (e.g. the node instance payloads), as a dict of field name to
+        its association proxy
+        """
+        return {name: descriptor for name, descriptor
+                in inspect(model_class).all_orm_descriptors.items()
+                if isinstance(descriptor, AssociationProxy)}
 
     @staticmethod
     def _sort_query(query, model_class, sort=None):
@@ -158,7 +331,8 @@ class SQLStorageManager(object):
         :param model_class: SQL DB table class
         :param filters: An optional dictionary where keys are column names to
         filter by, and values are values applicable for those columns (or lists
-        of such values)
+        of such values). A key can also be a path inside a JSON field, e.g.
+        `runtime_properties.ip`
         :return: An SQLAlchemy AppenderQuery object
         """
         # We need to differentiate between different kinds of filers:
@@ -169,14 +343,73 @@ class SQLStorageManager(object):
             return query
 
         for key, value in filters.iteritems():
-            if isinstance(value, (list, tuple)):
+            if JSON_PATH_SEPARATOR in key:
+                query = query.filter(SQLStorageManager._json_path_filter(
+                    model_class, key, value))
+            elif isinstance(value, (list, tuple)):
                 column = getattr(model_class, key)
                 query = query.filter(column.in_(value))
             else:
-                query = query.filter_by(**{key: value})
+                # Not `filter_by`, which filters by the last joined table
+                query = query.filter(getattr(model_class, key) == value)
 
         return query
 
+    @staticmethod
+    def _json_path_filter(model_class, key, value):
+        """Return a condition matching entities that have `value` (or any
+        of the values, if it's a list) at the path `key` of a JSON field
+
+        :param model_class: SQL DB table class
+        :param key: A JSON field, and the keys of the path inside it,
+        separated by `JSON_PATH_SEPARATOR`
+        :param value: A value, or a list of values
+        """
+        path = key.split(JSON_PATH_SEPARATOR)
+        field_name = path.pop(0)
+        proxy = SQLStorageManager._get_proxied_fields(model_class)\
+            .get(field_name)
+        if proxy is not None:
+            column = getattr(proxy.target_class, proxy.value_attr)
+        else:
+            column = getattr(model_class, field_name, None)
+        if not path or not isinstance(getattr(column, 'type', None),
+                                      JSONType):
+            raise manager_exceptions.BadParametersError(
+                'Class {0} does not have a JSON field {1}'.format(
+                    model_class.__name__, field_name))
+
+        values = value if isinstance(value, (list, tuple)) else [value]
+        conditions = []
+        for filter_value in values:
+            for candidate in SQLStorageManager._json_candidates(filter_value):
+                document = candidate
+                for path_key in reversed(path):
+                    document = {path_key: document}
+                conditions.append(json_contains(column, document))
+        condition = or_(*conditions)
+        if proxy is not None:
+            # Filter through EXISTS, so the query itself isn't joined
+            return getattr(model_class, proxy.target_collection).has(condition)
+        return condition
+
+    @staticmethod
+    def _json_candidates(value):
+        """Return the JSON values a filter value may stand for: query
+        string values are always strings, so `8080` should also match the
+        number 8080 (and `true` the boolean)
+        """
+        candidates = [value]
+        if isinstance(value, basestring):
+            try:
+                decoded = json.loads(value)
+            except ValueError:
+                return candidates
+            if not isinstance(decoded, (basestring, dict, list)) and \
+                    decoded is not None:
+                candidates.append(decoded)
+        return candidates
+
     def _get_query(self,
                    model_class,
                    include=None,
@@ -222,23 +455,131 @@ class SQLStorageManager(object):
         """Paginate the query by size and offset
 
         :param query: Current SQLAlchemy query object
-        :param pagination: An optional dict with size and offset keys
+        :param pagination: An optional dict with size and offset keys, and
+        an optional skip_count flag
         :return: A tuple with four elements:
         - results: `size` items starting from `offset`
-        - the total count of items
+        - the total count of items (None if skip_count was requested)
         - `size` [default: 0]
         - `offset` [default: 0]
         """
         if pagination:
             size = pagination.get('size', 0)
             offset = pagination.get('offset', 0)
-            total = query.order_by(None).count()  # Fastest way to count
+            total = None
+            if not pagination.get('skip_count'):
+                total = query.order_by(None).count()  # Fastest way to count
             results = query.limit(size).offset(offset).all()
             return results, total, size, offset
         else:
             results = query.all()
             return results, len(results), 0, 0
 
+    @staticmethod
+    def _get_cursor_sort(model_class, sort=None, cursor=None):
+        """Return the sort order to use for keyset pagination: the requested
+        sort (or the one the cursor was created with), followed by the
+        primary key as a tie-breaker
+
+        :param model_class: SQL DB table class
+        :param sort: An optional dictionary of column names and orders
+        :param cursor: An optional decoded cursor
+        :return: An OrderedDict of column names and orders
+        """
+        if not sort and cursor:
+            sort = cursor['sort']
+        sort = OrderedDict(sort or {})
+        for field in sort:
+            if not hasattr(model_class, field):
+                raise manager_exceptions.BadParametersError(
+                    'Class {0} does not have a {1} field'.format(
+                        model_class.__name__, field))
+        for column in model_class.__mapper__.primary_key:
+            sort.setdefault(column.name, 'asc')
+        if cursor and sort.items() != OrderedDict(cursor['sort']).items():
+            raise manager_exceptions.BadParametersError(
+                'The pagination cursor was created with a different sort '
+                'order: {0}'.format(cursor['sort']))
+        return sort
+
+    @staticmethod
+    def _keyset_filter(model_class, sort, values):
+        """Build a filter for the rows that come after `values` in `sort`
+        order, i.e. `(c1 > v1) OR (c1 = v1 AND c2 > v2) OR ...` (with `<` for
+        descending columns).
+
+        NULLs of nullable columns are placed as the DB sorts them: after all
+        the values in PostgreSQL, and before them in SQLite (used in tests)
+
+        :param model_class: SQL DB table class
+        :param sort: An OrderedDict of column names and orders
+        :param values: The values of the sort columns in the last seen row
+        """
+        nulls_last = db.session.get_bind().dialect.name == 'postgresql'
+        columns = [getattr(model_class, field) for field in sort]
+        clauses = []
+        for i, order in enumerate(sort.values()):
+            conditions = [column.is_(None) if value is None
+                          else column == value
+                          for column, value in zip(columns[:i], values[:i])]
+            conditions.append(SQLStorageManager._keyset_after(
+                columns[i], values[i], order == 'desc', nulls_last))
+            clauses.append(and_(*conditions))
+        return or_(*clauses)
+
+    @staticmethod
+    def _keyset_after(column, value, descending, nulls_last):
+        """Build a condition for the values of `column` that come after
+        `value` in the sort order
+        """
+        # Whether NULLs come after all the values in this order
+        nulls_after = nulls_last != descending
+        if value is None:
+            return false() if nulls_after else column.isnot(None)
+        condition = column < value if descending else column > value
+        if nulls_after and column.nullable:
+            condition = or_(condition, column.is_(None))
+        return condition
+
+    def _list_results_by_cursor(self,
+                                model_class,
+                                include=None,
+                                filters=None,
+                                pagination=None,
+                                sort=None):
+        """Return a page of `model_class` results using keyset pagination,
+        which (unlike LIMIT/OFFSET) doesn't scan the previous pages
+        """
+        size = pagination['size']
+        cursor = _decode_cursor(pagination['cursor'])
+        sort = self._get_cursor_sort(model_class, sort, cursor)
+        if include:
+            # The sort columns are needed to create the next cursor
+            include = list(include) + [field for field in sort
+                                       if field not in include]
+
+        query = self._get_query(model_class, include, filters, sort)
+        total = None
+        if not pagination.get('skip_count'):
+            total = query.order_by(None).count()
+        if cursor:
+            query = query.filter(
+                self._keyset_filter(model_class, sort, cursor['values']))
+
+        # Fetch an extra item, to know whether there's a next page
+        results = query.limit(size + 1).all()
+        next_cursor = None
+        if len(results) > size:
+            results = results[:size]
+            next_cursor = _encode_cursor(
+                sort, [getattr(results[-1], field) for field in sort])
+
+        pagination = {'total': total,
+                      'size': size,
+                      'offset': 0,
+                      'next_cursor': next_cursor}
+        return ListResult(items=results, metadata={'pagination': pagination})
+
     @_close_session
     def _list_results(self,
                       model_class,
@@ -248,6 +589,13 @@ class SQLStorageManager(object):
                       sort=None):
         """Return a (possibly empty) list of `model_class` results
         """
+        if pagination and 'cursor' in pagination:
+            return self._list_results_by_cursor(
+                model_class, include, filters, pagination, sort)
+        if pagination and pagination.get('stream'):
+            return self._stream_results(
+                model_class, include, filters, pagination, sort)
+
         query = self._get_query(model_class, include, filters, sort)
 
         results, total, size, offset = self._paginate(query, pagination)
@@ -255,6 +603,49 @@ class SQLStorageManager(object):
 
         return ListResult(items=results, metadata={'pagination': pagination})
 
+    def _stream_results(self,
+                        model_class,
+                        include=None,
+                        filters=None,
+                        pagination=None,
+                        sort=None):
+        """Return `model_class` results as an iterator, which fetches
+        `STREAM_BATCH_SIZE` rows from the DB at a time (using a server-side
+        cursor, where supported)
+
+        Unless size/offset pagination is requested, the total in the
+        pagination metadata is only set once all the items were iterated
+        """
+        query = self._get_query(model_class, include, filters, sort)
+
+        size = pagination.get('size', 0)
+        offset = pagination.get('offset', 0)
+        total = None
+        is_paginated = 'size' in pagination or 'offset' in pagination
+        if is_paginated:
+            if not pagination.get('skip_count'):
+                total = query.order_by(None).count()
+            query = query.limit(size).offset(offset)
+        pagination = {'total': total, 'size': size, 'offset': offset}
+
+        query = query.execution_options(stream_results=True)\
+            .yield_per(STREAM_BATCH_SIZE)
+        # The query only runs when the results are iterated, after this call
+        # returned - so it's routed explicitly
+        replica_bind = routing.current_replica_bind()
+
+        def iterate_results():
+            count = 0
+            with routing.route_reads(replica_bind):
+                for result in query:
+                    count += 1
+                    yield result
+            if not is_paginated:
+                pagination['total'] = count
+
+        return ListResult(items=iterate_results(),
+                          metadata={'pagination': pagination})
+
     @staticmethod
     def _get_instance(model_class, model):
         """Return an instance of `model_class` from a model dict/object
@@ -310,6 +701,7 @@ class SQLStorageManager(object):
         self._safe_commit()
         return instance
 
+    @_read_only
     def list_blueprints(self, include=None, filters=None, pagination=None,
                         sort=None):
         return self._list_results(
@@ -320,6 +712,7 @@ class SQLStorageManager(object):
             sort=sort
         )
 
+    @_read_only
     def list_snapshots(self, include=None, filters=None, pagination=None,
                        sort=None):
         return self._list_results(
@@ -330,6 +723,7 @@ class SQLStorageManager(object):
             sort=sort
         )
 
+    @_read_only
     def list_deployments(self, include=None, filters=None, pagination=None,
                          sort=None):
         return self._list_results(
@@ -340,6 +734,7 @@ class SQLStorageManager(object):
             sort=sort
         )
 
+    @_read_only
     def list_deployment_updates(self, include=None, filters=None,
                                 pagination=None, sort=None):
         return self._list_results(
@@ -350,16 +745,18 @@ class SQLStorageManager(object):
             sort=sort
         )
 
+    @_read_only
     def list_executions(self, include=None, filters=None, pagination=None,
-                        sort=None):
+                        sort=None, include_archived=False):
         return self._list_results(
-            Execution,
+            ExecutionWithArchive if include_archived else Execution,
             include=include,
             filters=filters,
             pagination=pagination,
             sort=sort
         )
 
+    @_read_only
     def list_node_instances(self, include=None, filters=None, pagination=None,
                             sort=None):
         return self._list_results(
@@ -370,6 +767,7 @@ class SQLStorageManager(object):
             sort=sort
         )
 
+    @_read_only
     def list_plugins(self, include=None, filters=None, pagination=None,
                      sort=None):
         return self._list_results(
@@ -380,6 +778,7 @@ class SQLStorageManager(object):
             sort=sort
         )
 
+    @_read_only
     def list_nodes(self, include=None, filters=None, pagination=None,
                    sort=None):
         return self._list_results(
@@ -390,6 +789,7 @@ class SQLStorageManager(object):
             sort=sort
         )
 
+    @_read_only
     def list_deployment_modifications(self, include=None, filters=None,
                                       pagination=None, sort=None):
         return self._list_results(
@@ -400,6 +800,7 @@ class SQLStorageManager(object):
             sort=sort
         )
 
+    @_read_only
     def list_blueprint_deployments(self, blueprint_id, include=None):
         # TODO: Should probably be done this way (doesn't work with
         # closed session)
@@ -411,12 +812,160 @@ class SQLStorageManager(object):
             filters={'blueprint_id': blueprint_id}
         )
 
+    @_read_only
+    @_close_session
+    def summarize_deployments(self, deployment_ids=None):
+        """Summarize the node instances and executions of deployments, using
+        aggregate (GROUP BY) queries instead of loading them
+
+        :param deployment_ids: An optional list of deployment IDs to
+        summarize (all the deployments are summarized if not passed)
+        :return: A list of summary dicts, sorted by deployment ID
+        """
+        query = db.session.query(Deployment.id).order_by(Deployment.id)
+        if deployment_ids is not None:
+            query = query.filter(Deployment.id.in_(deployment_ids))
+        summaries = OrderedDict(
+            (row.id, {
+                'deployment_id': row.id,
+                'node_instances': {'total': 0, 'by_state': {}, 'by_node': {}},
+                'executions': {'total': 0, 'by_status': {}},
+                'last_execution': None
+            }) for row in query)
+
+        missing = set(deployment_ids or []) - set(summaries)
+        if missing:
+            raise manager_exceptions.NotFoundError(
+                'Requested Deployment with ID `{0}` was not found'
+                .format('`, `'.join(sorted(missing))))
+        if not summaries:
+            return []
+
+        def deployments_filter(column):
+            # Without explicit IDs, all the rows are summarized
+            if deployment_ids is None:
+                return true()
+            return column.in_(deployment_ids)
+
+        instance_counts = db.session.query(
+            NodeInstance.deployment_id,
+            NodeInstance.node_id,
+            NodeInstance.state,
+            func.count(NodeInstance.id)
+        ).filter(
+            deployments_filter(NodeInstance.deployment_id)
+        ).group_by(
+            NodeInstance.deployment_id,
+            NodeInstance.node_id,
+            NodeInstance.state
+        )
+        for deployment_id, node_id, state, count in instance_counts:
+            instances = summaries[deployment_id]['node_instances']
+            instances['total'] += count
+            by_state = instances['by_state']
+            by_state[state] = by_state.get(state, 0) + count
+            instances['by_node'].setdefault(node_id, {})[state] = count
+
+        execution_counts = db.session.query(
+            Execution.deployment_id,
+            Execution.status,
+            func.count(Execution.id)
+        ).filter(
+            deployments_filter(Execution.deployment_id)
+        ).group_by(
+            Execution.deployment_id,
+            Execution.status
+        )
+        for deployment_id, status, count in execution_counts:
+            executions = summaries[deployment_id]['executions']
+            executions['total'] += count
+            executions['by_status'][status] = count
+
+        last_created_at = db.session.query(
+            Execution.deployment_id,
+            func.max(Execution.created_at).label('created_at')
+        ).filter(
+            deployments_filter(Execution.deployment_id)
+        ).group_by(Execution.deployment_id).subquery()
+        last_executions = db.session.query(
+            Execution.id,
+            Execution.deployment_id,
+            Execution.workflow_id,
+            Execution.status,
+            Execution.created_at
+        ).join(
+            last_created_at,
+            and_(Execution.deployment_id == last_created_at.c.deployment_id,
+                 Execution.created_at == last_created_at.c.created_at)
+        ).order_by(Execution.id)
+        for execution in last_executions:
+            # Executions created at the same time are told apart by their ID
+            summaries[execution.deployment_id]['last_execution'] = {
+                'id': execution.id,
+                'workflow_id': execution.workflow_id,
+                'status': execution.status,
+                'created_at': execution.created_at
+            }
+
+        return summaries.values()
+
+    @_read_only
+    @_close_session
+    def count_executions_by_workflow(self, statuses):
+        """Count the executions of user workflows that are in any of
+        `statuses`, by blueprint and workflow (with an aggregate query)
+
+        :return: A list of (blueprint_id, workflow_id, count) tuples
+        """
+        query = db.session.query(
+            Execution.blueprint_id,
+            Execution.workflow_id,
+            func.count(Execution.id)
+        ).filter(
+            Execution.status.in_(statuses),
+            Execution.is_system_workflow == false()
+        ).group_by(
+            Execution.blueprint_id,
+            Execution.workflow_id
+        )
+        return [tuple(row) for row in query]
+
+    @_read_only
+    @_close_session
+    def node_instances_exist(self, deployment_id, exclude_states=None):
+        """Check (with an EXISTS query) whether the deployment has any node
+        instances, optionally ignoring ones in certain states
+        """
+        query = db.session.query(NodeInstance.id).filter(
+            NodeInstance.deployment_id == deployment_id)
+        if exclude_states:
+            query = query.filter(~NodeInstance.state.in_(exclude_states))
+        return db.session.query(query.exists()).scalar()
+
+    @_read_only
+    @_close_session
+    def get_active_system_wide_execution_id(self, exclude_workflows=None):
+        """Return the ID of an active system-wide execution (i.e. one without
+        a deployment), optionally ignoring ones of certain workflows, or None
+        (with a single row query)
+        """
+        query = db.session.query(Execution.id).filter(
+            Execution.status.in_(Execution.ACTIVE_STATES),
+            Execution.deployment_id.is_(None))
+        if exclude_workflows:
+            query = query.filter(~Execution.workflow_id.in_(exclude_workflows))
+        execution = query.first()
+        return execution.id if execution else None
+
+    @_read_only
     def get_node_instance(self, node_instance_id, include=None):
         return self._get_by_id(NodeInstance, node_instance_id, include)
 
+    @_read_only
     def get_provider_context(self, include=None):
         return self._get_by_id(ProviderContext, PROVIDER_CONTEXT_ID, include)
 
+    @_read_only
     def get_deployment_modification(self, modification_id, include=None):
         return self._get_by_id(
             DeploymentModification,
@@ -424,44 +973,151 @@ class SQLStorageManager(object):
             include
         )
 
+    @_read_only
     def get_node(self, deployment_id, node_id, include=None):
         storage_node_id = self._storage_node_id(deployment_id, node_id)
         filters = {'storage_id': storage_node_id}
         return self._get_by_id(Node, storage_node_id, include, filters=filters)
 
+    @_read_only
     def get_blueprint(self, blueprint_id, include=None):
         return self._get_by_id(Blueprint, blueprint_id, include)
 
+    @_read_only
+    def get_blueprint_plan(self, blueprint_id):
+        """Return the (cached) plan of a blueprint. Don't modify it
+        """
+        # Blueprints can't be updated, only deleted and uploaded again
+        version = self.get_blueprint(blueprint_id,
+                                     include=['created_at']).created_at
+        return self._definitions_cache.get(
+            (Blueprint, blueprint_id),
+            version,
+            lambda: self.get_blueprint(blueprint_id, include=['plan']).plan)
+
+    @_read_only
+    def get_blueprint_plans(self, blueprint_ids):
+        """Return the (cached) plans of several blueprints, like
+        `get_blueprint_plan`, with one query for their versions, and one for
+        the plans that aren't cached. Don't modify them
+
+        :return: A dict of the plan of each (existing) blueprint
+        """
+        versions = {
+            (Blueprint, blueprint.id): blueprint.created_at
+            for blueprint in self.list_blueprints(
+                include=['id', 'created_at'],
+                filters={'id': list(blueprint_ids)}).items}
+
+        def load(keys):
+            return {
+                (Blueprint, blueprint.id): blueprint.plan
+                for blueprint in self.list_blueprints(
+                    include=['id', 'plan'],
+                    filters={'id': [key[1] for key in keys]}).items}
+
+        plans = self._definitions_cache.get_many(versions, load)
+        return {key[1]: value for key, value in plans.iteritems()}
+
+    @_read_only
+    def get_deployment_workflows(self, deployment_id):
+        """Return the (cached) workflows of a deployment. Don't modify them
+        """
+        version = self.get_deployment(deployment_id,
+                                      include=['updated_at']).updated_at
+        return self._definitions_cache.get(
+            (Deployment, deployment_id),
+            version,
+            lambda: self.get_deployment(deployment_id,
+                                        include=['workflows']).workflows)
+
+    @_read_only
+    def get_deployments_workflows(self, deployment_ids):
+        """Return the (cached) workflows of several deployments, like
+        `get_deployment_workflows`, with one query for their versions, and
+        one for the workflows that aren't cached. Don't modify them
+
+        :return: A dict of the workflows of each (existing) deployment
+        """
+        versions = {
+            (Deployment, deployment.id): deployment.updated_at
+            for deployment in self.list_deployments(
+                include=['id', 'updated_at'],
+                filters={'id': list(deployment_ids)}).items}
+
+        def load(keys):
+            return {
+                (Deployment, deployment.id): deployment.workflows
+                for deployment in self.list_deployments(
+                    include=['id', 'workflows'],
+                    filters={'id': [key[1] for key in keys]}).items}
+
+        workflows = self._definitions_cache.get_many(versions, load)
+        return {key[1]: value for key, value in workflows.iteritems()}
+
+    def get_definitions_cache_statistics(self):
+        """Return the usage counters and state of the definitions cache
+        """
+        return self._definitions_cache.to_dict()
+
+    @_read_only
     def get_snapshot(self, snapshot_id, include=None):
         return self._get_by_id(Snapshot, snapshot_id, include)
 
+    @_read_only
     def get_deployment(self, deployment_id, include=None):
         return self._get_by_id(Deployment, deployment_id, include)
 
+    @_writes
+    def lock_deployment(self, deployment_id):
+        """Serialize the work on a deployment: wait for its lock, which is
+        held until the current unit of work ends (see `locks`). Must be
+        called inside a unit of work, before reading the state that the
+        work depends on
+        """
+        locks.lock_deployment(deployment_id)
+
+    @_writes
+    def lock_execution_queue(self):
+        """Serialize the admission of executions: wait for the lock of the
+        execution queue, which is held until the current unit of work ends
+        (see `locks`)
+        """
+        locks.lock_execution_queue()
+
+    @_read_only
     def get_execution(self, execution_id, include=None):
         return self._get_by_id(Execution, execution_id, include)
 
+    @_read_only
     def get_plugin(self, plugin_id, include=None):
         return self._get_by_id(Plugin, plugin_id, include)
 
+    @_read_only
     def get_deployment_update(self, deployment_update_id, include=None):
         return self._get_by_id(DeploymentUpdate, deployment_update_id, include)
 
+    @_writes
     def put_blueprint(self, blueprint):
         return self._create_model(Blueprint, blueprint)
 
+    @_writes
     def put_snapshot(self, snapshot):
         return self._create_model(Snapshot, snapshot)
 
+    @_writes
     def put_deployment(self, deployment):
         return self._create_model(Deployment, deployment)
 
+    @_writes
     def put_execution(self, execution):
         return self._create_model(Execution, execution)
 
+    @_writes
     def put_plugin(self, plugin):
         return self._create_model(Plugin, plugin)
 
+    @_writes
     def put_node(self, node):
         # Need to add the storage id separately - only used for relations
         node = self._get_instance(Node, node)
@@ -471,6 +1127,7 @@ class SQLStorageManager(object):
         )
         return self._create_model(Node, node)
 
+    @_writes
     def put_node_instance(self, node_instance):
         # Need to add the storage id separately - only used for relations
         node_instance = self._get_instance(NodeInstance, node_instance)
@@ -478,8 +1135,67 @@ class SQLStorageManager(object):
             node_instance.deployment_id,
             node_instance.node_id
         )
+        if node_instance.payload is None:
+            node_instance.payload = NodeInstancePayload()
         return self._create_model(NodeInstance, node_instance)
 
+    @_writes
+    def put_nodes(self, nodes):
+        """Add several nodes at once, in a single transaction
+        """
+        instances = []
+        for node in nodes:
+            node = self._get_instance(Node, node)
+            node.storage_id = self._storage_node_id(
+                node.deployment_id,
+                node.id
+            )
+            instances.append(node)
+        return self._safe_add_all(instances)
+
+    @_writes
+    def put_node_instances(self, node_instances):
+        """Add several node instances at once, in a single transaction
+        """
+        instances = []
+        for node_instance in node_instances:
+            node_instance = self._get_instance(NodeInstance, node_instance)
+            node_instance.node_storage_id = self._storage_node_id(
+                node_instance.deployment_id,
+                node_instance.node_id
+            )
+            instances.append(node_instance)
+        if not instances:
+            return instances
+
+        # Bulk inserts don't cascade to relationships, so the payloads are
+        # inserted explicitly, after their node instances
+        payloads = []
+        for node_instance in instances:
+            payload = node_instance.payload or NodeInstancePayload()
+            payload.node_instance_id = node_instance.id
+            payloads.append(payload)
+        custom_exception = manager_exceptions.ConflictError(
+            'One or more of the {0} NodeInstance instances being added '
+            'already exist'.format(len(instances))
+        )
+        self._safe_bulk_insert(instances + payloads, custom_exception)
+        return instances
+
+    @_writes
+    def put_executions(self, executions):
+        """Add several executions at once, in a single transaction
+        """
+        executions = [self._get_instance(Execution, execution)
+                      for execution in executions]
+        if executions:
+            custom_exception = manager_exceptions.ConflictError(
+                'One or more of the {0} Execution instances being added '
+                'already exist'.format(len(executions)))
+            self._safe_bulk_insert(executions, custom_exception)
+        return executions
+
+    @_writes
     def put_deployment_update(self, deployment_update):
         deployment_update.id = deployment_update.id or '{0}-{1}'.format(
             deployment_update.deployment_id,
@@ -487,6 +1203,7 @@ class SQLStorageManager(object):
         )
         return self._create_model(DeploymentUpdate, deployment_update)
 
+    @_writes
     def put_deployment_update_step(self, deployment_update_id, step):
         deployment_update = self._get_by_id(
             DeploymentUpdate,
@@ -496,29 +1213,38 @@ class SQLStorageManager(object):
         deployment_update.steps += [DeploymentUpdateStep(**step.to_dict())]
         return self._safe_add(deployment_update)
 
+    @_writes
     def put_provider_context(self, provider_context):
         # The ID is always the same, and only the name changes
         instance = self._get_instance(ProviderContext, provider_context)
         instance.id = PROVIDER_CONTEXT_ID
         return self._safe_add(instance)
 
+    @_writes
     def put_deployment_modification(self, modification):
         return self._create_model(DeploymentModification, modification)
 
+    @_writes
     def delete_blueprint(self, blueprint_id):
+        self._definitions_cache.invalidate((Blueprint, blueprint_id))
         return self._delete_instance_by_id(Blueprint, blueprint_id)
 
+    @_writes
     def delete_plugin(self, plugin_id):
         return self._delete_instance_by_id(Plugin, plugin_id)
 
+    @_writes
     def delete_snapshot(self, snapshot_id):
         return self._delete_instance_by_id(Snapshot, snapshot_id)
 
+    @_writes
     def delete_deployment(self, deployment_id):
         # Previously deleted all relations manually - now will be handled
         # by SQL with cascade
+        self._definitions_cache.invalidate((Deployment, deployment_id))
         return self._delete_instance_by_id(Deployment, deployment_id)
 
+    @_writes
     def delete_node(self, deployment_id, node_id):
         storage_node_id = self._storage_node_id(deployment_id, node_id)
         return self._delete_instance_by_id(
@@ -527,36 +1253,336 @@ class SQLStorageManager(object):
             filters={'storage_id': storage_node_id}
         )
 
+    @_writes
     def delete_node_instance(self, node_instance_id):
         return self._delete_instance_by_id(NodeInstance, node_instance_id)
 
+    @_writes
+    def delete_node_instances(self, node_instance_ids):
+        """Delete several node instances (and their payloads) at once, with
+        one DELETE statement per table, without loading them
+
+        :return: The number of node instances deleted
+        """
+        if not node_instance_ids:
+            return 0
+        table = NodeInstance.__table__
+        payload_table = NodeInstancePayload.__table__
+        with unit_of_work.UnitOfWork():
+            # PostgreSQL would cascade to the payloads, but SQLite (used in
+            # tests) doesn't enforce foreign keys
+            self._safe_execute(payload_table.delete().where(
+                payload_table.c.node_instance_id.in_(node_instance_ids)))
+            return self._safe_execute(table.delete().where(
+                table.c.id.in_(node_instance_ids)))
+
+    @_writes
     def update_entity(self, entity):
+        if isinstance(entity, (Blueprint, Deployment)):
+            self._definitions_cache.invalidate(
+                (entity.__class__, entity.id))
+        if isinstance(entity, Deployment):
+            # The update time versions the deployment's cached workflows, so
+            # that the caches of the other processes see the change
+            entity.updated_at = utils.get_formatted_timestamp()
         return self._safe_add(entity)
 
+    @_writes
+    def patch_entity(self, model_class, element_id, **changes):
+        """Update only the passed columns of a single entity, with an UPDATE
+        statement (the entity isn't loaded)
+
+        :param model_class: SQL DB table class
+        :param element_id: The primary key of the entity
+        :param changes: The new values of the columns to update
+        """
+        self._verify_columns(model_class, changes)
+        if model_class in (Blueprint, Deployment):
+            self._definitions_cache.invalidate((model_class, element_id))
+        if model_class is Deployment:
+            # As in `update_entity`
+            changes.setdefault('updated_at', utils.get_formatted_timestamp())
+        table = model_class.__table__
+        primary_key = model_class.__mapper__.primary_key[0]
+        statement = table.update()\
+            .where(primary_key == element_id)\
+            .values(**changes)
+        if self._safe_execute(statement) == 0:
+            raise manager_exceptions.NotFoundError(
+                'Requested {0} with ID `{1}` was not found'
+                .format(model_class.__name__, element_id)
+            )
+
+    @_writes
     def update_execution_status(self, execution_id, status, error):
-        execution = self.get_execution(execution_id)
-        execution.status = status
-        execution.error = error
-        return self._safe_add(execution)
+        self.patch_entity(Execution, execution_id, status=status, error=error)
+
+    @_writes
+    def archive_executions(self, created_before, batch_size):
+        """Move the ended executions that were created before
+        `created_before` to the executions archive.
+
+        The executions are moved `batch_size` at a time, oldest first, each
+        batch in its own short transaction. Executions of deployment updates
+        are kept, since deleting them would delete the updates as well
 
+        :param created_before: A datetime
+        :param batch_size: The number of executions moved in each batch
+        :return: The number of archived executions
+        """
+        table = Execution.__table__
+        archive_table = ExecutionArchive.__table__
+        column_names = table.columns.keys()
+        update_table = DeploymentUpdate.__table__
+        candidates = select([table.c.id, table.c.created_at])\
+            .where(table.c.status.in_(Execution.END_STATES))\
+            .where(table.c.created_at < created_before)\
+            .where(~exists().where(update_table.c.execution_id ==
+                                   table.c.id))\
+            .order_by(table.c.created_at)\
+            .limit(batch_size)\
+            .with_for_update(skip_locked=True)
+
+        archived = 0
+        while True:
+            with unit_of_work.UnitOfWork():
+                batch = db.session.execute(candidates).fetchall()
+                ids = [row.id for row in batch]
+                if ids:
+                    self._create_archive_partitions(
+                        set(row.created_at[:7] for row in batch))
+                    rows = select([table.c[name] for name in column_names])\
+                        .where(table.c.id.in_(ids))
+                    self._safe_execute(archive_table.insert().from_select(
+                        column_names, rows))
+                    self._safe_execute(table.delete().where(
+                        table.c.id.in_(ids)))
+            archived += len(ids)
+            if len(ids) < batch_size:
+                return archived
+
+    @staticmethod
+    def _create_archive_partitions(months):
+        """Create the PostgreSQL partitions of the executions archive for
+        `months` (`YYYY-MM` strings), unless they exist
+        """
+        if db.session.get_bind().dialect.name != 'postgresql':
+            return
+        for month in sorted(months):
+            year, month_number = (int(part) for part in month.split('-'))
+            next_month = '{0:04d}-{1:02d}'.format(
+                year + month_number // 12, month_number % 12 + 1)
+            db.session.execute(text(
+                "CREATE TABLE IF NOT EXISTS {0}_{1} PARTITION OF {0} "
+                "FOR VALUES FROM ('{2}-01') TO ('{3}-01')".format(
+                    ExecutionArchive.__tablename__,
+                    month.replace('-', '_'),
+                    month,
+                    next_month)))
+
+    @_writes
     def update_provider_context(self, provider_context):
         provider_context_instance = self.get_provider_context()
         provider_context_instance.name = provider_context.name
         provider_context_instance.context = provider_context.context
         return self._safe_add(provider_context_instance)
 
+    @_writes
     def update_node_instance(self, node_instance):
-        with _lock_table(NodeInstance):
-            current = self.get_node_instance(node_instance.id)
-            if current.version != node_instance.version:
+        """Update the columns of a node instance (and of its payload) that
+        were changed since it was loaded (see `update_node_instance_fields`)
+
+        :param node_instance: A NodeInstance, holding the version on which
+        the update is based
+        :return: The node instance, with its new version
+        """
+        changes, payload_changes = \
+            self._get_node_instance_changes(node_instance)
+        new_version = self.update_node_instance_fields(
+            node_instance.id,
+            node_instance.version,
+            **dict(changes, **payload_changes))
+        self._set_node_instance_updated(node_instance, new_version,
+                                        changes, payload_changes)
+        return node_instance
+
+    @_writes
+    def update_node_instances(self, node_instances):
+        """Update the changed columns of several node instances at once,
+        like `update_node_instance`: the node instances with the same changed
+        columns are updated by a single (executemany) statement per table,
+        and nothing is updated if any of them was updated by someone else
+
+        :param node_instances: NodeInstances, holding the versions on which
+        the updates are based
+        :return: The node instances, with their new versions
+        """
+        groups = OrderedDict()
+        for node_instance in node_instances:
+            changes, payload_changes = \
+                self._get_node_instance_changes(node_instance)
+            self._verify_columns(NodeInstance, changes)
+            key = (tuple(sorted(changes)), tuple(sorted(payload_changes)))
+            groups.setdefault(key, []).append(
+                (node_instance, changes, payload_changes))
+
+        table = NodeInstance.__table__
+        payload_table = NodeInstancePayload.__table__
+        with unit_of_work.UnitOfWork():
+            for (columns, payload_columns), group in groups.iteritems():
+                # Bound parameters can't be named like the updated columns
+                statement = table.update()\
+                    .where(table.c.id == bindparam('_id'))\
+                    .where(table.c.version == bindparam('_version'))\
+                    .values(version=bindparam('_new_version'),
+                            **{column: bindparam('_' + column)
+                               for column in columns})
+                params = [dict({'_' + column: changes[column]
+                                for column in columns},
+                               _id=node_instance.id,
+                               _version=node_instance.version,
+                               _new_version=node_instance.version + 1)
+                          for node_instance, changes, _ in group]
+                if self._safe_execute(statement, params) != len(group):
+                    raise manager_exceptions.ConflictError(
+                        'Node instances update conflict: one or more of the '
+                        'node instances {0} were updated by someone else, '
+                        'or deleted'.format(
+                            [node_instance.id for node_instance, _, _
+                             in group]))
+                if payload_columns:
+                    statement = payload_table.update()\
+                        .where(payload_table.c.node_instance_id ==
+                               bindparam('_id'))\
+                        .values(**{column: bindparam('_' + column)
+                                   for column in payload_columns})
+                    self._safe_execute(statement, [
+                        dict({'_' + column: payload_changes[column]
+                              for column in payload_columns},
+                             _id=node_instance.id)
+                        for node_instance, _, payload_changes in group])
+
+        for group in groups.itervalues():
+            for node_instance, changes, payload_changes in group:
+                self._set_node_instance_updated(
+                    node_instance, node_instance.version + 1,
+                    changes, payload_changes)
+        return node_instances
+
+    def _get_node_instance_changes(self, node_instance):
+        """Return the columns of a node instance, and of its payload (if it
+        was loaded), that were changed since it was loaded
+        """
+        changes = self._get_changed_columns(node_instance)
+        changes.pop('id', None)
+        changes.pop('version', None)
+        payload_changes = {}
+        if 'payload' not in inspect(node_instance).unloaded and \
+                node_instance.payload is not None:
+            payload_changes = self._get_changed_columns(node_instance.payload)
+            payload_changes.pop('node_instance_id', None)
+        return changes, payload_changes
+
+    @staticmethod
+    def _set_node_instance_updated(node_instance, version, changes,
+                                   payload_changes):
+        # The rows are already up to date - if `node_instance` is attached
+        # to the session (in a unit of work), it mustn't be flushed again
+        for key, value in dict(changes, version=version).iteritems():
+            set_committed_value(node_instance, key, value)
+        for key, value in payload_changes.iteritems():
+            set_committed_value(node_instance.payload, key, value)
+
+    @_writes
+    def update_node_instance_fields(self, node_instance_id, version,
+                                    **changes):
+        """Update only the passed columns of a node instance, using
+        optimistic concurrency control: the row is only updated if its
+        stored version is still `version`, and the version is incremented
+        in the same statement
+
+        :param node_instance_id: The ID of the node instance
+        :param version: The version on which the update is based
+        :param changes: The new values of the columns to update (including
+        the payload's `runtime_properties` and `relationships`)
+        :return: The new version of the node instance
+        """
+        payload_changes = {field: changes.pop(field)
+                           for field in NodeInstancePayload.FIELDS
+                           if field in changes}
+        self._verify_columns(NodeInstance, changes)
+        table = NodeInstance.__table__
+        statement = table.update()\
+            .where(table.c.id == node_instance_id)\
+            .where(table.c.version == version)\
+            .values(version=version + 1, **changes)
+
+        with unit_of_work.UnitOfWork():
+            if self._safe_execute(statement) == 0:
+                # Either the node instance doesn't exist (and a
+                # NotFoundError will be raised), or it was updated by
+                # someone else
+                current = self.get_node_instance(node_instance_id,
+                                                 include=['id', 'version'])
                 raise manager_exceptions.ConflictError(
                     'Node instance update conflict for node instance {0} '
                     '[current_version={1}, updated_version={2}]'.format(
-                            current.id, current.version, node_instance.version)
+                            current.id, current.version, version)
                 )
+            # The payload is only written when it changed (and it's
+            # protected by the version of its node instance)
+            if payload_changes:
+                payload_table = NodeInstancePayload.__table__
+                self._safe_execute(
+                    payload_table.update()
+                    .where(payload_table.c.node_instance_id ==
+                           node_instance_id)
+                    .values(**payload_changes))
+        return version + 1
+
+    @staticmethod
+    def _verify_columns(model_class, changes):
+        for column_name in changes:
+            if column_name not in model_class.__table__.columns:
+                raise manager_exceptions.BadParametersError(
+                    'Class {0} does not have a {1} field'.format(
+                        model_class.__name__, column_name
+                    )
+                )
+
+    @staticmethod
+    def _get_changed_columns(instance):
+        """Return the values of the columns of `instance` that were set since
+        it was loaded (all the set columns, if it was never stored)
+        """
+        state = inspect(instance)
+        return {prop.key: getattr(instance, prop.key)
+                for prop in state.mapper.column_attrs
+                if state.attrs[prop.key].history.has_changes()}
+
+    @staticmethod
+    def migrate():
+        """Run the (idempotent) migrations of the DB, e.g. after the data of
+        an older manager's snapshot was restored
+
+        :return: The names of the migrations
+        """
+        # The migrations use their own connection, which mustn't wait for
+        # the session's transaction
+        db.session.commit()
+        return migrations.migrate(db.engine)
 
-            node_instance.version += 1
-            return self._safe_add(node_instance)
+    @staticmethod
+    def get_pool_statistics():
+        """Return the usage counters and state of the DB connection pool
+        """
+        return pool.statistics.to_dict(db.engine.pool)
+
+    @staticmethod
+    def get_query_statistics():
+        """Return the SQL query statistics of this process, per endpoint
+        """
+        return {'endpoints': instrumentation.statistics.to_dict()}
 
     @staticmethod
     def _storage_node_id(deployment_id, node_id):
@@ -0,0 +1,108 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+from functools import wraps
+
+from flask import g
+from sqlalchemy.exc import SQLAlchemyError
+
+from manager_rest.storage.models import db
+
+# The nesting depth of the units of work of the current app context
+_DEPTH_ATTR = '_unit_of_work_depth'
+# The callbacks to call when the outermost unit of work ends
+_ON_END_ATTR = '_unit_of_work_on_end'
+
+
+def is_active():
+    """Is the current app context running inside a unit of work
+    """
+    return getattr(g, _DEPTH_ATTR, 0) > 0
+
+
+def on_end(callback):
+    """Call `callback` (without arguments) when the current outermost unit
+    of work ends, after its transaction was committed or rolled back
+    """
+    if not is_active():
+        raise RuntimeError('There is no active unit of work')
+    callbacks = getattr(g, _ON_END_ATTR, None)
+    if callbacks is None:
+        callbacks = []
+        setattr(g, _ON_END_ATTR, callbacks)
+    callbacks.append(callback)
+
+
+class UnitOfWork(object):
+    """Run all the storage manager writes of a block in a single transaction
+
+    Usable as a context manager:
+
+        with UnitOfWork():
+            sm.put_...
+            sm.update_entity(...)
+
+    or as a decorator (`@UnitOfWork()`).
+
+    Inside a unit of work, the storage manager only flushes its changes,
+    and the session (with its identity map) is kept open, so entities that
+    were already read aren't loaded again. When the outermost unit of work
+    ends, everything is committed at once, or rolled back if an exception
+    was raised. Any SQL error rolls back the whole unit of work, so callers
+    shouldn't catch storage errors and carry on writing inside it.
+    Outside a unit of work, every storage manager call commits on its own.
+    """
+
+    def __enter__(self):
+        setattr(g, _DEPTH_ATTR, getattr(g, _DEPTH_ATTR, 0) + 1)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        depth = getattr(g, _DEPTH_ATTR) - 1
+        setattr(g, _DEPTH_ATTR, depth)
+        if depth > 0:
+            # The outermost unit of work commits or rolls back
+            return False
+        try:
+            if exc_type is None:
+                self._commit()
+            else:
+                db.session.rollback()
+        finally:
+            db.session.close()
+            callbacks = getattr(g, _ON_END_ATTR, None) or []
+            setattr(g, _ON_END_ATTR, None)
+            for callback in callbacks:
+                callback()
+        return False
+
+    @staticmethod
+    def _commit():
+        try:
+            db.session.flush()
+            # Return detached entities with all their loaded values, the
+            # same as the storage manager does for a single call
+            db.session.expunge_all()
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            raise
+
+    def __call__(self, f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with self:
+                return f(*args, **kwargs)
+        return wrapper
@@ -21,10 +21,13 @@ import tempfile
 import time
 import os
 import shutil
+from contextlib import contextmanager
 
 from flask.testing import FlaskClient
 from nose.tools import nottest
 from nose.plugins.attrib import attr
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from wagon.wagon import Wagon
 
 from manager_rest import utils, config, archiving
@@ -44,6 +47,32 @@ FILE_SERVER_UPLOADED_BLUEPRINTS_FOLDER = 'uploaded-blueprints'
 FILE_SERVER_RESOURCES_URI = '/resources'
 LATEST_API_VERSION = 2.1  # to be used by max_client_version test attribute
 
+# A synthetic blueprint of a deployment with many node instances: each
+# node2 instance is (optionally) connected to every node1 instance
+LARGE_BLUEPRINT = '''
+tosca_definitions_version: cloudify_dsl_1_3
+
+imports:
+    - cloudify/types/types.yaml
+
+node_templates:
+    node1:
+        type: cloudify.nodes.Root
+        instances:
+            deploy: {instances}
+
+    node2:
+        type: cloudify.nodes.Root
+        instances:
+            deploy: {instances}
+{relationships}
+'''
+LARGE_BLUEPRINT_RELATIONSHIPS = '''
+        relationships:
+            - type: cloudify.relationships.connected_to
+              target: node1
+'''
+
 
 @nottest
 def test_config(**kwargs):
@@ -301,6 +330,30 @@ class BaseServerTestCase(unittest.TestCase):
         result.json = json.loads(result.data)
         return result
 
+    @contextmanager
+    def assert_max_queries(self, max_queries):
+        """Fail the test if more than `max_queries` SQL statements are
+        executed inside the block (by requests of the test client, or by
+        direct storage manager calls)
+
+        :return: The list of the executed statements, filled in as they are
+        executed
+        """
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(Engine, 'before_cursor_execute', count_statement)
+        try:
+            yield statements
+        finally:
+            event.remove(Engine, 'before_cursor_execute', count_statement)
+        if len(statements) > max_queries:
+            self.fail('{0} SQL statements were executed, more than the {1} '
+                      'allowed:\n{2}'.format(len(statements), max_queries,
+                                              '\n'.join(statements)))
+
     def _check_if_resource_on_fileserver(self,
                                          folder,
                                          container_id,
@@ -376,6 +429,36 @@ class BaseServerTestCase(unittest.TestCase):
                                                     inputs=inputs)
         return blueprint_id, deployment.id, blueprint_response, deployment
 
+    def create_large_blueprint(self, instances, connected=True):
+        """Write the synthetic LARGE_BLUEPRINT, with `instances` instances
+        of each of its nodes, to the blueprint.yaml of a new directory
+
+        :param connected: Whether node2 is connected to node1
+        :return: The blueprint directory
+        """
+        blueprint_dir = tempfile.mkdtemp(prefix='large-blueprint-')
+        self.addCleanup(self.quiet_delete_directory, blueprint_dir)
+        with open(os.path.join(blueprint_dir, 'blueprint.yaml'), 'w') as f:
+            f.write(LARGE_BLUEPRINT.format(
+                instances=instances,
+                relationships=LARGE_BLUEPRINT_RELATIONSHIPS
+                if connected else ''))
+        return blueprint_dir
+
+    def put_large_deployment(self,
+                             instances,
+                             deployment_id='deployment',
+                             blueprint_id='blueprint',
+                             connected=True):
+        """Create a deployment of the synthetic LARGE_BLUEPRINT (see
+        `create_large_blueprint`), for checking that the number of queries
+        of operations doesn't grow with the size of the deployment
+        """
+        return self.put_deployment(
+            deployment_id=deployment_id,
+            blueprint_id=blueprint_id,
+            blueprint_dir=self.create_large_blueprint(instances, connected))
+
     def upload_plugin(self, package_name, package_version):
         temp_file_path = self.create_wheel(package_name, package_version)
         response = self.post_file('/plugins', temp_file_path)
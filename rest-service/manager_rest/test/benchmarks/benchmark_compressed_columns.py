@@ -0,0 +1,125 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import json
+import time
+
+from sqlalchemy import text
+
+from manager_rest.storage import db, models
+from manager_rest.test.benchmarks import utils
+from manager_rest.test.benchmarks.benchmark_deployment_creation import \
+    BLUEPRINT_TEMPLATE as SCALED_BLUEPRINT
+
+NODE_COUNTS = [10, 100, 500]
+REPEATS = 20
+
+BLUEPRINT_HEADER = """
+tosca_definitions_version: cloudify_dsl_1_3
+
+imports:
+    - cloudify/types/types.yaml
+
+node_templates:
+"""
+
+NODE_TEMPLATE = """
+    node_{0}:
+        type: cloudify.nodes.Compute
+        properties:
+            ip: 10.0.{1}.{2}
+"""
+
+
+def _blueprint(nodes):
+    return BLUEPRINT_HEADER + ''.join(
+        NODE_TEMPLATE.format(i, i // 256, i % 256) for i in range(nodes))
+
+
+def _timed(func, *args):
+    start = time.time()
+    for _ in range(REPEATS):
+        func(*args)
+    return (time.time() - start) / REPEATS
+
+
+class CompressedColumnsBenchmark(utils.BaseBenchmark):
+
+    def _compare(self, table, column, row_id):
+        """Return the sizes (in KB) of a value as JSON and as stored, the
+        percentage of space saved, and the times (in ms) of decoding it from
+        JSON and from its stored form
+        """
+        stored = str(db.engine.execute(
+            text('SELECT {0} FROM {1} WHERE id = :id'.format(column, table)),
+            id=row_id).scalar())
+        value = models.decode_compressed_json(stored)
+        plain = json.dumps(value, separators=(',', ':'))
+        return (len(plain) / 1024.0,
+                len(stored) / 1024.0,
+                100.0 * (len(plain) - len(stored)) / len(plain),
+                _timed(json.loads, plain) * 1000,
+                _timed(models.decode_compressed_json, stored) * 1000,
+                _timed(models.encode_compressed_json, value) * 1000)
+
+    def test_plan_compression(self):
+        """Compare the stored size of blueprint plans, and the time of
+        decoding them, with their plain JSON encoding
+
+        Plans are highly redundant (every node holds the full definitions
+        of its type's operations), so they shrink by well over 90%, while
+        decompressing adds little to the time of decoding the JSON itself
+        """
+        rows = []
+        for nodes in NODE_COUNTS:
+            blueprint_id = 'bp-{0}'.format(nodes)
+            blueprint_dir = self.create_blueprint_dir(_blueprint(nodes))
+            response = self.put_file(*self.put_blueprint_args(
+                utils.BLUEPRINT_FILE_NAME,
+                blueprint_id=blueprint_id,
+                blueprint_dir=blueprint_dir))
+            self.assertEqual(201, response.status_code)
+            rows.append((nodes,) + self._compare('blueprints', 'plan',
+                                                 blueprint_id))
+
+        self.report('Blueprint plans',
+                    ('nodes', 'JSON KB', 'stored KB', 'saved %',
+                     'JSON decode ms', 'stored decode ms', 'encode ms'),
+                    rows)
+
+    def test_modification_compression(self):
+        """Compare the stored size of deployment modifications (which hold
+        a copy of every node instance), and the time of decoding them, with
+        their plain JSON encoding
+        """
+        rows = []
+        for count in utils.instance_counts():
+            deployment_id = 'dep-{0}'.format(count)
+            blueprint_dir = self.create_blueprint_dir(
+                SCALED_BLUEPRINT.format(count))
+            self.put_deployment(deployment_id=deployment_id,
+                                blueprint_id='bp-{0}'.format(count),
+                                blueprint_file_name=utils.BLUEPRINT_FILE_NAME,
+                                blueprint_dir=blueprint_dir)
+            modification = self.client.deployment_modifications.start(
+                deployment_id, nodes={'vm': {'instances': count + 1}})
+            rows.append((count * 2,) + self._compare(
+                'deployment_modifications', 'node_instances',
+                modification.id))
+
+        self.report('Deployment modifications',
+                    ('node instances', 'JSON KB', 'stored KB', 'saved %',
+                     'JSON decode ms', 'stored decode ms', 'encode ms'),
+                    rows)
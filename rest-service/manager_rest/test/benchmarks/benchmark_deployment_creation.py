@@ -0,0 +1,97 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import time
+
+from manager_rest.storage import get_storage_manager, models
+from manager_rest.test.benchmarks import utils
+
+BLUEPRINT_TEMPLATE = """
+tosca_definitions_version: cloudify_dsl_1_3
+
+imports:
+    - cloudify/types/types.yaml
+
+node_templates:
+    vm:
+        type: cloudify.nodes.Compute
+        instances:
+            deploy: {0}
+    app:
+        type: cloudify.nodes.Root
+        relationships:
+            - type: cloudify.relationships.contained_in
+              target: vm
+"""
+
+
+class DeploymentCreationBenchmark(utils.BaseBenchmark):
+
+    def test_deployment_creation_time(self):
+        """Time the creation of a deployment, as a function of the number
+        of its node instances
+        """
+        rows = []
+        for count in utils.instance_counts():
+            blueprint_dir = self.create_blueprint_dir(
+                BLUEPRINT_TEMPLATE.format(count))
+            start = time.time()
+            self.put_deployment(deployment_id='dep-{0}'.format(count),
+                                blueprint_id='bp-{0}'.format(count),
+                                blueprint_file_name=utils.BLUEPRINT_FILE_NAME,
+                                blueprint_dir=blueprint_dir)
+            rows.append((count * 2, time.time() - start))
+
+        self.report('Deployment creation',
+                    ('node instances', 'seconds'),
+                    rows)
+
+    def test_bulk_vs_single_node_instance_inserts(self):
+        """Compare storing node instances one by one with the bulk API
+        """
+        self.put_deployment(deployment_id='dep',
+                            blueprint_file_name='modify1.yaml')
+        sm = get_storage_manager()
+
+        rows = []
+        for count in utils.instance_counts():
+            instances = self._node_instances('single-{0}'.format(count),
+                                             count)
+            start = time.time()
+            for instance in instances:
+                sm.put_node_instance(instance)
+            single = time.time() - start
+
+            instances = self._node_instances('bulk-{0}'.format(count), count)
+            start = time.time()
+            sm.put_node_instances(instances)
+            bulk = time.time() - start
+
+            rows.append((count, single, bulk))
+
+        self.report('Node instance inserts',
+                    ('node instances', 'one by one', 'bulk'),
+                    rows)
+
+    @staticmethod
+    def _node_instances(prefix, count):
+        return [models.NodeInstance(id='{0}_{1}'.format(prefix, i),
+                                    node_id='node1',
+                                    deployment_id='dep',
+                                    state='uninitialized',
+                                    runtime_properties={},
+                                    relationships=[],
+                                    version=None)
+                for i in range(count)]
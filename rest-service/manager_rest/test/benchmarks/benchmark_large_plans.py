@@ -0,0 +1,96 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import time
+
+from manager_rest.test.benchmarks import utils
+
+BLUEPRINTS = 10
+NODES_PER_BLUEPRINT = 50
+PROPERTIES_PER_NODE = 50
+REPEATS = 5
+
+BLUEPRINT_HEADER = """
+tosca_definitions_version: cloudify_dsl_1_3
+
+imports:
+    - cloudify/types/types.yaml
+
+node_types:
+    benchmark.Node:
+        derived_from: cloudify.nodes.Root
+        properties:
+            data:
+                default: {}
+
+node_templates:
+"""
+
+NODE_TEMPLATE = """
+    node_{0}:
+        type: benchmark.Node
+        properties:
+            data:
+{1}
+"""
+
+
+def _large_blueprint():
+    properties = '\n'.join(
+        '                prop_{0}: {1}'.format(i, 'x' * 100)
+        for i in range(PROPERTIES_PER_NODE))
+    return BLUEPRINT_HEADER + ''.join(
+        NODE_TEMPLATE.format(i, properties)
+        for i in range(NODES_PER_BLUEPRINT))
+
+
+class LargePlansBenchmark(utils.BaseBenchmark):
+
+    def test_list_resources_with_large_plans(self):
+        """Time listing blueprints and nodes whose plans/properties are large,
+        with and without projection
+        """
+        blueprint_dir = self.create_blueprint_dir(_large_blueprint())
+        for i in range(BLUEPRINTS):
+            self.put_deployment(deployment_id='dep-{0}'.format(i),
+                                blueprint_id='bp-{0}'.format(i),
+                                blueprint_file_name=utils.BLUEPRINT_FILE_NAME,
+                                blueprint_dir=blueprint_dir)
+
+        requests = [
+            ('GET /blueprints', '/blueprints', None),
+            ('GET /blueprints (ids)', '/blueprints',
+             {'_include': 'id,created_at'}),
+            ('GET /nodes', '/nodes', None),
+            ('GET /nodes (ids)', '/nodes', {'_include': 'id,deployment_id'}),
+        ]
+        rows = []
+        for title, url, params in requests:
+            start = time.time()
+            for _ in range(REPEATS):
+                response = self.get(url, query_params=params)
+                self.assertEqual(200, response.status_code)
+            rows.append((title, (time.time() - start) / REPEATS))
+
+        start = time.time()
+        for i in range(BLUEPRINTS):
+            self.client.deployments.delete('dep-{0}'.format(i))
+        rows.append(('DELETE /deployments/<id>',
+                     (time.time() - start) / BLUEPRINTS))
+
+        self.report('{0} blueprints, {1} nodes each'.format(
+                        BLUEPRINTS, NODES_PER_BLUEPRINT),
+                    ('request', 'seconds'),
+                    rows)
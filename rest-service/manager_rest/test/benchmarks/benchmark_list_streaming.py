@@ -0,0 +1,73 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import time
+import resource
+
+from manager_rest.storage import get_storage_manager, models
+from manager_rest.test.benchmarks import utils
+
+NODE_INSTANCES = 20000
+# Size of the runtime properties of each node instance, in bytes
+RUNTIME_PROPERTIES_SIZE = 1000
+
+
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class ListStreamingBenchmark(utils.BaseBenchmark):
+
+    def test_list_node_instances_memory(self):
+        """Measure the growth in peak memory of an unpaginated
+        `GET /node-instances`, with and without `_stream`
+
+        The peak RSS of the process never goes down, so the streamed
+        request runs first: its growth shows how much memory it needs,
+        and the growth of the buffered request that follows shows how
+        much more it needs on top of that. (Growth that stays below the
+        peak reached while seeding the data is reported as 0)
+        """
+        self.put_deployment(deployment_id='dep',
+                            blueprint_file_name='modify1.yaml')
+        get_storage_manager().put_node_instances(
+            [models.NodeInstance(id='instance_{0}'.format(i),
+                                 node_id='node1',
+                                 deployment_id='dep',
+                                 state='started',
+                                 runtime_properties={
+                                     'data': 'x' * RUNTIME_PROPERTIES_SIZE},
+                                 relationships=[],
+                                 version=1)
+             for i in range(NODE_INSTANCES)])
+
+        rows = []
+        for title, query in [('streamed', '_stream=true'),
+                             ('buffered', '')]:
+            rss_before = _max_rss_mb()
+            start = time.time()
+            response = self.app.get(
+                self._version_url(
+                    '/node-instances?deployment_id=dep&{0}'.format(query)),
+                buffered=False)
+            body_size = sum(len(chunk) for chunk in response.response)
+            rows.append((title,
+                         time.time() - start,
+                         body_size / 1024.0 / 1024,
+                         _max_rss_mb() - rss_before))
+
+        self.report('{0} node instances'.format(NODE_INSTANCES),
+                    ('request', 'seconds', 'body MB', 'peak RSS growth MB'),
+                    rows)
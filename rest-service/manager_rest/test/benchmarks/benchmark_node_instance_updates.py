@@ -0,0 +1,85 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import time
+import threading
+
+from flask import current_app
+
+from manager_rest.storage import get_storage_manager, models
+from manager_rest.test.benchmarks import utils
+
+WRITER_COUNTS = [1, 2, 4, 8]
+UPDATES_PER_WRITER = 50
+
+
+class NodeInstanceUpdatesBenchmark(utils.BaseBenchmark):
+
+    def test_parallel_writers_on_distinct_instances(self):
+        """Measure node instance update throughput with N parallel writers,
+        each updating its own node instance.
+
+        With the conditional (optimistic) update, writers of distinct rows
+        don't wait for each other, so the throughput should grow with the
+        number of writers (on SQLite, the whole DB file is locked on every
+        write, so only PostgreSQL shows the full effect)
+        """
+        self.put_deployment(deployment_id='dep',
+                            blueprint_file_name='modify1.yaml')
+        sm = get_storage_manager()
+        sm.put_node_instances(
+            [models.NodeInstance(id='writer_{0}'.format(i),
+                                 node_id='node1',
+                                 deployment_id='dep',
+                                 state='started',
+                                 runtime_properties={},
+                                 relationships=[],
+                                 version=None)
+             for i in range(max(WRITER_COUNTS))])
+
+        app = current_app._get_current_object()
+        rows = []
+        for writer_count in WRITER_COUNTS:
+            errors = []
+            writers = [threading.Thread(target=self._write,
+                                        args=(app, 'writer_{0}'.format(i),
+                                              errors))
+                       for i in range(writer_count)]
+            start = time.time()
+            for writer in writers:
+                writer.start()
+            for writer in writers:
+                writer.join()
+            duration = time.time() - start
+
+            self.assertEqual([], errors)
+            updates = writer_count * UPDATES_PER_WRITER
+            rows.append((writer_count, duration, updates / duration))
+
+        self.report('Parallel node instance updates',
+                    ('writers', 'seconds', 'updates/sec'),
+                    rows)
+
+    @staticmethod
+    def _write(app, node_instance_id, errors):
+        with app.app_context():
+            sm = get_storage_manager()
+            try:
+                for i in range(UPDATES_PER_WRITER):
+                    instance = sm.get_node_instance(node_instance_id)
+                    instance.runtime_properties = {'counter': i}
+                    sm.update_node_instance(instance)
+            except Exception as e:
+                errors.append(e)
@@ -0,0 +1,188 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import time
+
+from manager_rest import utils as manager_utils
+from manager_rest.storage import db, models
+from manager_rest.test.benchmarks import utils
+
+NODES_PER_DEPLOYMENT = 5
+INSTANCES_PER_NODE = 5
+EXECUTIONS_PER_DEPLOYMENT = 10
+MODIFICATIONS_PER_DEPLOYMENT = 5
+UPDATES_PER_DEPLOYMENT = 5
+REPEATS = 20
+
+# The deployment that all the hot-path queries look for
+DEPLOYMENT_ID = 'dep_0'
+
+
+def _hot_queries():
+    """(title, query, name of the index the query is expected to use)
+    """
+    execution = models.Execution
+    modification = models.DeploymentModification
+    update = models.DeploymentUpdate
+    node_instance = models.NodeInstance
+    return [
+        ('node instances of a node',
+         node_instance.query.filter(
+             node_instance.deployment_id == DEPLOYMENT_ID,
+             node_instance.node_id == 'node_0'),
+         'ix_node_instances_deployment_id_node_id'),
+        ('active deployment executions',
+         execution.query.filter(
+             execution.deployment_id == DEPLOYMENT_ID,
+             execution.status.in_(execution.ACTIVE_STATES)),
+         'ix_executions_deployment_id_status'),
+        ('active executions',
+         execution.query.filter(
+             execution.status.in_(execution.ACTIVE_STATES)),
+         'ix_executions_status_is_system_workflow'),
+        ('active system-wide executions',
+         execution.query.filter(
+             execution.deployment_id.is_(None),
+             execution.status.in_(execution.ACTIVE_STATES)),
+         'ix_executions_deployment_id_status'),
+        ('active user executions',
+         execution.query.filter(
+             execution.status.in_(execution.ACTIVE_STATES),
+             execution.is_system_workflow.in_([False])),
+         'ix_executions_status_is_system_workflow'),
+        ('started modifications',
+         modification.query.filter(
+             modification.deployment_id == DEPLOYMENT_ID,
+             modification.status == modification.STARTED),
+         'ix_deployment_modifications_deployment_id_status'),
+        ('deployment updates',
+         update.query.filter(update.deployment_id == DEPLOYMENT_ID),
+         'ix_deployment_updates_deployment_id_state'),
+    ]
+
+
+class QueryPlansBenchmark(utils.BaseBenchmark):
+
+    def test_hot_queries_use_indexes(self):
+        """Seed synthetic data, and run EXPLAIN (ANALYZE, on PostgreSQL) on
+        each of the hot-path queries.
+
+        Fails if any of the queries doesn't use its supporting index, so
+        regressions in the query plans are caught
+        """
+        seeded = 0
+        for deployment_count in utils.instance_counts():
+            self._seed(seeded, deployment_count)
+            seeded = deployment_count
+
+            rows = []
+            unindexed = []
+            for title, query, index_name in _hot_queries():
+                plan = self._explain(query)
+                start = time.time()
+                for _ in range(REPEATS):
+                    query.all()
+                rows.append((title,
+                             (time.time() - start) / REPEATS,
+                             index_name in plan))
+                if index_name not in plan:
+                    unindexed.append('{0} (expected {1}):\n{2}'.format(
+                        title, index_name, plan))
+
+            self.report('{0} deployments'.format(deployment_count),
+                        ('query', 'seconds', 'uses index'),
+                        rows)
+            self.assertEqual([], unindexed)
+
+    @staticmethod
+    def _explain(query):
+        """Return the query plan of `query`, as text
+        """
+        dialect = db.engine.dialect
+        if dialect.name == 'postgresql':
+            explain = 'EXPLAIN ANALYZE '
+        else:
+            explain = 'EXPLAIN QUERY PLAN '
+        statement = query.statement.compile(
+            dialect=dialect, compile_kwargs={'literal_binds': True})
+        rows = db.engine.execute(explain + str(statement)).fetchall()
+        # The plan's text is the last column of each row (the only one,
+        # on PostgreSQL)
+        return '\n'.join(str(row[-1]) for row in rows)
+
+    @staticmethod
+    def _seed(first, last):
+        """Insert deployments [first, last), with their nodes, node
+        instances, executions, modifications and updates
+        """
+        now = manager_utils.get_formatted_timestamp()
+        if first == 0:
+            db.engine.execute(models.Blueprint.__table__.insert(),
+                              id='bp', created_at=now, main_file_name='a',
+                              plan={})
+
+        deployments, nodes, node_instances = [], [], []
+        executions, modifications, updates = [], [], []
+        for d in range(first, last):
+            deployment_id = 'dep_{0}'.format(d)
+            deployments.append(dict(id=deployment_id, blueprint_id='bp',
+                                    created_at=now))
+            for n in range(NODES_PER_DEPLOYMENT):
+                node_id = 'node_{0}'.format(n)
+                storage_id = '{0}_{1}'.format(deployment_id, node_id)
+                nodes.append(dict(
+                    storage_id=storage_id, id=node_id,
+                    deployment_id=deployment_id, blueprint_id='bp',
+                    type='cloudify.nodes.Root', number_of_instances=1,
+                    planned_number_of_instances=1,
+                    deploy_number_of_instances=1,
+                    min_number_of_instances=0, max_number_of_instances=-1))
+                for i in range(INSTANCES_PER_NODE):
+                    node_instances.append(dict(
+                        id='{0}_{1}'.format(storage_id, i),
+                        node_storage_id=storage_id, node_id=node_id,
+                        deployment_id=deployment_id, state='started',
+                        version=1))
+            for e in range(EXECUTIONS_PER_DEPLOYMENT):
+                # Most executions are over, like on a real manager
+                status = models.Execution.STARTED if e == 0 \
+                    else models.Execution.TERMINATED
+                executions.append(dict(
+                    id='{0}_execution_{1}'.format(deployment_id, e),
+                    status=status, deployment_id=deployment_id,
+                    workflow_id='install', blueprint_id='bp',
+                    created_at=now, is_system_workflow=False))
+            for m in range(MODIFICATIONS_PER_DEPLOYMENT):
+                modifications.append(dict(
+                    id='{0}_modification_{1}'.format(deployment_id, m),
+                    created_at=now, deployment_id=deployment_id,
+                    status=models.DeploymentModification.FINISHED))
+            for u in range(UPDATES_PER_DEPLOYMENT):
+                updates.append(dict(
+                    id='{0}_update_{1}'.format(deployment_id, u),
+                    deployment_id=deployment_id, state='successful',
+                    created_at=now))
+
+        for model_class, rows in [(models.Deployment, deployments),
+                                  (models.Node, nodes),
+                                  (models.NodeInstance, node_instances),
+                                  (models.Execution, executions),
+                                  (models.DeploymentModification,
+                                   modifications),
+                                  (models.DeploymentUpdate, updates)]:
+            db.engine.execute(model_class.__table__.insert(), rows)
+        if db.engine.dialect.name == 'postgresql':
+            # Refresh the planner's statistics after the bulk inserts
+            db.engine.execute('ANALYZE')
@@ -0,0 +1,115 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import heapq
+from collections import OrderedDict
+
+import mock
+
+from manager_rest import celery_client, config
+from manager_rest.test.benchmarks import utils
+from manager_rest.test.mocks import MockCeleryClient
+
+# The simulated management worker: the number of tasks it runs at once,
+# and the time each one takes (seconds)
+WORKER_CONCURRENCY = 4
+TASK_DURATION = 1.0
+# The routing of the system workflows' tasks
+LANES = [
+    ('shared queue', {'system_workflows_queue': None,
+                      'management_queue_max_priority': 0}),
+    ('priorities', {'system_workflows_queue': None,
+                    'management_queue_max_priority': 10}),
+    ('system queue', {'system_workflows_queue': 'cloudify.management.system',
+                      'management_queue_max_priority': 0})
+]
+
+
+class RecordingCeleryClient(MockCeleryClient):
+    """The mock celery client, which also records the queue and priority
+    of the published tasks
+    """
+    def __init__(self):
+        self.tasks = []
+
+    def execute_task(self, task_queue, task_id=None, kwargs=None,
+                     producer=None, priority=None):
+        self.tasks.append((task_id, task_queue, priority))
+        return super(RecordingCeleryClient, self).execute_task(
+            task_queue, task_id, kwargs, producer, priority)
+
+
+class QueueLatencyBenchmark(utils.BaseBenchmark):
+
+    def test_system_workflow_latency(self):
+        """Measure how long the environment creation of a new deployment
+        waits for the management worker, behind a backlog of user
+        workflows, with each routing of the system workflows.
+
+        The tasks are published through the REST service (to the mock
+        celery client), and their consumption by a worker is simulated:
+        it takes the next task from its queues in turn, highest priority
+        first. In the shared queue, the wait grows with the backlog; with
+        priorities or a separate queue it shouldn't
+        """
+        self.put_deployment(deployment_id='dep')
+        rows = []
+        for lane, lane_config in LANES:
+            for backlog in utils.instance_counts():
+                client = RecordingCeleryClient()
+                with mock.patch.multiple(config.instance, **lane_config):
+                    with mock.patch.object(celery_client, 'get_client',
+                                           return_value=client):
+                        for _ in range(backlog):
+                            self.client.executions.start('dep', 'install',
+                                                         force=True)
+                        deployment_id = 'dep_{0}_{1}'.format(
+                            lane.replace(' ', '_'), backlog)
+                        self.client.deployments.create('blueprint',
+                                                       deployment_id)
+                environment_creation = client.tasks[-1][0]
+                rows.append((lane, backlog, self._simulate_wait(
+                    client.tasks, environment_creation)))
+
+        self.report('Environment creation wait behind user workflows '
+                    '(simulated seconds, {0} worker processes, {1}s tasks)'
+                    .format(WORKER_CONCURRENCY, TASK_DURATION),
+                    ('routing', 'backlog', 'wait'),
+                    rows)
+
+    @staticmethod
+    def _simulate_wait(tasks, task_id):
+        """Return the time until a simulated worker starts running
+        `task_id`, when all `tasks` were published before it started
+        """
+        queues = OrderedDict()
+        for sequence, (queued_task_id, queue, priority) in enumerate(tasks):
+            queues.setdefault(queue, []).append(
+                (-(priority or 0), sequence, queued_task_id))
+        for queued_tasks in queues.values():
+            heapq.heapify(queued_tasks)
+        queues = queues.values()
+
+        free_at = [0.0] * WORKER_CONCURRENCY
+        turn = 0
+        while True:
+            now = heapq.heappop(free_at)
+            while not queues[turn % len(queues)]:
+                turn += 1
+            _, _, next_task_id = heapq.heappop(queues[turn % len(queues)])
+            turn += 1
+            if next_task_id == task_id:
+                return now
+            heapq.heappush(free_at, now + TASK_DURATION)
@@ -0,0 +1,83 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import time
+
+from manager_rest.storage import get_storage_manager, models
+from manager_rest.test.benchmarks import utils
+
+NODE_INSTANCES = 200
+STATES = ['creating', 'created', 'configuring', 'configured', 'starting',
+          'started']
+# Sizes of the runtime properties of each node instance, in bytes
+RUNTIME_PROPERTIES_SIZES = [100, 10000, 100000]
+
+
+class StateTransitionsBenchmark(utils.BaseBenchmark):
+
+    def test_state_transitions(self):
+        """Measure the throughput of node instance state transitions, and
+        the time of listing only the states, with growing runtime properties
+
+        Since the runtime properties (and relationships) are stored in
+        their own table, a state transition only rewrites the small
+        node_instances row, and listing the states doesn't read the
+        payloads - so both should barely depend on the payload size.
+        (PostgreSQL stores large values out of line, which already spares
+        some of the rewrite; SQLite rewrites whole rows)
+        """
+        self.put_deployment(deployment_id='dep',
+                            blueprint_file_name='modify1.yaml')
+        sm = get_storage_manager()
+        rows = []
+        for size in RUNTIME_PROPERTIES_SIZES:
+            ids = ['instance_{0}_{1}'.format(size, i)
+                   for i in range(NODE_INSTANCES)]
+            sm.put_node_instances(
+                [models.NodeInstance(id=node_instance_id,
+                                     node_id='node1',
+                                     deployment_id='dep',
+                                     state='uninitialized',
+                                     runtime_properties={'data': 'x' * size},
+                                     relationships=[],
+                                     version=1)
+                 for node_instance_id in ids])
+
+            start = time.time()
+            for version, state in enumerate(STATES, start=1):
+                for node_instance_id in ids:
+                    sm.update_node_instance_fields(node_instance_id,
+                                                   version,
+                                                   state=state)
+            transitions = len(STATES) * NODE_INSTANCES
+            transitions_duration = time.time() - start
+
+            start = time.time()
+            response = self.get('/node-instances',
+                                query_params={'_include': 'id,state'})
+            list_duration = time.time() - start
+            self.assertEqual(200, response.status_code)
+
+            rows.append((size,
+                         transitions / transitions_duration,
+                         list_duration))
+            for node_instance_id in ids:
+                sm.delete_node_instance(node_instance_id)
+
+        self.report('State transitions of {0} node instances'
+                    .format(NODE_INSTANCES),
+                    ('properties bytes', 'transitions/sec',
+                     'list states seconds'),
+                    rows)
@@ -0,0 +1,93 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import time
+
+from manager_rest import utils as manager_utils
+from manager_rest.storage import db, get_storage_manager, models
+from manager_rest.test.benchmarks import utils
+
+# The numbers of ended executions recorded before starting workflows
+HISTORICAL_EXECUTIONS = [1000, 10000, 100000]
+# The deployments that the historical executions belong to
+HISTORICAL_DEPLOYMENTS = 100
+STARTS = 20
+
+
+class WorkflowStartBenchmark(utils.BaseBenchmark):
+
+    def test_workflow_start_latency(self):
+        """Measure the latency of starting a workflow, with a growing
+        number of ended executions on the manager.
+
+        The admission checks (no active system-wide execution, and no
+        active execution of the deployment) are lookups in the index of
+        the executions by deployment and status, which only reach the
+        active executions, so the latency shouldn't grow with the number of
+        ended ones
+        """
+        self.put_deployment(deployment_id='dep')
+        sm = get_storage_manager()
+        rows = []
+        seeded = 0
+        for count in HISTORICAL_EXECUTIONS:
+            self._seed(seeded, count)
+            seeded = count
+
+            durations = []
+            for _ in range(STARTS):
+                start = time.time()
+                execution = self.client.executions.start('dep', 'install')
+                durations.append(time.time() - start)
+                # End the execution, so the next one can start
+                sm.update_execution_status(execution.id,
+                                           models.Execution.TERMINATED, '')
+            durations.sort()
+            rows.append((count,
+                         sum(durations) / len(durations),
+                         durations[len(durations) // 2],
+                         durations[-1]))
+
+        self.report('Workflow start latency (seconds)',
+                    ('ended executions', 'mean', 'median', 'max'),
+                    rows)
+
+    @staticmethod
+    def _seed(first, last):
+        """Insert the ended executions [first, last), of the deployments of
+        a synthetic blueprint
+        """
+        now = manager_utils.get_formatted_timestamp()
+        if first == 0:
+            db.engine.execute(models.Blueprint.__table__.insert(),
+                              id='history_bp', created_at=now,
+                              main_file_name='a', plan={})
+            db.engine.execute(
+                models.Deployment.__table__.insert(),
+                [dict(id='history_dep_{0}'.format(d),
+                      blueprint_id='history_bp', created_at=now)
+                 for d in range(HISTORICAL_DEPLOYMENTS)])
+        db.engine.execute(
+            models.Execution.__table__.insert(),
+            [dict(id='history_execution_{0}'.format(e),
+                  status=models.Execution.TERMINATED,
+                  deployment_id='history_dep_{0}'.format(
+                      e % HISTORICAL_DEPLOYMENTS),
+                  workflow_id='install', blueprint_id='history_bp',
+                  created_at=now, is_system_workflow=False)
+             for e in range(first, last)])
+        if db.engine.dialect.name == 'postgresql':
+            # Refresh the planner's statistics after the bulk inserts
+            db.engine.execute('ANALYZE')
@@ -0,0 +1,68 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import os
+import shutil
+import tempfile
+
+from manager_rest.test import base_test
+
+BLUEPRINT_FILE_NAME = 'benchmark.yaml'
+# Comma separated sizes, e.g. BENCHMARK_SIZES=100,1000,5000
+SIZES_ENV_VAR = 'BENCHMARK_SIZES'
+DEFAULT_SIZES = '10,100,1000'
+
+
+def instance_counts():
+    sizes = os.environ.get(SIZES_ENV_VAR, DEFAULT_SIZES)
+    return [int(size) for size in sizes.split(',')]
+
+
+class BaseBenchmark(base_test.BaseServerTestCase):
+
+    def create_blueprint_dir(self, blueprint_content):
+        """Copy the mock blueprint dir (for its imports), and add to it a
+        `BLUEPRINT_FILE_NAME` file with `blueprint_content`
+
+        :return: The absolute path of the new blueprint dir
+        """
+        tmp_dir = tempfile.mkdtemp(prefix='benchmark-')
+        self.addCleanup(shutil.rmtree, tmp_dir, True)
+        blueprint_dir = os.path.join(tmp_dir, 'blueprint')
+        shutil.copytree(self.get_blueprint_path('mock_blueprint'),
+                        blueprint_dir)
+        with open(os.path.join(blueprint_dir, BLUEPRINT_FILE_NAME), 'w') as f:
+            f.write(blueprint_content)
+        return blueprint_dir
+
+    @staticmethod
+    def report(title, headers, rows):
+        """Print a simple table of benchmark results
+        """
+        def format_value(value):
+            if isinstance(value, float):
+                return '{0:.4f}'.format(value)
+            if isinstance(value, bool):
+                return 'yes' if value else 'no'
+            return str(value)
+
+        table = [list(headers)] + [[format_value(value) for value in row]
+                                   for row in rows]
+        widths = [max(len(line[i]) for line in table) + 4
+                  for i in range(len(headers))]
+        print '\n{0}'.format(title)
+        for line in table:
+            print ''.join(value.rjust(width)
+                          for value, width in zip(line, widths))
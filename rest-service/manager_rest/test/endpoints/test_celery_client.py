@@ -0,0 +1,133 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import os
+
+import mock
+from nose.plugins.attrib import attr
+
+from manager_rest import celery_client, config
+from manager_rest.test import base_test
+from manager_rest.test.mocks import MockCeleryClient
+
+
+@attr(client_min_version=2.1, client_max_version=base_test.LATEST_API_VERSION)
+class CeleryClientTest(base_test.BaseServerTestCase):
+
+    def setUp(self):
+        super(CeleryClientTest, self).setUp()
+        celery_client.statistics.reset()
+        # Use the real client (no broker is contacted until a task is sent)
+        patcher = mock.patch.object(config.instance, 'test_mode', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(celery_client.close_client)
+
+    def test_client_is_reused(self):
+        client = celery_client.get_client()
+        self.assertIs(client, celery_client.get_client())
+        self.assertEqual(
+            config.instance.amqp_pool_limit,
+            client.celery.conf.BROKER_POOL_LIMIT)
+        self.assertEqual(1, celery_client.statistics.clients)
+
+        # A forked process creates its own client
+        with mock.patch('os.getpid', return_value=os.getpid() + 1):
+            forked_client = celery_client.get_client()
+        self.assertIsNot(client, forked_client)
+        self.assertEqual(2, celery_client.statistics.clients)
+
+    def test_publish_statistics(self):
+        client = celery_client.get_client()
+        with mock.patch.object(client.celery, 'send_task',
+                               return_value='result') as send_task:
+            self.assertEqual('result', client.execute_task(
+                'queue', task_id='task', kwargs={'key': 'value'}))
+        retry_policy = send_task.call_args[1]['retry_policy']
+        self.assertTrue(send_task.call_args[1]['retry'])
+        self.assertEqual(config.instance.amqp_publish_max_retries,
+                         retry_policy['max_retries'])
+
+        with mock.patch.object(client.celery, 'send_task',
+                               side_effect=IOError('connection refused')):
+            self.assertRaises(IOError, client.execute_task, 'queue')
+
+        response = self.get('/status/broker')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, response.json['publishes'])
+        self.assertEqual(1, response.json['publish_errors'])
+        self.assertEqual(1, response.json['clients'])
+        self.assertGreaterEqual(response.json['publish_time_max'], 0)
+
+    def test_management_queue_priorities(self):
+        with mock.patch.object(config.instance,
+                               'management_queue_max_priority', 10):
+            client = celery_client.get_client()
+        queue = client.celery.amqp.queues[celery_client.MANAGEMENT_QUEUE]
+        self.assertEqual({'x-max-priority': 10}, queue.queue_arguments)
+
+        with mock.patch.object(client.celery, 'send_task') as send_task:
+            client.execute_task(celery_client.MANAGEMENT_QUEUE, priority=10)
+            client.execute_task(celery_client.MANAGEMENT_QUEUE)
+        self.assertEqual(10, send_task.call_args_list[0][1]['priority'])
+        self.assertNotIn('priority', send_task.call_args_list[1][1])
+
+
+@attr(client_min_version=2.1, client_max_version=base_test.LATEST_API_VERSION)
+class WorkflowRoutingTest(base_test.BaseServerTestCase):
+
+    def _published_tasks(self, **conf):
+        """Create a deployment and run a user workflow on it, and return
+        the (workflow id, queue, priority) of their published tasks
+        """
+        tasks = []
+        execute_task = MockCeleryClient.execute_task
+
+        def record_task(client, task_queue, task_id=None, kwargs=None,
+                        producer=None, priority=None):
+            tasks.append((kwargs['__cloudify_context']['workflow_id'],
+                          task_queue, priority))
+            return execute_task(client, task_queue, task_id, kwargs,
+                                producer, priority)
+
+        with mock.patch.multiple(config.instance, **conf):
+            with mock.patch.object(MockCeleryClient, 'execute_task',
+                                   record_task):
+                self.put_deployment(deployment_id='dep')
+                self.client.executions.start('dep', 'install')
+        return tasks
+
+    def test_shared_queue(self):
+        queue = celery_client.MANAGEMENT_QUEUE
+        self.assertEqual(
+            [('create_deployment_environment', queue, None),
+             ('install', queue, None)],
+            self._published_tasks(system_workflows_queue=None,
+                                  management_queue_max_priority=0))
+
+    def test_system_workflows_priority(self):
+        queue = celery_client.MANAGEMENT_QUEUE
+        self.assertEqual(
+            [('create_deployment_environment', queue, 10),
+             ('install', queue, 0)],
+            self._published_tasks(system_workflows_queue=None,
+                                  management_queue_max_priority=10))
+
+    def test_system_workflows_queue(self):
+        self.assertEqual(
+            [('create_deployment_environment', 'system', None),
+             ('install', celery_client.MANAGEMENT_QUEUE, None)],
+            self._published_tasks(system_workflows_queue='system',
+                                  management_queue_max_priority=0))
@@ -0,0 +1,59 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import sqlite3
+
+from nose.plugins.attrib import attr
+
+from manager_rest.test import base_test
+from manager_rest.storage import pool
+
+
+@attr(client_min_version=2.1, client_max_version=base_test.LATEST_API_VERSION)
+class ConnectionPoolTest(base_test.BaseServerTestCase):
+
+    def setUp(self):
+        super(ConnectionPoolTest, self).setUp()
+        pool.statistics.reset()
+
+    def test_instrumented_pool_reuses_connections(self):
+        connections = []
+
+        def creator():
+            connections.append(sqlite3.connect(':memory:'))
+            return connections[-1]
+
+        queue_pool = pool.InstrumentedQueuePool(creator,
+                                                pool_size=1,
+                                                max_overflow=0)
+        for _ in range(3):
+            queue_pool.connect().close()
+
+        # A single DBAPI connection was opened and reused
+        self.assertEqual(1, len(connections))
+        self.assertEqual(1, queue_pool.checkedin())
+        stats = pool.statistics.to_dict(queue_pool)
+        self.assertEqual(1, stats['size'])
+        self.assertEqual(0, stats['checked_out'])
+        self.assertGreaterEqual(stats['checkout_wait_total'], 0)
+
+    def test_pool_status_endpoint(self):
+        self.client.blueprints.list()
+        response = self.get('/status/database-pool')
+        self.assertEqual(200, response.status_code)
+        self.assertGreater(response.json['checkouts'], 0)
+        # Only the connection of the current request is still checked out
+        self.assertLessEqual(
+            response.json['checkouts'] - response.json['checkins'], 1)
@@ -0,0 +1,146 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import mock
+from nose.plugins.attrib import attr
+
+from manager_rest import manager_exceptions, utils
+from manager_rest.test import base_test
+from manager_rest.storage import get_storage_manager, models
+from manager_rest.storage.cache import DefinitionsCache
+
+
+@attr(client_min_version=2.1, client_max_version=base_test.LATEST_API_VERSION)
+class DefinitionsCacheTest(base_test.BaseServerTestCase):
+
+    def test_lru_eviction_by_size(self):
+        # Each of the values is 12 bytes long as JSON
+        cache = DefinitionsCache(max_size=30)
+        cache.get('a', 1, lambda: 'a' * 10)
+        cache.get('b', 1, lambda: 'b' * 10)
+        # Make `a` the most recently used
+        self.assertEqual('a' * 10, cache.get('a', 1, self._fail_load))
+        cache.get('c', 1, lambda: 'c' * 10)
+
+        self.assertEqual('a' * 10, cache.get('a', 1, self._fail_load))
+        self.assertEqual('c' * 10, cache.get('c', 1, self._fail_load))
+        self.assertEqual('b' * 10, cache.get('b', 1, lambda: 'b' * 10))
+        stats = cache.to_dict()
+        self.assertEqual(3, stats['hits'])
+        self.assertEqual(4, stats['misses'])
+        self.assertEqual(2, stats['evictions'])
+        self.assertEqual(24, stats['size'])
+
+    def test_versions_and_invalidation(self):
+        cache = DefinitionsCache(max_size=1000)
+        cache.get('a', 1, lambda: 'old')
+        self.assertEqual('new', cache.get('a', 2, lambda: 'new'))
+        self.assertEqual('new', cache.get('a', 2, self._fail_load))
+        cache.invalidate('a')
+        self.assertEqual('newer', cache.get('a', 2, lambda: 'newer'))
+        self.assertEqual(1, cache.to_dict()['entries'])
+
+    def test_get_many(self):
+        cache = DefinitionsCache(max_size=1000)
+        cache.get('a', 1, lambda: 'a')
+        cache.get('b', 1, lambda: 'b')
+        loads = []
+
+        def load(keys):
+            loads.append(sorted(keys))
+            return {key: key * 2 for key in keys}
+
+        self.assertEqual({'a': 'a', 'b': 'bb', 'c': 'cc'},
+                         cache.get_many({'a': 1, 'b': 2, 'c': 1}, load))
+        self.assertEqual([['b', 'c']], loads)
+        self.assertEqual({'b': 'bb', 'c': 'cc'},
+                         cache.get_many({'b': 2, 'c': 1}, self._fail_load))
+
+    def test_disabled_cache(self):
+        cache = DefinitionsCache(max_size=0)
+        cache.get('a', 1, lambda: 'a')
+        self.assertEqual('b', cache.get('a', 1, lambda: 'b'))
+        self.assertEqual(0, cache.to_dict()['entries'])
+
+    def test_blueprint_plan_cache(self):
+        self.put_deployment(deployment_id='dep', blueprint_id='bp')
+        sm = get_storage_manager()
+        plan = sm.get_blueprint_plan('bp')
+        self.assertIs(plan, sm.get_blueprint_plan('bp'))
+        self.assertEqual(sm.get_blueprint('bp').plan, plan)
+
+        self.client.deployments.delete('dep')
+        self.client.blueprints.delete('bp')
+        self.assertRaises(manager_exceptions.NotFoundError,
+                          sm.get_blueprint_plan, 'bp')
+
+    def test_blueprint_plans_cache(self):
+        self.put_deployment(deployment_id='dep1', blueprint_id='bp1')
+        self.put_deployment(deployment_id='dep2', blueprint_id='bp2')
+        sm = get_storage_manager()
+        plan = sm.get_blueprint_plan('bp1')
+        misses = sm.get_definitions_cache_statistics()['misses']
+
+        plans = sm.get_blueprint_plans(['bp1', 'bp2', 'nonexistent'])
+        self.assertEqual(['bp1', 'bp2'], sorted(plans))
+        self.assertIs(plan, plans['bp1'])
+        self.assertEqual(sm.get_blueprint('bp2').plan, plans['bp2'])
+        self.assertEqual(misses + 1,
+                         sm.get_definitions_cache_statistics()['misses'])
+        self.assertIs(plans['bp2'], sm.get_blueprint_plans(['bp2'])['bp2'])
+
+    def test_deployment_workflows_invalidation(self):
+        self.put_deployment(deployment_id='dep')
+        sm = get_storage_manager()
+        workflows = sm.get_deployment_workflows('dep')
+        self.assertIn('install', workflows)
+
+        deployment = sm.get_deployment('dep')
+        deployment.workflows = {'custom': workflows['install']}
+        deployment.updated_at = utils.get_formatted_timestamp()
+        sm.update_entity(deployment)
+        self.assertEqual(['custom'], sm.get_deployment_workflows('dep').keys())
+
+    def test_deployment_workflows_updated_by_another_process(self):
+        self.put_deployment(deployment_id='dep')
+        sm = get_storage_manager()
+        workflows = sm.get_deployment_workflows('dep')
+
+        # Another process's update doesn't invalidate this process's cache
+        deployment = sm.get_deployment('dep')
+        deployment.workflows = {'custom': workflows['install']}
+        with mock.patch.object(sm._definitions_cache, 'invalidate'):
+            sm.update_entity(deployment)
+        self.assertEqual(['custom'], sm.get_deployment_workflows('dep').keys())
+        self.assertEqual(['custom'],
+                         sm.get_deployments_workflows(['dep'])['dep'].keys())
+
+        with mock.patch.object(sm._definitions_cache, 'invalidate'):
+            sm.patch_entity(models.Deployment, 'dep',
+                            workflows={'other': workflows['install']})
+        self.assertEqual(['other'], sm.get_deployment_workflows('dep').keys())
+
+    def test_cache_status_endpoint(self):
+        self.put_deployment(deployment_id='dep')
+        for _ in range(2):
+            self.client.executions.start('dep', 'install')
+        response = self.get('/status/definitions-cache')
+        self.assertEqual(200, response.status_code)
+        self.assertGreater(response.json['hits'], 0)
+        self.assertGreater(response.json['misses'], 0)
+        self.assertGreater(response.json['size'], 0)
+
+    def _fail_load(self):
+        self.fail('The value should have been cached')
@@ -0,0 +1,103 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+from threading import Event, Thread
+
+from flask import current_app
+from nose.plugins.attrib import attr
+
+from manager_rest.test import base_test
+from manager_rest.storage import get_storage_manager, locks, UnitOfWork
+
+# Seconds to wait for a thread that should (or shouldn't) take a lock
+LOCK_WAIT = 2
+
+
+@attr(client_min_version=2.1, client_max_version=base_test.LATEST_API_VERSION)
+class DeploymentLocksTest(base_test.BaseServerTestCase):
+
+    def _lock_in_thread(self, deployment_id):
+        """Take the lock of a deployment in a new thread, and keep it until
+        the returned `release` event is set
+
+        :return: (locked, release) events
+        """
+        app = current_app._get_current_object()
+        locked = Event()
+        release = Event()
+
+        def lock():
+            with app.app_context():
+                with UnitOfWork():
+                    get_storage_manager().lock_deployment(deployment_id)
+                    locked.set()
+                    release.wait()
+
+        thread = Thread(target=lock)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        return locked, release
+
+    def test_same_deployment_is_serialized(self):
+        sm = get_storage_manager()
+        with UnitOfWork():
+            sm.lock_deployment('dep')
+            # Taking a held lock again doesn't block
+            sm.lock_deployment('dep')
+            locked, _ = self._lock_in_thread('dep')
+            self.assertFalse(locked.wait(LOCK_WAIT))
+        # The lock is released when the unit of work ends
+        self.assertTrue(locked.wait(LOCK_WAIT))
+
+    def test_different_deployments_run_in_parallel(self):
+        with UnitOfWork():
+            get_storage_manager().lock_deployment('dep1')
+            locked, _ = self._lock_in_thread('dep2')
+            self.assertTrue(locked.wait(LOCK_WAIT))
+
+    def test_lock_requires_unit_of_work(self):
+        self.assertRaises(RuntimeError,
+                          get_storage_manager().lock_deployment, 'dep')
+
+    def test_modification_waits_for_lock(self):
+        self.put_deployment(deployment_id='dep',
+                            blueprint_file_name='modify1.yaml')
+        locked, release = self._lock_in_thread('dep')
+        self.assertTrue(locked.wait(LOCK_WAIT))
+        started = Event()
+
+        def start_modification():
+            self.client.deployment_modifications.start(
+                'dep', nodes={'node1': {'instances': 2}})
+            started.set()
+
+        thread = Thread(target=start_modification)
+        thread.daemon = True
+        thread.start()
+        self.assertFalse(started.wait(LOCK_WAIT))
+        release.set()
+        self.assertTrue(started.wait(LOCK_WAIT))
+        thread.join()
+
+    def test_lock_keys(self):
+        self.assertEqual(locks.deployment_lock_key(u'dep'),
+                         locks.deployment_lock_key('dep'))
+        self.assertNotEqual(locks.deployment_lock_key('dep1'),
+                            locks.deployment_lock_key('dep2'))
+        for deployment_id in ['dep', 'a' * 100, u'\u05d3']:
+            key = locks.deployment_lock_key(deployment_id)
+            self.assertTrue(-2 ** 31 <= key < 2 ** 31)
@@ -0,0 +1,114 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+from nose.plugins.attrib import attr
+
+from manager_rest import manager_exceptions
+from manager_rest.test import base_test
+from manager_rest.storage import get_storage_manager, models
+
+
+@attr(client_min_version=2.1, client_max_version=base_test.LATEST_API_VERSION)
+class DeploymentSummaryTest(base_test.BaseServerTestCase):
+
+    def setUp(self):
+        super(DeploymentSummaryTest, self).setUp()
+        self.sm = get_storage_manager()
+
+    def _put_execution(self, execution_id, deployment_id, status,
+                       created_at):
+        self.sm.put_execution(models.Execution(
+            id=execution_id,
+            status=status,
+            deployment_id=deployment_id,
+            workflow_id='install',
+            blueprint_id='blueprint',
+            created_at=created_at,
+            error='',
+            parameters={},
+            is_system_workflow=False))
+
+    def test_deployment_summary(self):
+        self.put_deployment(deployment_id='dep',
+                            blueprint_id='blueprint',
+                            blueprint_file_name='modify1.yaml')
+        node_instances = self.sm.list_node_instances().items
+        node_instances[0].state = 'started'
+        self.sm.update_node_instance(node_instances[0])
+        self._put_execution('exec1', 'dep', models.Execution.TERMINATED,
+                            '2100-01-01T10:00:00.000Z')
+        self._put_execution('exec2', 'dep', models.Execution.FAILED,
+                            '2100-01-01T11:00:00.000Z')
+        self._put_execution('exec3', 'dep', models.Execution.FAILED,
+                            '2100-01-01T09:00:00.000Z')
+
+        summary = self.get('/deployments/dep/summary').json
+        self.assertEqual('dep', summary['deployment_id'])
+        instances = summary['node_instances']
+        self.assertEqual(len(node_instances), instances['total'])
+        self.assertEqual({'started': 1,
+                          'uninitialized': len(node_instances) - 1},
+                         instances['by_state'])
+        self.assertEqual(
+            len(node_instances),
+            sum(sum(states.values())
+                for states in instances['by_node'].values()))
+        self.assertEqual(
+            1, instances['by_node'][node_instances[0].node_id]['started'])
+        # The deployment's environment creation is an execution as well
+        executions = summary['executions']
+        self.assertEqual(4, executions['total'])
+        self.assertEqual(2, executions['by_status']['failed'])
+        self.assertEqual(4, sum(executions['by_status'].values()))
+        self.assertEqual('exec2', summary['last_execution']['id'])
+        self.assertEqual('failed', summary['last_execution']['status'])
+        self.assertEqual('2100-01-01T11:00:00.000Z',
+                         summary['last_execution']['created_at'])
+
+    def test_bulk_deployment_summary(self):
+        self.put_deployment(deployment_id='dep1', blueprint_id='bp1')
+        self.put_deployment(deployment_id='dep2', blueprint_id='bp2')
+        self.put_deployment(deployment_id='dep3', blueprint_id='bp3')
+
+        summaries = self.get('/summary/deployments',
+                             query_params={'deployment_id': ['dep3', 'dep1']})
+        self.assertEqual(['dep1', 'dep3'],
+                         [s['deployment_id'] for s in summaries.json['items']])
+        self.assertEqual(2, summaries.json['metadata']['pagination']['total'])
+
+        summaries = self.get('/summary/deployments').json['items']
+        self.assertEqual(['dep1', 'dep2', 'dep3'],
+                         [s['deployment_id'] for s in summaries])
+        for summary in summaries:
+            self.assertGreater(summary['node_instances']['total'], 0)
+
+    def test_summary_of_nonexistent_deployment(self):
+        self.put_deployment(deployment_id='dep')
+        for resource_path, query_params in [
+                ('/deployments/nonexistent/summary', None),
+                ('/summary/deployments',
+                 {'deployment_id': ['dep', 'nonexistent']})]:
+            response = self.get(resource_path, query_params=query_params)
+            self.assertEqual(404, response.status_code)
+            self.assertEqual(
+                manager_exceptions.NotFoundError.NOT_FOUND_ERROR_CODE,
+                response.json['error_code'])
+
+    def test_node_instances_exist(self):
+        self.put_deployment(deployment_id='dep')
+        self.assertTrue(self.sm.node_instances_exist('dep'))
+        self.assertFalse(self.sm.node_instances_exist(
+            'dep', exclude_states=['uninitialized']))
+        self.assertFalse(self.sm.node_instances_exist('nonexistent'))
@@ -33,6 +33,11 @@ from manager_rest.test.utils import get_resource as resource
 @attr(client_min_version=2.1, client_max_version=base_test.LATEST_API_VERSION)
 class DeploymentUpdatesTestCase(base_test.BaseServerTestCase):
 
+    # The number of SQL statements allowed for each request of a deployment
+    # update - it mustn't grow with the number of node instances
+    DEPLOYMENT_UPDATE_QUERIES = 55
+    LARGE_DEPLOYMENT_INSTANCES = 30
+
     execution_parameters = {
         'added_instance_ids',
         'added_target_instances_ids',
@@ -331,6 +336,41 @@ class DeploymentUpdatesTestCase(base_test.BaseServerTestCase):
                               archive_path,
                               query_params=kwargs)
 
+    def test_update_queries_dont_grow_with_instances(self):
+        for connected in [True, False]:
+            deployment_id = 'dep_{0}'.format(connected)
+            self.put_large_deployment(self.LARGE_DEPLOYMENT_INSTANCES,
+                                      deployment_id=deployment_id,
+                                      blueprint_id=deployment_id,
+                                      connected=connected)
+            # Removes (or adds) the relationships of all node2 instances
+            blueprint_dir = self.create_large_blueprint(
+                self.LARGE_DEPLOYMENT_INSTANCES, connected=not connected)
+            archive_path = self.archive_mock_blueprint(
+                archive_func=archiving.make_tarbz2file,
+                blueprint_dir=blueprint_dir)
+
+            with self.assert_max_queries(self.DEPLOYMENT_UPDATE_QUERIES):
+                response = self.post_file(
+                    '/deployment-updates/{0}/update/initiate'
+                    .format(deployment_id),
+                    archive_path,
+                    query_params={'application_file_name': 'blueprint.yaml'})
+            self.assertEqual(200, response.status_code)
+            with self.assert_max_queries(self.DEPLOYMENT_UPDATE_QUERIES):
+                self.client.deployment_updates.finalize_commit(
+                    response.json['id'])
+
+            node2_instances = self.sm.list_node_instances(
+                filters={'deployment_id': deployment_id,
+                         'node_id': 'node2'}).items
+            self.assertEqual(self.LARGE_DEPLOYMENT_INSTANCES,
+                             len(node2_instances))
+            for node2_instance in node2_instances:
+                self.assertEqual(
+                    0 if connected else self.LARGE_DEPLOYMENT_INSTANCES,
+                    len(node2_instance.relationships))
+
     def test_storage_serialization_and_response(self):
         now = utils.get_formatted_timestamp()
         sm = get_storage_manager()
@@ -0,0 +1,233 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import mock
+from nose.plugins.attrib import attr
+
+from cloudify_rest_client import exceptions
+
+from manager_rest import config, execution_scheduler
+from manager_rest.test import base_test, mocks
+from manager_rest.storage import get_storage_manager, models
+
+QUEUED = models.Execution.QUEUED
+STARTED = models.Execution.STARTED
+
+
+@attr(client_min_version=2.1, client_max_version=base_test.LATEST_API_VERSION)
+class ExecutionSchedulerTest(base_test.BaseServerTestCase):
+
+    def setUp(self):
+        super(ExecutionSchedulerTest, self).setUp()
+        execution_scheduler.statistics.reset()
+
+    def _set_limits(self, **limits):
+        for name, value in limits.items():
+            patcher = mock.patch.object(config.instance, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _put_deployments(self, count, blueprint_id='blueprint'):
+        self.put_deployment(deployment_id='{0}_0'.format(blueprint_id),
+                            blueprint_id=blueprint_id)
+        for i in range(1, count):
+            self.client.deployments.create(
+                blueprint_id, '{0}_{1}'.format(blueprint_id, i))
+
+    def _keep_running(self):
+        """Started executions keep running, until they're updated (the
+        deployments' environments must be created before)
+        """
+        patcher = mock.patch('manager_rest.test.mocks.task_state',
+                             return_value=STARTED)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _status(self, execution):
+        return get_storage_manager().get_execution(
+            execution.id, include=['status']).status
+
+    def _end(self, execution):
+        self.client.executions.update(execution.id,
+                                      models.Execution.TERMINATED)
+
+    def test_global_limit(self):
+        self._set_limits(max_concurrent_executions=2)
+        self._put_deployments(4)
+        self._keep_running()
+        executions = [self.client.executions.start(
+            'blueprint_{0}'.format(i), 'install') for i in range(4)]
+        self.assertEqual([STARTED, STARTED, QUEUED, QUEUED],
+                         [self._status(e) for e in executions])
+
+        status = self.get('/status/execution-queue').json
+        self.assertEqual(2, status['depth'])
+        self.assertEqual(2, status['running'])
+        self.assertEqual(2, status['queued'])
+        self.assertEqual(2, status['max_concurrent_executions'])
+
+        # Ending a running execution starts the oldest queued one
+        self._end(executions[0])
+        self.assertEqual([STARTED, QUEUED],
+                         [self._status(e) for e in executions[2:]])
+        self._end(executions[1])
+        self.assertEqual(STARTED, self._status(executions[3]))
+
+        status = self.get('/status/execution-queue').json
+        self.assertEqual(0, status['depth'])
+        self.assertEqual(2, status['released'])
+        self.assertGreaterEqual(status['wait_time_max'], 0)
+
+    def test_blueprint_and_workflow_limits(self):
+        self._set_limits(max_concurrent_executions_per_blueprint=2,
+                         max_concurrent_executions_per_workflow=1)
+        self._put_deployments(2)
+        self._put_deployments(1, blueprint_id='other')
+        self._keep_running()
+        install = self.client.executions.start('blueprint_0', 'install')
+        queued_install = self.client.executions.start('blueprint_1',
+                                                      'install')
+        uninstall = self.client.executions.start('other_0', 'uninstall')
+        self.assertEqual([STARTED, QUEUED, STARTED],
+                         [self._status(e) for e in
+                          [install, queued_install, uninstall]])
+
+        # Ending an execution of another workflow doesn't release it
+        self._end(uninstall)
+        self.assertEqual(QUEUED, self._status(queued_install))
+        self._end(install)
+        self.assertEqual(STARTED, self._status(queued_install))
+
+    def test_queued_execution_doesnt_hold_back_others(self):
+        self._set_limits(max_concurrent_executions=2,
+                         max_concurrent_executions_per_blueprint=1)
+        self._put_deployments(2)
+        self._put_deployments(2, blueprint_id='other')
+        self._keep_running()
+        running = self.client.executions.start('blueprint_0', 'install')
+        queued = self.client.executions.start('blueprint_1', 'install')
+        other = self.client.executions.start('other_0', 'install')
+        other_queued = self.client.executions.start('other_1', 'install')
+        self.assertEqual([QUEUED, QUEUED],
+                         [self._status(e) for e in [queued, other_queued]])
+
+        # The oldest queued execution is still over its blueprint's limit
+        self._end(other)
+        self.assertEqual([QUEUED, STARTED],
+                         [self._status(e) for e in [queued, other_queued]])
+        self._end(running)
+        self.assertEqual(STARTED, self._status(queued))
+
+    def test_cancel_queued_execution(self):
+        self._set_limits(max_concurrent_executions=1)
+        self._put_deployments(2)
+        self._keep_running()
+        running = self.client.executions.start('blueprint_0', 'install')
+        queued = self.client.executions.start('blueprint_1', 'install')
+
+        cancelled = self.client.executions.cancel(queued.id)
+        self.assertEqual(models.Execution.CANCELLED, cancelled.status)
+        self._end(running)
+        self.assertEqual(models.Execution.CANCELLED, self._status(queued))
+        self.assertEqual(0, self.get('/status/execution-queue')
+                         .json['released'])
+
+    def test_only_the_scheduler_queues_executions(self):
+        self._set_limits(max_concurrent_executions=1)
+        self._put_deployments(2)
+        self._keep_running()
+        running = self.client.executions.start('blueprint_0', 'install')
+        queued = self.client.executions.start('blueprint_1', 'install')
+        for execution, status in [(queued, STARTED), (running, QUEUED)]:
+            self.assertRaises(exceptions.InvalidExecutionUpdateStatus,
+                              self.client.executions.update,
+                              execution.id, status)
+
+    def test_bulk_execute_queues_executions(self):
+        self._set_limits(max_concurrent_executions=2)
+        self._put_deployments(3)
+        self._keep_running()
+        response = self.post('/executions/bulk', {
+            'workflow_id': 'install',
+            'deployment_filters': {'blueprint_id': 'blueprint'}})
+        self.assertEqual(201, response.status_code, response.json)
+        statuses = sorted(
+            execution.status for execution in
+            get_storage_manager().list_executions(
+                filters={'workflow_id': 'install'}).items)
+        self.assertEqual([QUEUED, STARTED, STARTED], statuses)
+
+    def test_no_limits(self):
+        self._put_deployments(3)
+        self._keep_running()
+        for i in range(3):
+            execution = self.client.executions.start(
+                'blueprint_{0}'.format(i), 'install')
+            self.assertEqual(STARTED, self._status(execution))
+        status = self.get('/status/execution-queue').json
+        self.assertEqual(0, status['depth'])
+        self.assertEqual(3, status['running'])
+        self.assertEqual(0, status['max_concurrent_executions'])
+
+    def _fail_publishing(self, count):
+        """The first `count` tasks published from now on fail"""
+        execute_task = mocks.MockCeleryClient.execute_task
+        published = []
+
+        def publish(client, *args, **kwargs):
+            published.append(kwargs.get('task_id'))
+            if len(published) <= count:
+                raise IOError('broker is down')
+            return execute_task(client, *args, **kwargs)
+
+        patcher = mock.patch.object(mocks.MockCeleryClient, 'execute_task',
+                                    publish)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failed_publish_releases_queued_execution(self):
+        self._set_limits(max_concurrent_executions=1)
+        self._put_deployments(2)
+        self._keep_running()
+        self._fail_publishing(1)
+        response = self.post('/executions/bulk', {
+            'workflow_id': 'install',
+            'deployment_ids': ['blueprint_0', 'blueprint_1']})
+        self.assertEqual(201, response.status_code, response.json)
+        results = response.json['results']
+        self.assertEqual(1, response.json['failed'])
+        self.assertIsNone(results[0]['execution_id'])
+        self.assertIn('broker is down', results[0]['error_message'])
+
+        # The execution that failed to start doesn't hold the only slot
+        statuses = dict(
+            (execution.deployment_id, execution.status) for execution in
+            get_storage_manager().list_executions(
+                filters={'workflow_id': 'install'}).items)
+        self.assertEqual({'blueprint_0': models.Execution.FAILED,
+                          'blueprint_1': STARTED}, statuses)
+
+    def test_failed_publish_of_released_execution_releases_next(self):
+        self._set_limits(max_concurrent_executions=1)
+        self._put_deployments(3)
+        self._keep_running()
+        running = self.client.executions.start('blueprint_0', 'install')
+        queued = [self.client.executions.start(
+            'blueprint_{0}'.format(i), 'install') for i in (1, 2)]
+
+        self._fail_publishing(1)
+        self._end(running)
+        self.assertEqual([models.Execution.FAILED, STARTED],
+                         [self._status(e) for e in queued])
@@ -33,6 +33,9 @@ from manager_rest.storage import get_storage_manager, models
 class ExecutionsTestCase(BaseServerTestCase):
 
     DEPLOYMENT_ID = 'deployment'
+    # The number of SQL statements allowed for starting an execution - it
+    # mustn't grow with the number of (past) executions or node instances
+    START_EXECUTION_QUERIES = 20
 
     def test_get_deployment_executions_empty(self):
         _, deployment_id, _, _ = self.put_deployment(self.DEPLOYMENT_ID)
@@ -47,7 +50,9 @@ class ExecutionsTestCase(BaseServerTestCase):
         (blueprint_id, deployment_id, _,
          deployment_response) = self.put_deployment(self.DEPLOYMENT_ID)
 
-        execution = self.client.executions.start(deployment_id, 'install')
+        with self.assert_max_queries(self.START_EXECUTION_QUERIES):
+            execution = self.client.executions.start(deployment_id,
+                                                     'install')
         get_execution = self.client.executions.get(execution.id)
         self.assertEquals(get_execution.status, 'terminated')
         self.assertEquals(get_execution['blueprint_id'], blueprint_id)
@@ -718,6 +723,53 @@ class ExecutionsTestCase(BaseServerTestCase):
             except exceptions.CloudifyClientError, e:
                 self.assertEqual(expected_status_code, e.status_code)
 
+    def test_start_execution_queries_dont_grow_with_executions(self):
+        self.put_large_deployment(30, deployment_id=self.DEPLOYMENT_ID)
+        sm = get_storage_manager()
+        for i in range(30):
+            sm.put_execution(models.Execution(
+                id='execution_{0}'.format(i),
+                status=models.Execution.TERMINATED,
+                deployment_id=self.DEPLOYMENT_ID,
+                workflow_id='install',
+                blueprint_id='blueprint',
+                created_at=utils.get_formatted_timestamp(),
+                error='',
+                parameters={},
+                is_system_workflow=i % 2 == 0))
+
+        with self.assert_max_queries(self.START_EXECUTION_QUERIES):
+            execution = self.client.executions.start(self.DEPLOYMENT_ID,
+                                                     'install')
+        self._modify_execution_status_in_database(
+            execution=execution, new_status=models.Execution.PENDING)
+        with self.assert_max_queries(self.START_EXECUTION_QUERIES):
+            self.assertRaises(exceptions.CloudifyClientError,
+                              self.client.executions.start,
+                              self.DEPLOYMENT_ID, 'install')
+
+    def test_execute_while_system_wide_execution_running(self):
+        self.put_deployment(self.DEPLOYMENT_ID)
+        sm = get_storage_manager()
+        sm.put_execution(models.Execution(
+            id='system_wide_execution',
+            status=models.Execution.STARTED,
+            deployment_id=None,
+            workflow_id='create_snapshot',
+            created_at=utils.get_formatted_timestamp(),
+            error='',
+            parameters={},
+            is_system_workflow=True))
+
+        with self.assertRaises(exceptions.CloudifyClientError) as cm:
+            self.client.executions.start(self.DEPLOYMENT_ID, 'install')
+        self.assertEqual(400, cm.exception.status_code)
+        self.assertIn('system_wide_execution', str(cm.exception))
+
+        sm.update_execution_status('system_wide_execution',
+                                   models.Execution.TERMINATED, '')
+        self.client.executions.start(self.DEPLOYMENT_ID, 'install')
+
     def test_get_non_existent_execution(self):
         resource_path = '/executions/idonotexist'
         response = self.get(resource_path)
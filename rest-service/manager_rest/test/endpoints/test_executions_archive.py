@@ -0,0 +1,159 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import mock
+from nose.plugins.attrib import attr
+
+from cloudify_rest_client import exceptions
+
+from manager_rest import manager_exceptions, utils
+from manager_rest.test import base_test
+from manager_rest.storage import get_storage_manager, models
+
+OLD_TIMESTAMP = '2000-01-01T10:00:00.000Z'
+
+
+@attr(client_min_version=2.1, client_max_version=base_test.LATEST_API_VERSION)
+class ExecutionsArchiveTest(base_test.BaseServerTestCase):
+
+    def setUp(self):
+        super(ExecutionsArchiveTest, self).setUp()
+        self.sm = get_storage_manager()
+        self.put_deployment(deployment_id='dep')
+
+    def _put_execution(self, execution_id, status, created_at=OLD_TIMESTAMP):
+        self.sm.put_execution(models.Execution(
+            id=execution_id,
+            status=status,
+            deployment_id='dep',
+            workflow_id='install',
+            blueprint_id='blueprint',
+            created_at=created_at,
+            error='',
+            parameters={'key': 'value'},
+            is_system_workflow=False))
+
+    def _list_execution_ids(self, **query_params):
+        response = self.get('/executions', query_params=query_params)
+        self.assertEqual(200, response.status_code)
+        return sorted(item['id'] for item in response.json['items'])
+
+    def test_archive_old_ended_executions(self):
+        self._put_execution('old_terminated', models.Execution.TERMINATED)
+        self._put_execution('old_failed', models.Execution.FAILED)
+        self._put_execution('old_started', models.Execution.STARTED)
+        self._put_execution('new_terminated', models.Execution.TERMINATED,
+                            created_at=utils.get_formatted_timestamp())
+        existing_ids = self._list_execution_ids()
+
+        response = self.post('/executions/archive',
+                             {'retention_days': 30, 'batch_size': 1})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, response.json['archived'])
+        self.assertIsNone(response.json['execution_id'])
+
+        active_ids = self._list_execution_ids()
+        self.assertNotIn('old_terminated', active_ids)
+        self.assertNotIn('old_failed', active_ids)
+        self.assertIn('old_started', active_ids)
+        self.assertIn('new_terminated', active_ids)
+        self.assertRaises(manager_exceptions.NotFoundError,
+                          self.sm.get_execution, 'old_failed')
+
+        self.assertEqual(existing_ids,
+                         self._list_execution_ids(_include_archived='true'))
+        archived = self.get('/executions',
+                            query_params={'_include_archived': 'true',
+                                          'status': 'failed',
+                                          'deployment_id': 'dep'}).json
+        self.assertEqual(1, archived['metadata']['pagination']['total'])
+        self.assertEqual('old_failed', archived['items'][0]['id'])
+        self.assertEqual({'key': 'value'}, archived['items'][0]['parameters'])
+
+        # Nothing is left to archive
+        response = self.post('/executions/archive', {'retention_days': 30})
+        self.assertEqual(0, response.json['archived'])
+
+    def test_deployment_update_executions_are_kept(self):
+        self._put_execution('update_execution', models.Execution.TERMINATED)
+        self.sm.put_deployment_update(models.DeploymentUpdate(
+            id='update',
+            deployment_id='dep',
+            execution_id='update_execution',
+            steps=[],
+            created_at=OLD_TIMESTAMP))
+
+        response = self.post('/executions/archive', {'retention_days': 30})
+        self.assertEqual(0, response.json['archived'])
+        self.assertEqual('update_execution',
+                         self.sm.get_deployment_update('update').execution_id)
+
+    def test_archive_as_system_workflow(self):
+        response = self.post('/executions/archive',
+                             {'retention_days': 7, 'run_as_workflow': True})
+        self.assertEqual(200, response.status_code)
+        execution = self.sm.get_execution(response.json['execution_id'])
+        self.assertEqual('archive_executions', execution.workflow_id)
+        self.assertTrue(execution.is_system_workflow)
+        self.assertEqual({'retention_days': 7, 'batch_size': 1000},
+                         execution.parameters)
+
+    def test_execute_while_archiving_as_system_workflow(self):
+        with mock.patch('manager_rest.test.mocks.task_state',
+                        return_value=models.Execution.STARTED):
+            response = self.post('/executions/archive',
+                                 {'run_as_workflow': True})
+        archive = self.sm.get_execution(response.json['execution_id'])
+        self.assertEqual(models.Execution.STARTED, archive.status)
+
+        execution = self.client.executions.start('dep', 'install')
+        self.assertEqual('install', execution.workflow_id)
+
+    def test_execute_while_archiving_and_system_wide_execution_running(self):
+        for execution_id, workflow_id in [('archive', 'archive_executions'),
+                                          ('snapshot', 'create_snapshot')]:
+            self.sm.put_execution(models.Execution(
+                id=execution_id,
+                status=models.Execution.STARTED,
+                deployment_id=None,
+                workflow_id=workflow_id,
+                created_at=utils.get_formatted_timestamp(),
+                error='',
+                parameters={},
+                is_system_workflow=True))
+
+        with self.assertRaises(exceptions.CloudifyClientError) as cm:
+            self.client.executions.start('dep', 'install')
+        self.assertEqual(400, cm.exception.status_code)
+        self.assertIn('snapshot', str(cm.exception))
+
+    def test_execute_after_environment_creation_archived(self):
+        execution = self.sm.list_executions(filters={
+            'deployment_id': 'dep',
+            'workflow_id': 'create_deployment_environment'}).items[0]
+        execution.created_at = OLD_TIMESTAMP
+        self.sm.update_entity(execution)
+        response = self.post('/executions/archive', {'retention_days': 30})
+        self.assertEqual(1, response.json['archived'])
+
+        execution = self.client.executions.start('dep', 'install')
+        self.assertEqual('install', execution.workflow_id)
+
+    def test_invalid_parameters(self):
+        for data in [{'batch_size': 0},
+                     {'retention_days': -1},
+                     {'retention_days': 'week'}]:
+            response = self.post('/executions/archive', data)
+            self.assertEqual(400, response.status_code)
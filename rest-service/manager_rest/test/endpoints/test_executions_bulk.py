@@ -0,0 +1,164 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import mock
+from nose.plugins.attrib import attr
+
+from manager_rest import manager_exceptions
+from manager_rest.test import base_test
+from manager_rest.storage import get_storage_manager, models
+from manager_rest.workflow_client import WorkflowClient
+
+# Max number of queries of a bulk execution, whatever the number of
+# deployments (apart from publishing the tasks, which the mock celery client
+# does by updating each execution)
+BULK_EXECUTION_QUERIES = 20
+
+
+@attr(client_min_version=2.1, client_max_version=base_test.LATEST_API_VERSION)
+class ExecutionsBulkTest(base_test.BaseServerTestCase):
+
+    def setUp(self):
+        super(ExecutionsBulkTest, self).setUp()
+        self.sm = get_storage_manager()
+
+    def _put_deployments(self, count, blueprint_id='blueprint'):
+        self.put_deployment(deployment_id='dep_0', blueprint_id=blueprint_id)
+        for i in range(1, count):
+            self.client.deployments.create(blueprint_id, 'dep_{0}'.format(i))
+        return ['dep_{0}'.format(i) for i in range(count)]
+
+    def _bulk_execute(self, **data):
+        data.setdefault('workflow_id', 'install')
+        response = self.post('/executions/bulk', data)
+        self.assertEqual(201, response.status_code, response.json)
+        return response.json, {result['deployment_id']: result
+                               for result in response.json['results']}
+
+    def test_bulk_execute(self):
+        deployment_ids = self._put_deployments(3)
+        running = self.client.executions.start('dep_1', 'install')
+        self.sm.update_execution_status(running.id,
+                                        models.Execution.STARTED, '')
+
+        response, results = self._bulk_execute(
+            deployment_ids=deployment_ids + ['nonexistent'],
+            parameters={'key': 'value'},
+            allow_custom_parameters=True)
+        self.assertEqual(2, response['started'])
+        self.assertEqual(2, response['failed'])
+        self.assertEqual(deployment_ids + ['nonexistent'],
+                         [result['deployment_id']
+                          for result in response['results']])
+
+        for deployment_id in ['dep_0', 'dep_2']:
+            self.assertIsNone(results[deployment_id]['error_code'])
+            execution = self.sm.get_execution(
+                results[deployment_id]['execution_id'])
+            self.assertEqual(deployment_id, execution.deployment_id)
+            self.assertEqual('install', execution.workflow_id)
+            self.assertEqual({'key': 'value'}, execution.parameters)
+        self.assertIsNone(results['dep_1']['execution_id'])
+        self.assertEqual(
+            manager_exceptions.ExistingRunningExecutionError
+            .EXISTING_RUNNING_EXECUTION_ERROR_CODE,
+            results['dep_1']['error_code'])
+        self.assertIn(running.id, results['dep_1']['error_message'])
+        self.assertEqual(manager_exceptions.NotFoundError.NOT_FOUND_ERROR_CODE,
+                         results['nonexistent']['error_code'])
+
+        # With force, the running execution doesn't prevent a new one
+        response, _ = self._bulk_execute(deployment_ids=['dep_1'],
+                                         force=True)
+        self.assertEqual(1, response['started'])
+
+    def test_bulk_execute_duplicate_deployments(self):
+        self._put_deployments(2)
+        response, _ = self._bulk_execute(
+            deployment_ids=['dep_1', 'dep_0', 'dep_1'])
+        self.assertEqual(2, response['started'])
+        self.assertEqual(['dep_1', 'dep_0'],
+                         [result['deployment_id']
+                          for result in response['results']])
+        self.assertEqual(1, len(self.sm.list_executions(
+            filters={'deployment_id': 'dep_1',
+                     'workflow_id': 'install'}).items))
+
+    def test_bulk_execute_by_filters(self):
+        self._put_deployments(2)
+        self.put_deployment(deployment_id='other', blueprint_id='other_bp')
+
+        response, results = self._bulk_execute(
+            deployment_filters={'blueprint_id': 'blueprint'})
+        self.assertEqual(2, response['started'])
+        self.assertEqual(['dep_0', 'dep_1'], sorted(results))
+
+    def test_bulk_execute_invalid_workflow_and_parameters(self):
+        self._put_deployments(1)
+        _, results = self._bulk_execute(workflow_id='nonexistent',
+                                        deployment_ids=['dep_0'])
+        self.assertEqual(
+            manager_exceptions.NonexistentWorkflowError
+            .NONEXISTENT_WORKFLOW_ERROR_CODE,
+            results['dep_0']['error_code'])
+
+        _, results = self._bulk_execute(deployment_ids=['dep_0'],
+                                        parameters={'custom': 'value'})
+        self.assertEqual(
+            manager_exceptions.IllegalExecutionParametersError
+            .ILLEGAL_EXECUTION_PARAMETERS_ERROR_CODE,
+            results['dep_0']['error_code'])
+
+    def test_publish_failure(self):
+        self._put_deployments(2)
+        execute_workflow = WorkflowClient.execute_workflow
+
+        def fail_dep_1(*args, **kwargs):
+            if kwargs['deployment_id'] == 'dep_1':
+                raise IOError('connection refused')
+            return execute_workflow(*args, **kwargs)
+
+        with mock.patch.object(WorkflowClient, 'execute_workflow',
+                               side_effect=fail_dep_1):
+            response, results = self._bulk_execute(
+                deployment_ids=['dep_0', 'dep_1'])
+        self.assertEqual(1, response['started'])
+        self.assertIsNone(results['dep_1']['execution_id'])
+        self.assertIn('connection refused', results['dep_1']['error_message'])
+        failed = self.sm.list_executions(filters={
+            'deployment_id': 'dep_1',
+            'status': models.Execution.FAILED}).items
+        self.assertEqual(1, len(failed))
+
+    def test_bulk_execute_queries_dont_grow_with_deployments(self):
+        deployment_ids = self._put_deployments(10)
+        with mock.patch.object(WorkflowClient, 'execute_workflow'):
+            for count in [2, 10]:
+                with self.assert_max_queries(BULK_EXECUTION_QUERIES):
+                    response, _ = self._bulk_execute(
+                        deployment_ids=deployment_ids[:count], force=True)
+                self.assertEqual(count, response['started'])
+
+    def test_invalid_requests(self):
+        for data in [{'workflow_id': 'install'},
+                     {'workflow_id': 'install',
+                      'deployment_ids': ['dep'],
+                      'deployment_filters': {'id': 'dep'}},
+                     {'workflow_id': 'install', 'deployment_ids': 'dep'},
+                     {'workflow_id': 'install',
+                      'deployment_filters': {'nonexistent': 'value'}},
+                     {'deployment_ids': ['dep']}]:
+            response = self.post('/executions/bulk', data)
+            self.assertEqual(400, response.status_code, data)
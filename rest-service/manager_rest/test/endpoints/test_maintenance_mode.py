@@ -248,7 +248,8 @@ class MaintenanceModeTest(BaseServerTestCase):
                           self.client.blueprints.list)
 
     def test_running_execution_maintenance_activating_error_raised(self):
-        self._test_different_execution_status_in_activating_mode()
+        self._test_different_execution_status_in_activating_mode(
+                models.Execution.STARTED)
 
     def test_pending_execution_maintenance_activating_error_raised(self):
         self._test_different_execution_status_in_activating_mode(
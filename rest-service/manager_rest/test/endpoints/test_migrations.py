@@ -0,0 +1,201 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import json
+import zlib
+import pickle
+
+import mock
+from nose.plugins.attrib import attr
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import postgresql
+
+from manager_rest import utils
+from manager_rest.test import base_test
+from manager_rest.storage import db, get_storage_manager, migrations, models
+
+
+class PostgresDDLRecorder(object):
+    """A connection to a PostgreSQL DB in which all the types exist, and
+    no tables, that records the DDL statements instead of running them
+    """
+    def __init__(self):
+        self.dialect = postgresql.dialect()
+        self.dialect.has_type = mock.Mock(return_value=True)
+        self.dialect.has_table = mock.Mock(return_value=False)
+        self.statements = []
+
+    @staticmethod
+    def schema_for_object(element):
+        return element.schema
+
+    def _run_visitor(self, visitorcallable, element, **kwargs):
+        visitorcallable(self.dialect, self, **kwargs).traverse_single(element)
+
+    def execute(self, statement, *_, **__):
+        self.statements.append(str(statement.compile(dialect=self.dialect)))
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class MigrationsTest(base_test.BaseServerTestCase):
+
+    def test_migrate_pickled_values_to_json(self):
+        now = utils.get_formatted_timestamp()
+        sm = get_storage_manager()
+        sm.put_deployment(models.Deployment(id='new-dep',
+                                            created_at=now,
+                                            inputs={'name': 'new'}))
+        sm.put_deployment(models.Deployment(id='legacy-dep',
+                                            created_at=now,
+                                            inputs={}))
+        legacy_inputs = {'name': 'legacy', 'nodes': [{'id': 'vm'}]}
+        db.engine.execute(
+            text("UPDATE deployments SET inputs = :inputs "
+                 "WHERE id = 'legacy-dep'"),
+            inputs=buffer(pickle.dumps(legacy_inputs,
+                                       pickle.HIGHEST_PROTOCOL)))
+
+        with db.engine.connect() as connection:
+            migrations.migrate_pickle_columns_to_json(connection)
+            # Running the migration again doesn't change anything
+            migrations.migrate_pickle_columns_to_json(connection)
+
+        self.assertEqual(legacy_inputs,
+                         sm.get_deployment('legacy-dep').inputs)
+        self.assertEqual({'name': 'new'}, sm.get_deployment('new-dep').inputs)
+
+    @attr(client_min_version=2.1,
+          client_max_version=base_test.LATEST_API_VERSION)
+    def test_migrations_endpoint(self):
+        sm = get_storage_manager()
+        sm.put_deployment(models.Deployment(
+            id='legacy-dep', created_at=utils.get_formatted_timestamp(),
+            inputs={}))
+        # e.g. restored from an older manager's snapshot
+        db.engine.execute(
+            text("UPDATE deployments SET inputs = :inputs "
+                 "WHERE id = 'legacy-dep'"),
+            inputs=buffer(pickle.dumps({'name': 'legacy'},
+                                       pickle.HIGHEST_PROTOCOL)))
+
+        response = self.post('/migrations', {})
+        self.assertEqual(200, response.status_code)
+        self.assertIn('migrate_pickle_columns_to_json',
+                      response.json['migrations'])
+        self.assertEqual({'name': 'legacy'},
+                         sm.get_deployment('legacy-dep').inputs)
+
+    def test_compress_json_columns(self):
+        now = utils.get_formatted_timestamp()
+        sm = get_storage_manager()
+        large_plan = {'nodes': [{'id': 'vm_{0}'.format(i)}
+                                for i in range(200)]}
+        plans = {'small': {'name': 'small'},
+                 'pickled': large_plan,
+                 'text': large_plan}
+        for blueprint_id in plans:
+            sm.put_blueprint(models.Blueprint(id=blueprint_id,
+                                              created_at=now,
+                                              main_file_name='a.yaml',
+                                              plan={}))
+        update = text('UPDATE blueprints SET plan = :plan WHERE id = :id')
+        db.engine.execute(update, id='small', plan=json.dumps(plans['small']))
+        db.engine.execute(update, id='pickled', plan=buffer(pickle.dumps(
+            large_plan, pickle.HIGHEST_PROTOCOL)))
+        db.engine.execute(update, id='text', plan=json.dumps(large_plan))
+
+        with db.engine.connect() as connection:
+            migrations.compress_json_columns(connection)
+            # Running the migration again doesn't change anything
+            migrations.compress_json_columns(connection)
+
+        for blueprint_id, plan in plans.items():
+            self.assertEqual(plan, sm.get_blueprint(blueprint_id).plan)
+        stored = dict(db.engine.execute(
+            text('SELECT id, plan FROM blueprints')).fetchall())
+        self.assertEqual('{"name":"small"}', str(stored['small']))
+        for blueprint_id in ['pickled', 'text']:
+            self.assertEqual(large_plan,
+                             json.loads(zlib.decompress(stored[blueprint_id])))
+
+    def test_create_missing_indexes(self):
+        index_name = 'ix_executions_deployment_id_status'
+        db.engine.execute(text('DROP INDEX {0}'.format(index_name)))
+
+        with db.engine.connect() as connection:
+            migrations.create_missing_indexes(connection)
+            # Existing indexes are skipped
+            migrations.create_missing_indexes(connection)
+
+        index_names = [index['name'] for index
+                       in inspect(db.engine).get_indexes('executions')]
+        self.assertIn(index_name, index_names)
+
+    def test_split_node_instance_payloads(self):
+        self.put_deployment(deployment_id='dep',
+                            blueprint_file_name='modify1.yaml')
+        sm = get_storage_manager()
+        node_instance = sm.list_node_instances().items[0]
+        # Recreate the legacy layout, where the payloads were stored in the
+        # node_instances table (pickled, in old enough versions)
+        for column_name in models.NodeInstancePayload.FIELDS:
+            db.engine.execute(text(
+                'ALTER TABLE node_instances ADD COLUMN {0} BLOB'
+                .format(column_name)))
+        db.engine.execute(
+            text('UPDATE node_instances SET runtime_properties = :props, '
+                 "relationships = '[]' WHERE id = :id"),
+            props=buffer(pickle.dumps({'key': 'value'})),
+            id=node_instance.id)
+        db.engine.execute(
+            text('DELETE FROM node_instance_payloads '
+                 'WHERE node_instance_id = :id'),
+            id=node_instance.id)
+
+        with db.engine.connect() as connection:
+            migrations.split_node_instance_payloads(connection)
+            # Node instances that already have a payload are skipped
+            migrations.split_node_instance_payloads(connection)
+
+        migrated = sm.get_node_instance(node_instance.id)
+        self.assertEqual({'key': 'value'}, migrated.runtime_properties)
+        self.assertEqual([], migrated.relationships)
+        self.assertEqual(len(sm.list_node_instances().items),
+                         models.NodeInstancePayload.query.count())
+
+    def test_create_missing_tables(self):
+        db.engine.execute(text('DROP TABLE executions_archive'))
+
+        with db.engine.connect() as connection:
+            migrations.create_missing_tables(connection)
+            # Existing tables are skipped
+            migrations.create_missing_tables(connection)
+
+        self.assertIn('executions_archive',
+                      inspect(db.engine).get_table_names())
+
+    def test_create_missing_tables_with_existing_types(self):
+        connection = PostgresDDLRecorder()
+        tables = [table.name for table in models.db.metadata.sorted_tables
+                  if table.name != 'executions_archive']
+        with mock.patch.object(migrations, 'inspect') as inspector:
+            inspector.return_value.get_table_names.return_value = tables
+            migrations.create_missing_tables(connection)
+
+        # The archive's `execution_status` type already exists
+        self.assertTrue(connection.statements[0].strip().startswith(
+            'CREATE TABLE executions_archive'))
+        self.assertFalse([statement for statement in connection.statements
+                          if 'CREATE TYPE' in statement])
@@ -29,6 +29,10 @@ from cloudify_rest_client.deployment_modifications import (
 
 
 EXPECTS_SCALING_GROUPS = CLIENT_API_VERSION not in ['v1', 'v2']
+# The number of SQL statements allowed for each request of a deployment
+# modification - it mustn't grow with the number of node instances
+MODIFICATION_QUERIES = 25
+LARGE_DEPLOYMENT_INSTANCES = 30
 
 
 @attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
@@ -42,23 +46,47 @@ class ModifyTests(base_test.BaseServerTestCase):
             expected_end_status=DeploymentModification.FINISHED,
             expected_end_node_counts={
                 'num': 2, 'deploy_num': 1, 'planned_num': 2},
-            expected_before_end_func=lambda before_end: [],
+            expected_before_end_func=lambda before_end, _: [],
             expected_after_end_func=expected_after_end_func,
             expected_after_end_count=3,
-            expected_after_end_runtime_property='after_start')
+            expected_after_end_runtime_properties=('after_start',
+                                                   'after_start'))
 
     def test_data_model_with_rollback(self):
-        def expected_after_end_func(before_modification, _):
-            return before_modification
+        def expected_before_end_func(before_end, initial_instance_ids):
+            # The node instances affected by the rollback: the added node1
+            # instance, and the related node2 instance
+            return [instance for instance in before_end
+                    if instance.node_id == 'node2' or
+                    instance.id not in initial_instance_ids]
+
+        def expected_after_end_func(before_modification, before_end):
+            # The added node1 instance is deleted, and the node2 instance
+            # is restored (with a new version). The node1 instance that
+            # the modification didn't change is left as it is
+            after_end = []
+            for instance in before_modification:
+                if instance.node_id == 'node1':
+                    instance = [i for i in before_end
+                                if i.id == instance.id][0]
+                else:
+                    version = [i.version for i in before_end
+                               if i.id == instance.id][0]
+                    instance = copy.deepcopy(instance)
+                    instance['version'] = version + 1
+                after_end.append(instance)
+            return after_end
+
         self._test_data_model_impl(
             end_func=self.client.deployment_modifications.rollback,
             expected_end_status=DeploymentModification.ROLLEDBACK,
             expected_end_node_counts={
                 'num': 1, 'deploy_num': 1, 'planned_num': 1},
-            expected_before_end_func=lambda before_end: before_end,
+            expected_before_end_func=expected_before_end_func,
             expected_after_end_func=expected_after_end_func,
             expected_after_end_count=2,
-            expected_after_end_runtime_property='before_start')
+            expected_after_end_runtime_properties=('after_start',
+                                                   'before_start'))
 
     def _test_data_model_impl(
             self,
@@ -68,7 +96,7 @@ class ModifyTests(base_test.BaseServerTestCase):
             expected_before_end_func,
             expected_after_end_func,
             expected_after_end_count,
-            expected_after_end_runtime_property):
+            expected_after_end_runtime_properties):
 
         def node_assertions(num, deploy_num, planned_num):
             node = self.client.nodes.get(deployment.id, 'node1')
@@ -99,14 +127,18 @@ class ModifyTests(base_test.BaseServerTestCase):
 
         before_modification = self.list_items(self.client.node_instances.list,
                                               deployment.id)
+        initial_instance_ids = [i.id for i in before_modification]
+        node2_instance_before = [i for i in before_modification
+                                 if i.node_id == 'node2'][0]
         modified_nodes = {'node1': {'instances': 2}}
         modification = self.client.deployment_modifications.start(
             deployment.id, nodes=modified_nodes, context=mock_context)
         self._fix_modification(modification)
 
+        # Only the node instances changed by the modification are recorded
         self._assert_instances_equal(
             modification.node_instances.before_modification,
-            before_modification)
+            [node2_instance_before])
         self.assertIsNone(modification.ended_at)
 
         self.client.node_instances.update(
@@ -165,10 +197,10 @@ class ModifyTests(base_test.BaseServerTestCase):
             deployment_id='i_really_should_not_exist'))
         self._assert_instances_equal(
             modification.node_instances.before_modification,
-            before_modification)
+            [node2_instance_before])
         self._assert_instances_equal(
             modification.node_instances.before_rollback,
-            expected_before_end_func(before_end))
+            expected_before_end_func(before_end, initial_instance_ids))
 
         self._assert_instances_equal(
             after_end,
@@ -181,11 +213,11 @@ class ModifyTests(base_test.BaseServerTestCase):
         self.assertEqual(
             self.client.node_instances.get(
                 node1_instance.id).runtime_properties['test'],
-            expected_after_end_runtime_property)
+            expected_after_end_runtime_properties[0])
         self.assertEqual(
             self.client.node_instances.get(
                 node2_instance.id).runtime_properties['test'],
-            expected_after_end_runtime_property)
+            expected_after_end_runtime_properties[1])
 
     def _assert_instances_equal(self, instances1, instances2):
         def sort_key(instance):
@@ -276,8 +308,9 @@ class ModifyTests(base_test.BaseServerTestCase):
         self._assert_number_of_instances(deployment.id, 'node1', 1, 1)
 
         modified_nodes = {'node1': {'instances': 2}}
-        modification = self.client.deployment_modifications.start(
-            deployment.id, nodes=modified_nodes)
+        with self.assert_max_queries(MODIFICATION_QUERIES):
+            modification = self.client.deployment_modifications.start(
+                deployment.id, nodes=modified_nodes)
 
         self._assert_number_of_instances(deployment.id, 'node1', 1, 1)
 
@@ -308,7 +341,8 @@ class ModifyTests(base_test.BaseServerTestCase):
         added_and_related = modification.node_instances.added_and_related
         self.assertEqual(2, len(added_and_related))
 
-        self.client.deployment_modifications.finish(modification.id)
+        with self.assert_max_queries(MODIFICATION_QUERIES):
+            self.client.deployment_modifications.finish(modification.id)
 
         self._assert_number_of_instances(deployment.id, 'node1', 2, 1)
 
@@ -371,6 +405,42 @@ class ModifyTests(base_test.BaseServerTestCase):
         self.assertEqual(1, len(node2_target_ids))
         self.assertEqual(node1_instance_id, node2_target_ids[0])
 
+    def test_rollback_remove_instance(self):
+        _, _, _, deployment = self.put_deployment(
+            deployment_id=str(uuid.uuid4()),
+            blueprint_file_name='modify2.yaml')
+        node_instances = {
+            i.id: i for i in self.client.node_instances.list(
+                deployment_id=deployment.id)}
+
+        modification = self.client.deployment_modifications.start(
+            deployment.id, nodes={'node1': {'instances': 1}})
+        removed_and_related = modification.node_instances.removed_and_related
+        removed_id = [i['id'] for i in removed_and_related
+                      if i.get('modification') == 'removed'][0]
+        # The removed instance and its related node2 instance are recorded
+        self.assertEqual(
+            sorted(i['id'] for i in removed_and_related),
+            sorted(i['id'] for i in
+                   modification.node_instances.before_modification))
+
+        # e.g. the scale-in workflow deleted it, and then failed
+        self.client.node_instances.update(
+            removed_id, state='deleted',
+            runtime_properties={'test': 'after_start'}, version=1)
+        self.client.deployment_modifications.rollback(modification.id)
+
+        after_rollback = {i.id: i for i in self.client.node_instances.list(
+            deployment_id=deployment.id)}
+        self.assertEqual(sorted(node_instances), sorted(after_rollback))
+        removed = after_rollback[removed_id]
+        self.assertEqual(node_instances[removed_id].state, removed.state)
+        self.assertEqual({}, removed.runtime_properties)
+        for instance_id, instance in node_instances.items():
+            self.assertEqual(instance.relationships,
+                             after_rollback[instance_id].relationships)
+        self._assert_number_of_instances(deployment.id, 'node1', 2, 2)
+
     def _assert_number_of_instances(self,
                                     deployment_id, node_id,
                                     expected_number_of_instances,
@@ -467,3 +537,51 @@ class ModifyTests(base_test.BaseServerTestCase):
                 'target_name': target_name,
                 'type': 'cloudify.relationships.{0}'.format(tpe)
             }, relationship)
+
+    def test_modification_queries_dont_grow_with_instances(self):
+        self.put_large_deployment(LARGE_DEPLOYMENT_INSTANCES,
+                                  deployment_id='dep')
+        modifications = self.client.deployment_modifications
+        for node1_instances, end_modification in [
+                (LARGE_DEPLOYMENT_INSTANCES + 5, modifications.finish),
+                (1, modifications.finish),
+                (LARGE_DEPLOYMENT_INSTANCES, modifications.rollback)]:
+            with self.assert_max_queries(MODIFICATION_QUERIES):
+                modification = modifications.start(
+                    'dep', nodes={'node1': {'instances': node1_instances}})
+            with self.assert_max_queries(MODIFICATION_QUERIES):
+                end_modification(modification.id)
+
+        node1_instances = self.sm.list_node_instances(
+            filters={'deployment_id': 'dep', 'node_id': 'node1'}).items
+        self.assertEqual(1, len(node1_instances))
+        node2_instances = self.sm.list_node_instances(
+            filters={'deployment_id': 'dep', 'node_id': 'node2'}).items
+        self.assertEqual(LARGE_DEPLOYMENT_INSTANCES, len(node2_instances))
+        for node2_instance in node2_instances:
+            self.assertEqual(
+                [node1_instances[0].id],
+                [r['target_id'] for r in node2_instance.relationships])
+
+    def test_modification_records_only_changed_instances(self):
+        self.put_large_deployment(LARGE_DEPLOYMENT_INSTANCES,
+                                  deployment_id='dep', connected=False)
+        modification = self.client.deployment_modifications.start(
+            'dep', nodes={'node2': {
+                'instances': LARGE_DEPLOYMENT_INSTANCES + 1}})
+        # The added instance isn't related to any existing instance, so
+        # none of them is recorded
+        self.assertEqual(
+            [], modification.node_instances.before_modification)
+        self.assertEqual(1, len(modification.node_instances.added_and_related))
+
+        self.client.deployment_modifications.rollback(modification.id)
+        modification = self.client.deployment_modifications.get(
+            modification.id)
+        self.assertEqual(
+            [modification.node_instances.added_and_related[0]['id']],
+            [instance['id'] for instance in
+             modification.node_instances.before_rollback])
+        self.assertEqual(LARGE_DEPLOYMENT_INSTANCES, len(
+            self.sm.list_node_instances(
+                filters={'deployment_id': 'dep', 'node_id': 'node2'}).items))
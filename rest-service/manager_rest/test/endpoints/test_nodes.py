@@ -145,6 +145,36 @@ class NodesTest(base_test.BaseServerTestCase):
                 runtime_properties={'key': 'new value'})
         self.assertEqual(cm.exception.status_code, 409)
 
+    def test_concurrent_update_conflict(self):
+        """The second of two updates based on the same version fails,
+        and doesn't overwrite the first one."""
+        self.put_node_instance(instance_id='1234', deployment_id='111')
+        sm = get_storage_manager()
+        first = sm.get_node_instance('1234')
+        second = sm.get_node_instance('1234')
+
+        first.runtime_properties = {'writer': 'first'}
+        updated = sm.update_node_instance(first)
+        self.assertEqual(2, updated.version)
+
+        second.runtime_properties = {'writer': 'second'}
+        self.assertRaises(manager_exceptions.ConflictError,
+                          sm.update_node_instance,
+                          second)
+
+        stored = sm.get_node_instance('1234')
+        self.assertEqual(2, stored.version)
+        self.assertEqual({'writer': 'first'}, stored.runtime_properties)
+
+    def test_update_missing_node_instance(self):
+        self.put_node_instance(instance_id='1234', deployment_id='111')
+        sm = get_storage_manager()
+        instance = sm.get_node_instance('1234')
+        sm.delete_node_instance('1234')
+        self.assertRaises(manager_exceptions.NotFoundError,
+                          sm.update_node_instance,
+                          instance)
+
     def test_patch_node(self):
         """Getting an instance after updating it, returns the updated data."""
         node_instance_id = '1234'
@@ -0,0 +1,85 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+from flask import current_app
+from nose.plugins.attrib import attr
+
+from manager_rest import config
+from manager_rest.test import base_test
+from manager_rest.storage import get_storage_manager, instrumentation
+
+
+@attr(client_min_version=2.1, client_max_version=base_test.LATEST_API_VERSION)
+class QueryInstrumentationTest(base_test.BaseServerTestCase):
+
+    def setUp(self):
+        super(QueryInstrumentationTest, self).setUp()
+        instrumentation.statistics.reset()
+
+    def test_statement_shape(self):
+        self.assertEqual(
+            'SELECT a FROM t WHERE t.id IN (...) AND t.b = ?',
+            instrumentation.statement_shape(
+                'SELECT a\n  FROM t WHERE t.id IN (?, ?,?) AND t.b = ?'))
+        self.assertEqual(
+            instrumentation.statement_shape(
+                'DELETE FROM t WHERE t.id IN (%(id_1)s)'),
+            instrumentation.statement_shape(
+                'DELETE FROM t WHERE t.id IN (%(id_1)s, %(id_2)s)'))
+
+    def test_debug_headers(self):
+        response = self.app.get(self._version_url('/blueprints'))
+        self.assertNotIn(instrumentation.QUERY_COUNT_HEADER,
+                         response.headers)
+
+        config.instance.sql_debug_headers = True
+        response = self.app.get(self._version_url('/blueprints'))
+        self.assertGreater(
+            int(response.headers[instrumentation.QUERY_COUNT_HEADER]), 0)
+        self.assertGreater(
+            float(response.headers[instrumentation.QUERY_TIME_HEADER]), 0)
+        self.assertEqual(
+            '0', response.headers[instrumentation.N_PLUS_ONE_HEADER])
+
+    def test_n_plus_one_detection(self):
+        self.put_deployment(deployment_id='dep', blueprint_id='bp')
+        sm = get_storage_manager()
+        threshold = config.instance.sql_n_plus_one_threshold
+        with current_app.test_request_context():
+            for _ in range(threshold):
+                sm.get_blueprint('bp', include=['id'])
+            sm.get_deployment('dep', include=['id'])
+            queries = instrumentation.current_queries()
+            self.assertEqual(threshold + 1, queries.count)
+            repeated = queries.repeated_shapes(threshold)
+            self.assertEqual(1, len(repeated))
+            self.assertIn('blueprints', repeated[0][0])
+            self.assertEqual(threshold, repeated[0][1])
+            self.assertLessEqual(len(queries.slowest),
+                                 instrumentation.SLOWEST_QUERIES)
+
+    def test_endpoint_statistics(self):
+        for _ in range(3):
+            self.get('/blueprints')
+        self.get('/blueprints/nonexistent')
+
+        endpoints = self.get('/status/queries').json['endpoints']
+        blueprints = endpoints['GET /api/v2.1/blueprints']
+        self.assertEqual(3, blueprints['requests'])
+        self.assertGreaterEqual(blueprints['queries'], 3)
+        self.assertEqual(0, blueprints['n_plus_one_requests'])
+        self.assertEqual(
+            1, endpoints['GET /api/v2.1/blueprints/<string:blueprint_id>']
+            ['requests'])
@@ -0,0 +1,96 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import os
+import tempfile
+
+from flask import current_app
+from nose.plugins.attrib import attr
+
+from manager_rest import manager_exceptions, utils
+from manager_rest.test import base_test
+from manager_rest.storage import db, models, routing, UnitOfWork
+
+
+@attr(client_min_version=2, client_max_version=base_test.LATEST_API_VERSION)
+class ReadReplicaTest(base_test.BaseServerTestCase):
+    """The primary and the replica are separate SQLite files, with
+    different blueprints in each, so it's visible where a read was sent
+    """
+
+    def create_configuration(self):
+        test_config = super(ReadReplicaTest, self).create_configuration()
+        fd, self.replica_db_file = tempfile.mkstemp(prefix='sqlite-replica-')
+        os.close(fd)
+        self.addCleanup(self.quiet_delete, self.replica_db_file)
+        test_config.postgresql_replica_uris = [
+            'sqlite:///{0}'.format(self.replica_db_file)]
+        return test_config
+
+    def setUp(self):
+        super(ReadReplicaTest, self).setUp()
+        replica_engine = db.get_engine(
+            current_app, bind='{0}0'.format(routing.REPLICA_BIND_PREFIX))
+        db.Model.metadata.create_all(replica_engine)
+        replica_engine.execute(models.Blueprint.__table__.insert(),
+                               id='replica_bp',
+                               created_at=utils.get_formatted_timestamp(),
+                               main_file_name='a',
+                               plan={})
+        self._put_blueprint('primary_bp')
+
+    def _put_blueprint(self, blueprint_id):
+        self.sm.put_blueprint(models.Blueprint(
+            id=blueprint_id,
+            created_at=utils.get_formatted_timestamp(),
+            main_file_name='a',
+            plan={}))
+
+    def _blueprint_ids(self):
+        return sorted(blueprint.id for blueprint in
+                      self.sm.list_blueprints(include=['id']).items)
+
+    def test_request_reads_from_replica(self):
+        response = self.get('/blueprints', query_params={'_include': 'id'})
+        self.assertEqual(['replica_bp'],
+                         [item['id'] for item in response.json['items']])
+        self.assertEqual(404, self.get('/blueprints/primary_bp').status_code)
+        self.assertEqual(200, self.get('/blueprints/replica_bp').status_code)
+
+    def test_streamed_list_reads_from_replica(self):
+        response = self.get('/blueprints', query_params={'_include': 'id',
+                                                         '_stream': 'true'})
+        self.assertEqual(['replica_bp'],
+                         [item['id'] for item in response.json['items']])
+
+    def test_primary_is_sticky_after_write(self):
+        with current_app.test_request_context():
+            self.assertEqual(['replica_bp'], self._blueprint_ids())
+            self._put_blueprint('new_bp')
+            self.assertEqual(['new_bp', 'primary_bp'], self._blueprint_ids())
+            self.assertRaises(manager_exceptions.NotFoundError,
+                              self.sm.get_blueprint, 'replica_bp')
+
+        # A new request reads from the replica again
+        with current_app.test_request_context():
+            self.assertEqual(['replica_bp'], self._blueprint_ids())
+
+    def test_reads_from_primary_outside_requests(self):
+        self.assertEqual(['primary_bp'], self._blueprint_ids())
+
+    def test_unit_of_work_reads_from_primary(self):
+        with current_app.test_request_context():
+            with UnitOfWork():
+                self.assertEqual(['primary_bp'], self._blueprint_ids())
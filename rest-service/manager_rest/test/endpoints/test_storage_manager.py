@@ -13,11 +13,14 @@
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
 
+from contextlib import contextmanager
+
 from nose.plugins.attrib import attr
+from sqlalchemy import event
 
-from manager_rest import utils
+from manager_rest import manager_exceptions, utils
 from manager_rest.test import base_test
-from manager_rest.storage import get_storage_manager, models
+from manager_rest.storage import db, get_storage_manager, models
 
 
 @attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
@@ -162,3 +165,167 @@ class StorageManagerTests(base_test.BaseServerTestCase):
         self.assertFalse(hasattr(blueprint_restored, 'updated_at'))
         self.assertFalse(hasattr(blueprint_restored, 'plan'))
         self.assertFalse(hasattr(blueprint_restored, 'main_file_name'))
+
+    def test_bulk_put_nodes_and_node_instances(self):
+        now = utils.get_formatted_timestamp()
+        sm = get_storage_manager()
+        sm.put_blueprint(models.Blueprint(id='blueprint-id',
+                                          created_at=now,
+                                          updated_at=now,
+                                          description=None,
+                                          plan={'name': 'my-bp'},
+                                          main_file_name='aaa'))
+        sm.put_deployment(models.Deployment(id='dep-1',
+                                            created_at=now,
+                                            updated_at=now,
+                                            blueprint_id='blueprint-id',
+                                            permalink=None,
+                                            description=None,
+                                            workflows={},
+                                            inputs={},
+                                            policy_types={},
+                                            policy_triggers={},
+                                            groups={},
+                                            scaling_groups={},
+                                            outputs={}))
+        sm.put_nodes([models.Node(id='node-{0}'.format(i),
+                                  deployment_id='dep-1',
+                                  blueprint_id='blueprint-id',
+                                  type='type',
+                                  number_of_instances=1,
+                                  planned_number_of_instances=1,
+                                  deploy_number_of_instances=1,
+                                  min_number_of_instances=1,
+                                  max_number_of_instances=1)
+                      for i in range(3)])
+        node_instances = [models.NodeInstance(id='node-{0}_{1}'.format(i, j),
+                                              node_id='node-{0}'.format(i),
+                                              deployment_id='dep-1',
+                                              state='uninitialized',
+                                              runtime_properties={},
+                                              version=None)
+                          for i in range(3) for j in range(2)]
+        sm.put_node_instances(node_instances)
+
+        self.assertEquals(3, len(sm.list_nodes().items))
+        stored_instances = sm.list_node_instances().items
+        self.assertEquals(6, len(stored_instances))
+        self.assertTrue(all(instance.version == 1
+                            for instance in stored_instances))
+        node = sm.get_node('dep-1', 'node-0')
+        self.assertEquals('dep-1_node-0', node.storage_id)
+
+        # A single conflicting instance fails the whole batch
+        duplicates = [models.NodeInstance(id='new-instance',
+                                          node_id='node-0',
+                                          deployment_id='dep-1',
+                                          state='uninitialized'),
+                      models.NodeInstance(id='node-0_0',
+                                          node_id='node-0',
+                                          deployment_id='dep-1',
+                                          state='uninitialized')]
+        self.assertRaises(manager_exceptions.ConflictError,
+                          sm.put_node_instances,
+                          duplicates)
+        self.assertEquals(6, len(sm.list_node_instances().items))
+
+    @contextmanager
+    def _capture_updates(self):
+        statements = []
+
+        def capture_update(conn, cursor, statement, *_):
+            if statement.startswith('UPDATE'):
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', capture_update)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture_update)
+
+    def _put_node_instance(self):
+        self.put_deployment(deployment_id='dep',
+                            blueprint_file_name='modify1.yaml')
+        return get_storage_manager().list_node_instances().items[0]
+
+    def test_update_node_instance_changed_columns(self):
+        sm = get_storage_manager()
+        node_instance = self._put_node_instance()
+        node_instance.state = 'started'
+        with self._capture_updates() as statements:
+            sm.update_node_instance(node_instance)
+
+        self.assertEquals(1, len(statements))
+        self.assertIn('state', statements[0])
+        self.assertNotIn('runtime_properties', statements[0])
+        self.assertNotIn('relationships', statements[0])
+        updated = sm.get_node_instance(node_instance.id)
+        self.assertEquals('started', updated.state)
+        self.assertEquals(node_instance.relationships, updated.relationships)
+        self.assertEquals(2, updated.version)
+        self.assertEquals(2, node_instance.version)
+
+    def test_update_node_instance_fields(self):
+        sm = get_storage_manager()
+        node_instance = self._put_node_instance()
+        with self._capture_updates() as statements:
+            new_version = sm.update_node_instance_fields(
+                node_instance.id, 1, runtime_properties={'key': 'value'})
+
+        self.assertEquals(2, new_version)
+        self.assertNotIn('state', statements[0])
+        updated = sm.get_node_instance(node_instance.id)
+        self.assertEquals({'key': 'value'}, updated.runtime_properties)
+        self.assertEquals(node_instance.state, updated.state)
+
+        self.assertRaises(manager_exceptions.ConflictError,
+                          sm.update_node_instance_fields,
+                          node_instance.id, 1, state='started')
+        self.assertRaises(manager_exceptions.NotFoundError,
+                          sm.update_node_instance_fields,
+                          'nonexistent', 1, state='started')
+        self.assertRaises(manager_exceptions.BadParametersError,
+                          sm.update_node_instance_fields,
+                          node_instance.id, 2, nonexistent='value')
+
+    def test_node_instance_payload(self):
+        sm = get_storage_manager()
+        node_instance = self._put_node_instance()
+        node_instance.state = 'started'
+        with self._capture_updates() as statements:
+            sm.update_node_instance(node_instance)
+        self.assertEquals(1, len(statements))
+        self.assertNotIn('node_instance_payloads', statements[0])
+
+        node_instance.runtime_properties = {'key': 'value'}
+        with self._capture_updates() as statements:
+            sm.update_node_instance(node_instance)
+        self.assertEquals(2, len(statements))
+        self.assertIn('node_instance_payloads', statements[1])
+
+        partial = sm.list_node_instances(
+            include=['id', 'runtime_properties'],
+            filters={'deployment_id': 'dep'}).items
+        self.assertIn((node_instance.id, {'key': 'value'}), partial)
+        updated = sm.get_node_instance(node_instance.id).to_dict()
+        self.assertEquals({'key': 'value'}, updated['runtime_properties'])
+        self.assertEquals(node_instance.relationships,
+                          updated['relationships'])
+
+        # Payloads are deleted with their node instances
+        self.client.deployments.delete('dep', ignore_live_nodes=True)
+        self.assertEquals(0, models.NodeInstancePayload.query.count())
+
+    def test_patch_entity(self):
+        sm = get_storage_manager()
+        self.put_deployment(deployment_id='dep')
+        with self._capture_updates() as statements:
+            sm.patch_entity(models.Deployment, 'dep', description='patched')
+
+        self.assertEquals(1, len(statements))
+        self.assertNotIn('workflows', statements[0])
+        self.assertEquals('patched', sm.get_deployment('dep').description)
+        self.assertRaises(manager_exceptions.NotFoundError,
+                          sm.patch_entity,
+                          models.Deployment, 'nonexistent',
+                          description='patched')
@@ -0,0 +1,101 @@
+#########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+from nose.plugins.attrib import attr
+
+from manager_rest import manager_exceptions, utils
+from manager_rest.test import base_test
+from manager_rest.storage import db, get_storage_manager, models, UnitOfWork
+
+
+@attr(client_min_version=1, client_max_version=base_test.LATEST_API_VERSION)
+class UnitOfWorkTests(base_test.BaseServerTestCase):
+
+    def setUp(self):
+        super(UnitOfWorkTests, self).setUp()
+        self.sm = get_storage_manager()
+
+    def _put_blueprint(self, blueprint_id):
+        now = utils.get_formatted_timestamp()
+        return self.sm.put_blueprint(models.Blueprint(id=blueprint_id,
+                                                      created_at=now,
+                                                      main_file_name='a',
+                                                      plan={}))
+
+    @staticmethod
+    def _committed_blueprint_ids():
+        # A separate connection only sees committed rows
+        rows = db.engine.execute('SELECT id FROM blueprints').fetchall()
+        return sorted(row[0] for row in rows)
+
+    def test_commit_once_at_the_end(self):
+        with UnitOfWork():
+            self._put_blueprint('bp1')
+            blueprint = self.sm.get_blueprint('bp1')
+            blueprint.description = 'updated'
+            self.sm.update_entity(blueprint)
+            self._put_blueprint('bp2')
+            self.assertEqual([], self._committed_blueprint_ids())
+
+        self.assertEqual(['bp1', 'bp2'], self._committed_blueprint_ids())
+        self.assertEqual('updated', self.sm.get_blueprint('bp1').description)
+
+    def test_rollback_on_error(self):
+        self._put_blueprint('existing')
+
+        def put_blueprints():
+            with UnitOfWork():
+                self._put_blueprint('bp1')
+                self._put_blueprint('existing')
+
+        self.assertRaises(manager_exceptions.ConflictError, put_blueprints)
+        self.assertEqual(['existing'], self._committed_blueprint_ids())
+
+    def test_identity_map_is_kept(self):
+        self._put_blueprint('bp1')
+        with UnitOfWork():
+            blueprint = self.sm.get_blueprint('bp1')
+            self._put_blueprint('bp2')
+            self.assertIs(blueprint, self.sm.get_blueprint('bp1'))
+        self.assertIsNot(blueprint, self.sm.get_blueprint('bp1'))
+
+    def test_nested_decorated_unit_of_work(self):
+        @UnitOfWork()
+        def put_blueprint(blueprint_id):
+            self._put_blueprint(blueprint_id)
+
+        with UnitOfWork():
+            put_blueprint('bp1')
+            # Only the outermost unit of work commits
+            self.assertEqual([], self._committed_blueprint_ids())
+            put_blueprint('bp2')
+
+        self.assertEqual(['bp1', 'bp2'], self._committed_blueprint_ids())
+
+    def test_node_instance_update(self):
+        self.put_deployment(deployment_id='dep',
+                            blueprint_file_name='modify1.yaml')
+        node_instance = self.sm.list_node_instances().items[0]
+        with UnitOfWork():
+            node_instance = self.sm.get_node_instance(node_instance.id)
+            node_instance.runtime_properties = {'key': 'value'}
+            self.sm.update_node_instance(node_instance)
+            node_instance.state = 'started'
+            self.sm.update_node_instance(node_instance)
+
+        updated = self.sm.get_node_instance(node_instance.id)
+        self.assertEqual({'key': 'value'}, updated.runtime_properties)
+        self.assertEqual('started', updated.state)
+        self.assertEqual(node_instance.version, updated.version)
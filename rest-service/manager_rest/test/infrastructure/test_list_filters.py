@@ -17,7 +17,7 @@ from nose.plugins.attrib import attr
 
 from cloudify_rest_client.exceptions import CloudifyClientError
 from manager_rest import manager_exceptions
-from manager_rest.storage import models
+from manager_rest.storage import get_storage_manager, models
 from manager_rest.test import base_test
 from manager_rest.test.infrastructure.base_list_test import BaseListTest
 
@@ -182,6 +182,46 @@ class ResourceListFiltersTestCase(BaseListTest):
                                            self.sec_deployment_id]}
         self._test_multiple_values_filter('node_instances', filter_fields, 4)
 
+    def test_node_instances_list_with_json_path_filters(self):
+        sm = get_storage_manager()
+        instances = sorted(sm.list_node_instances(
+            include=['id', 'deployment_id']).items)
+        runtime_properties = [
+            {'ip': '10.0.0.5', 'cloudify_agent': {'queue': 'q1'}},
+            {'ip': '10.0.0.6', 'cloudify_agent': {'queue': 'q1'}},
+            {'ip': '10.0.0.7', 'port': 8080},
+            {}]
+        for instance, properties in zip(instances, runtime_properties):
+            sm.update_node_instance_fields(
+                instance.id, 1, runtime_properties=properties)
+
+        def filtered_ids(**filters):
+            response = self.get('/node-instances', query_params=filters)
+            self.assertEqual(200, response.status_code)
+            return sorted(item['id'] for item in response.json['items'])
+
+        self.assertEqual([instances[0].id],
+                         filtered_ids(**{'runtime_properties.ip': '10.0.0.5'}))
+        self.assertEqual(
+            [instances[0].id, instances[1].id],
+            filtered_ids(**{'runtime_properties.cloudify_agent.queue': 'q1'}))
+        self.assertEqual(
+            [instances[1].id, instances[2].id],
+            filtered_ids(**{'runtime_properties.ip': ['10.0.0.6',
+                                                      '10.0.0.7']}))
+        self.assertEqual([instances[2].id],
+                         filtered_ids(**{'runtime_properties.port': '8080'}))
+        self.assertEqual(
+            [instances[0].id],
+            filtered_ids(**{'runtime_properties.cloudify_agent.queue': 'q1',
+                            'runtime_properties.ip': '10.0.0.5',
+                            'deployment_id': instances[0].deployment_id}))
+        self.assertEqual([], filtered_ids(**{'runtime_properties.ip': 'x'}))
+
+        response = self.get('/node-instances',
+                            query_params={'state.value': 'started'})
+        self.assertEqual(400, response.status_code)
+
     def test_node_instances_list_non_existent_filters(self):
         filter_fields = {'non_existing_field': 'just_some_value'}
         try:
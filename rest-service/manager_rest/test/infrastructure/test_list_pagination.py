@@ -13,9 +13,12 @@
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
 #
+from functools import partial
+
 from nose.plugins.attrib import attr
 
 from manager_rest.test import base_test
+from cloudify_rest_client.exceptions import CloudifyClientError
 from manager_rest.test.infrastructure.base_list_test import BaseListTest
 
 
@@ -37,6 +40,25 @@ class ResourceListTestCase(BaseListTest):
                 self.assertEqual(response.items,
                                  all_results[offset:offset + size])
 
+    def _test_cursor_pagination(self, list_func, total, sort_field='id'):
+        for sort in ([sort_field], ['-{0}'.format(sort_field)]):
+            # The primary key is always the last sort field
+            full_sort = sort if sort_field == 'id' else sort + ['id']
+            all_results = list_func(_sort=full_sort).items
+            num_all = len(all_results)
+            self.assertGreaterEqual(num_all, total)
+            for size in range(1, num_all + 1):
+                results = []
+                cursor = ''
+                while cursor is not None:
+                    response = list_func(_cursor=cursor, _size=size,
+                                         _sort=sort)
+                    self.assertEqual(response.metadata.pagination.total,
+                                     num_all)
+                    results.extend(response.items)
+                    cursor = response.metadata.pagination['next_cursor']
+                self.assertEqual(all_results, results)
+
     def test_deployments_list_paginated(self):
         self._put_n_deployments(id_prefix='test', number_of_deployments=4)
         self._test_pagination(self.client.deployments.list, 4)
@@ -73,3 +95,99 @@ class ResourceListTestCase(BaseListTest):
     def test_snapshots_list_paginated(self):
         self._put_n_snapshots(3)
         self._test_pagination(self.client.snapshots.list, 3)
+
+    @attr(client_min_version=2.1,
+          client_max_version=base_test.LATEST_API_VERSION)
+    def test_deployments_list_cursor_paginated(self):
+        self._put_n_deployments(id_prefix='test', number_of_deployments=4)
+        self._test_cursor_pagination(self.client.deployments.list, 4)
+        self._test_cursor_pagination(self.client.deployments.list, 4,
+                                     sort_field='blueprint_id')
+
+    @attr(client_min_version=2.1,
+          client_max_version=base_test.LATEST_API_VERSION)
+    def test_node_instances_list_cursor_paginated(self):
+        self._put_n_deployments(id_prefix='test', number_of_deployments=3)
+        self._test_cursor_pagination(self.client.node_instances.list, 6)
+        # Non-unique sort field - the primary key breaks the ties
+        self._test_cursor_pagination(self.client.node_instances.list, 6,
+                                     sort_field='node_id')
+
+    @attr(client_min_version=2.1,
+          client_max_version=base_test.LATEST_API_VERSION)
+    def test_executions_list_cursor_paginated_with_nulls(self):
+        self._put_n_deployments(id_prefix='test', number_of_deployments=2)
+        # The executions of snapshots have no deployment
+        self._put_n_snapshots(2)
+        list_executions = partial(self.client.executions.list,
+                                  include_system_workflows=True)
+        self._test_cursor_pagination(list_executions, 4,
+                                     sort_field='deployment_id')
+
+    @attr(client_min_version=2.1,
+          client_max_version=base_test.LATEST_API_VERSION)
+    def test_nodes_list_cursor_paginated_with_include(self):
+        self._put_n_deployments(id_prefix='test', number_of_deployments=3)
+        response = self.client.nodes.list(_cursor='', _size=4,
+                                          _include=['type'])
+        self.assertEqual(4, len(response.items))
+        self.assertEqual(['type'], response.items[0].keys())
+        next_response = self.client.nodes.list(
+            _cursor=response.metadata.pagination['next_cursor'],
+            _size=4,
+            _include=['type'])
+        self.assertEqual(2, len(next_response.items))
+        self.assertIsNone(next_response.metadata.pagination['next_cursor'])
+
+    @attr(client_min_version=2.1,
+          client_max_version=base_test.LATEST_API_VERSION)
+    def test_skip_count(self):
+        self._put_n_deployments(id_prefix='test', number_of_deployments=2)
+        response = self.client.deployments.list(_offset=0, _size=1,
+                                                _skip_count=True)
+        self.assertEqual(1, len(response.items))
+        self.assertIsNone(response.metadata.pagination['total'])
+        response = self.client.deployments.list(_cursor='', _size=1,
+                                                _skip_count=True)
+        self.assertEqual(1, len(response.items))
+        self.assertIsNone(response.metadata.pagination['total'])
+        self.assertIsNotNone(response.metadata.pagination['next_cursor'])
+
+    @attr(client_min_version=2.1,
+          client_max_version=base_test.LATEST_API_VERSION)
+    def test_invalid_cursor(self):
+        self._put_n_deployments(id_prefix='test', number_of_deployments=2)
+        response = self.client.deployments.list(_cursor='', _size=1,
+                                                _sort=['id'])
+        cursor = response.metadata.pagination['next_cursor']
+
+        for kwargs in [{'_cursor': 'not-a-cursor', '_size': 1},
+                       {'_cursor': cursor},
+                       {'_cursor': cursor, '_size': 1, '_offset': 1},
+                       {'_cursor': cursor, '_size': 1, '_sort': ['-id']}]:
+            with self.assertRaises(CloudifyClientError) as cm:
+                self.client.deployments.list(**kwargs)
+            self.assertEqual(400, cm.exception.status_code)
+
+    @attr(client_min_version=2.1,
+          client_max_version=base_test.LATEST_API_VERSION)
+    def test_streamed_lists(self):
+        self._put_n_deployments(id_prefix='test', number_of_deployments=3)
+        for list_func in (self.client.deployments.list,
+                          self.client.nodes.list,
+                          self.client.node_instances.list):
+            for kwargs in [{},
+                           {'_include': ['id']},
+                           {'_offset': 1, '_size': 2},
+                           {'_offset': 1, '_size': 2, '_skip_count': True}]:
+                expected = list_func(_sort=['id'], **kwargs)
+                streamed = list_func(_sort=['id'], _stream=True, **kwargs)
+                self.assertEqual(expected.items, streamed.items)
+                self.assertEqual(expected.metadata, streamed.metadata)
+
+    @attr(client_min_version=2.1,
+          client_max_version=base_test.LATEST_API_VERSION)
+    def test_streamed_list_with_cursor(self):
+        with self.assertRaises(CloudifyClientError) as cm:
+            self.client.deployments.list(_cursor='', _size=1, _stream=True)
+        self.assertEqual(400, cm.exception.status_code)
@@ -16,6 +16,7 @@
 import json
 import types
 import urllib
+from contextlib import contextmanager
 
 from cloudify_rest_client.client import HTTPClient
 from manager_rest.storage import get_storage_manager
@@ -150,7 +151,12 @@ def task_state():
 
 class MockCeleryClient(object):
 
-    def execute_task(self, task_queue, task_id=None, kwargs=None):
+    @contextmanager
+    def producer(self):
+        yield None
+
+    def execute_task(self, task_queue, task_id=None, kwargs=None,
+                     producer=None, priority=None):
         get_storage_manager().update_execution_status(task_id,
                                                       task_state(),
                                                       '')
@@ -17,7 +17,7 @@
 from flask import current_app
 from flask_security import current_user
 
-from manager_rest import celery_client
+from manager_rest import celery_client, config
 
 
 class WorkflowClient(object):
@@ -25,6 +25,20 @@ class WorkflowClient(object):
     def _get_rest_credentials():
             return {'rest_token': current_user.get_auth_token()}
 
+    @staticmethod
+    def _task_route(system_workflow):
+        """Return the queue and the broker priority of the task of a
+        workflow. System workflows get their own queue, or a higher
+        priority than user workflows (see `system_workflows_queue` in the
+        config), so they don't wait behind a backlog of user workflows
+        """
+        max_priority = config.instance.management_queue_max_priority
+        if system_workflow:
+            queue = config.instance.system_workflows_queue or \
+                celery_client.MANAGEMENT_QUEUE
+            return queue, max_priority or None
+        return celery_client.MANAGEMENT_QUEUE, 0 if max_priority else None
+
     @classmethod
     def execute_workflow(cls,
                          name,
@@ -34,10 +48,11 @@ class WorkflowClient(object):
                          deployment_id,
                          execution_id,
                          execution_parameters=None,
-                         bypass_maintenance=None):
+                         bypass_maintenance=None,
+                         producer=None):
         execution_parameters = execution_parameters or {}
         task_name = workflow['operation']
-        task_queue = 'cloudify.management'
+        task_queue = celery_client.MANAGEMENT_QUEUE
 
         plugin_name = workflow['plugin']
         plugin = [p for p in workflow_plugins if p['name'] == plugin_name][0]
@@ -62,9 +77,20 @@ class WorkflowClient(object):
         execution_parameters['__cloudify_context'].update(
             cls._get_rest_credentials())
 
-        return execute_task(task_queue=task_queue,
+        route_queue, priority = cls._task_route(system_workflow=False)
+        return execute_task(task_queue=route_queue,
                             execution_id=execution_id,
-                            execution_parameters=execution_parameters)
+                            execution_parameters=execution_parameters,
+                            producer=producer,
+                            priority=priority)
+
+    @staticmethod
+    def task_producer():
+        """A context manager of a producer, for publishing the tasks of
+        several workflows through a single broker connection (pass it as the
+        `producer` of `execute_workflow`)
+        """
+        return celery_client.get_client().producer()
 
     @classmethod
     def execute_system_workflow(cls,
@@ -77,7 +103,7 @@ class WorkflowClient(object):
         execution_parameters = execution_parameters or {}
         # task_id is not generated here since for system workflows,
         # the task id is equivalent to the execution id
-        task_queue = 'cloudify.management'
+        task_queue = celery_client.MANAGEMENT_QUEUE
         context = {
             'type': 'workflow',
             'task_id': task_id,
@@ -96,9 +122,11 @@ class WorkflowClient(object):
         execution_parameters['__cloudify_context'].update(
             cls._get_rest_credentials())
 
-        return execute_task(task_queue=task_queue,
+        route_queue, priority = cls._task_route(system_workflow=True)
+        return execute_task(task_queue=route_queue,
                             execution_id=context['task_id'],
-                            execution_parameters=execution_parameters)
+                            execution_parameters=execution_parameters,
+                            priority=priority)
 
 
 # What we need to access this manager in Flask
@@ -113,11 +141,12 @@ def get_workflow_client():
     return wf_client
 
 
-def execute_task(task_queue, execution_id, execution_parameters):
+def execute_task(task_queue, execution_id, execution_parameters,
+                 producer=None, priority=None):
+    # The client (and its broker connections) is kept for the next tasks
     celery = celery_client.get_client()
-    try:
-        return celery.execute_task(task_queue=task_queue,
-                                   task_id=execution_id,
-                                   kwargs=execution_parameters)
-    finally:
-        celery.close()
+    return celery.execute_task(task_queue=task_queue,
+                               task_id=execution_id,
+                               kwargs=execution_parameters,
+                               producer=producer,
+                               priority=priority)
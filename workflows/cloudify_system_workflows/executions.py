@@ -0,0 +1,52 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+from cloudify.decorators import workflow
+from cloudify.manager import get_rest_client
+from cloudify_rest_client.executions import ExecutionsClient
+
+
+class ExecutionsArchiveClient(ExecutionsClient):
+    """The executions client, with the archiving of old executions (the
+    `POST /executions/archive` endpoint)
+    """
+
+    def archive(self, retention_days=None, batch_size=None):
+        """Move the ended executions older than `retention_days` to the
+        executions archive
+
+        :param retention_days: [default: the manager's configuration]
+        :param batch_size: [default: the manager's configuration]
+        :return: A dict with the number of archived executions, and the
+        creation time they were older than
+        """
+        data = {}
+        if retention_days is not None:
+            data['retention_days'] = retention_days
+        if batch_size is not None:
+            data['batch_size'] = batch_size
+        return self.api.post('/executions/archive', data=data)
+
+
+@workflow(system_wide=True)
+def archive(ctx, retention_days, batch_size, **_):
+    """Move the ended executions older than `retention_days` to the
+    executions archive (the REST service does the batched moving)
+    """
+    client = ExecutionsArchiveClient(get_rest_client().executions.api)
+    result = client.archive(retention_days=retention_days,
+                            batch_size=batch_size)
+    ctx.logger.info('Archived {0} executions created before {1}'.format(
+        result['archived'], result['created_before']))
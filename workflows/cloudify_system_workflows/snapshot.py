@@ -39,6 +39,7 @@ from cloudify_system_workflows.deployment_environment import \
     generate_create_dep_tasks_graph
 from cloudify_system_workflows import plugins
 from cloudify.utils import ManagerVersion
+from cloudify_rest_client.manager import ManagerClient
 
 from utils import DictToAttributes
 from postgres import Postgres
@@ -372,6 +373,26 @@ def _restore_postgres(tempdir, config):
     ctx.logger.debug('Postgres restored')
 
 
+class MigrationsClient(ManagerClient):
+    """The manager client, with the DB migrations (the `POST /migrations`
+    endpoint)
+    """
+
+    def migrate(self):
+        """Run the (idempotent) migrations of the manager's DB
+
+        :return: The names of the migrations
+        """
+        return self.api.post('/migrations', data={})['migrations']
+
+
+def _migrate_postgres():
+    ctx.logger.info('Migrating Postgres data')
+    client = MigrationsClient(get_rest_client().manager.api)
+    migrations = client.migrate()
+    ctx.logger.debug('Ran migrations: {0}'.format(', '.join(migrations)))
+
+
 def _restore_elasticsearch(tempdir, es, metadata, bulk_read_timeout):
 
     has_cloudify_events_index = es.indices.exists(index=_EVENTS_INDEX_NAME)
@@ -499,8 +520,11 @@ def _agent_key_path_in_db(config, node_id, deployment_id):
                     "AND deployment_id = '{1}';" \
                     "".format(node_id, deployment_id)
     result = postgres.run_query(get_node_data)
-    pickled_buffer = result['all'][0][0]
-    properties = pickle.loads(pickled_buffer)
+    properties = result['all'][0][0]
+    # Properties are stored as JSONB, but snapshots of older managers hold
+    # them pickled
+    if not isinstance(properties, dict):
+        properties = pickle.loads(properties)
     key_path = properties['cloudify_agent']['key']
     ctx.logger.debug('Agent key path in db: {0}'.format(key_path))
     return key_path
@@ -531,6 +555,9 @@ def _restore_snapshot(config,
         ctx.logger.info('Restoring es data of version previous to 4')
         ElasticSearchDump().restore_prev_4(tempdir)
 
+    # The data of an older manager may be stored in older formats
+    _migrate_postgres()
+
     _restore_elasticsearch(tempdir, es, metadata,
                            elasticsearch_read_timeout)
 